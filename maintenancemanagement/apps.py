@@ -6,3 +6,7 @@ class MaintenancemanagementConfig(AppConfig):
     """This is the app class."""
 
     name = 'maintenancemanagement'
+
+    def ready(self):
+        """Connect the signal receivers."""
+        from maintenancemanagement import signals  # noqa: F401
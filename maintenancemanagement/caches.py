@@ -0,0 +1,146 @@
+"""This file contains the cached documents of the maintenance management.
+
+The documents are built from the database when they are missing and are
+deleted by the signal receivers of signals.py when the objects they are built
+from change.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from usersmanagement.models import UserProfile
+from utils.conditional import make_etag
+
+from .models import EquipmentType
+
+EQUIPMENT_TYPE_SCHEMA_KEY = 'equipmenttype-schema-{}'
+EQUIPMENT_REQUIREMENTS_KEY = 'equipment-requirements'
+USER_TASK_FEED_KEY = 'user-task-feed-{}'
+TASK_REQUIREMENTS_KEY = 'task-requirements'
+
+
+def get_equipment_type_schema(equipment_type_id):
+    """Give the schema of an equipment type.
+
+    Exemple of schema :
+    {
+        "id":1,
+        "name":"Voiture",
+        "field":[
+            {
+                "id":5,
+                "name":"Marque",
+                "value":["Volvo", "Peugeot", "Ferrari"]
+            }
+        ]
+    }
+    """
+    schema = cache.get(EQUIPMENT_TYPE_SCHEMA_KEY.format(equipment_type_id))
+    if schema is None:
+        schema = _build_equipment_type_schemas(EquipmentType.objects.filter(pk=equipment_type_id))[0]
+    return schema
+
+
+def get_equipment_requirements():
+    """Give the schemas of all the equipment types."""
+    requirements = cache.get(EQUIPMENT_REQUIREMENTS_KEY)
+    if requirements is None:
+        ids = list(EquipmentType.objects.order_by('pk').values_list('pk', flat=True))
+        keys = [EQUIPMENT_TYPE_SCHEMA_KEY.format(pk) for pk in ids]
+        schemas = cache.get_many(keys)
+        missing = [pk for pk, key in zip(ids, keys) if key not in schemas]
+        if missing:
+            for schema in _build_equipment_type_schemas(EquipmentType.objects.filter(pk__in=missing)):
+                schemas[EQUIPMENT_TYPE_SCHEMA_KEY.format(schema['id'])] = schema
+        requirements = [schemas[key] for key in keys if key in schemas]
+        cache.set(EQUIPMENT_REQUIREMENTS_KEY, requirements)
+    return requirements
+
+
+def _build_equipment_type_schemas(equipment_types):
+    schemas = []
+    for equipment_type in equipment_types.order_by('pk').prefetch_related('fields_groups__field_set__value_set'):
+        fields = []
+        for fields_group in equipment_type.fields_groups.all():
+            for field in fields_group.field_set.all():
+                fields.append(
+                    {
+                        'id': field.id,
+                        'name': field.name,
+                        'value': [field_value.value for field_value in field.value_set.all()]
+                    }
+                )
+        schemas.append({'id': equipment_type.id, 'name': equipment_type.name, 'field': fields})
+    cache.set_many({EQUIPMENT_TYPE_SCHEMA_KEY.format(schema['id']): schema for schema in schemas})
+    return schemas
+
+
+def invalidate_equipment_type_schemas(equipment_type_ids):
+    """Delete the schemas of the given equipment types.
+
+    They are deleted again when the transaction is committed, so a schema
+    rebuilt meanwhile from the old data is not kept.
+    """
+    keys = [EQUIPMENT_TYPE_SCHEMA_KEY.format(pk) for pk in equipment_type_ids]
+    keys.append(EQUIPMENT_REQUIREMENTS_KEY)
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_task_requirements():
+    """Give the cached requirements of the tasks, or None if they are missing.
+
+    The requirements are the serialized trigger conditions, end conditions
+    and task templates sent to the task creation form.
+    """
+    return cache.get(TASK_REQUIREMENTS_KEY)
+
+
+def set_task_requirements(data):
+    """Cache the serialized requirements of the tasks."""
+    cache.set(TASK_REQUIREMENTS_KEY, data)
+
+
+def invalidate_task_requirements():
+    """Delete the requirements of the tasks.
+
+    Like the schemas, they are deleted again when the transaction is
+    committed.
+    """
+    cache.delete(TASK_REQUIREMENTS_KEY)
+    transaction.on_commit(lambda: cache.delete(TASK_REQUIREMENTS_KEY))
+
+
+def get_user_task_feed(user_id):
+    """Give the cached task feed of a user, or None if it is missing.
+
+    The feed is a dictionary with the serialized tasks of the teams of the
+    user in data, their ETag and the date they were serialized in
+    last_modified.
+    """
+    return cache.get(USER_TASK_FEED_KEY.format(user_id))
+
+
+def set_user_task_feed(user_id, data):
+    """Cache the serialized tasks of a user and give their feed."""
+    feed = {'data': data, 'etag': make_etag(data), 'last_modified': int(time.time())}
+    cache.set(USER_TASK_FEED_KEY.format(user_id), feed)
+    return feed
+
+
+def invalidate_user_task_feeds(user_ids):
+    """Delete the task feeds of the given users.
+
+    Like the schemas, they are deleted again when the transaction is
+    committed.
+    """
+    keys = [USER_TASK_FEED_KEY.format(pk) for pk in user_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_team_task_feeds(team_ids):
+    """Delete the task feeds of the members of the given teams."""
+    invalidate_user_task_feeds(set(UserProfile.objects.filter(groups__in=team_ids).values_list('pk', flat=True)))
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.1 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenancemanagement', '0021_blob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['is_template', 'over', 'end_date'], name='maintenance_is_temp_357ec8_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# The trigram indexes serve the icontains lookups of utils.search, which are
+# UPPER(column::text) LIKE UPPER('%...%') with PostgreSQL. They only exist
+# when the pg_trgm extension is installed before the migration, else
+# utils.search uses an in-process index. The extension is not created here,
+# as it needs a superuser, see the README.
+INDEXES = [
+    ('maintenancemanagement_task_name_trgm', 'maintenancemanagement_task', 'name'),
+    ('maintenancemanagement_task_description_trgm', 'maintenancemanagement_task', 'description'),
+    ('maintenancemanagement_equipment_name_trgm', 'maintenancemanagement_equipment', 'name'),
+    ('maintenancemanagement_fieldobject_value_trgm', 'maintenancemanagement_fieldobject', 'value'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS {} ON {} USING gin ((UPPER({}::text)) gin_trgm_ops)'.format(name, table, column)
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenancemanagement', '0022_task_listing_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.1.1 on 2026-10-19 14:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_existing_objects(apps, schema_editor):
+    """Record a change for each existing object, for the first synchronisation."""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Change = apps.get_model('maintenancemanagement', 'Change')
+    for model_name in ('task', 'equipment', 'fieldobject', 'file'):
+        model = apps.get_model('maintenancemanagement', model_name)
+        ids = list(model.objects.order_by('pk').values_list('pk', flat=True))
+        if ids:
+            content_type, _ = ContentType.objects.get_or_create(app_label='maintenancemanagement', model=model_name)
+            Change.objects.bulk_create(
+                [Change(content_type=content_type, object_id=pk) for pk in ids], batch_size=1000
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('maintenancemanagement', '0024_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('object_id', models.PositiveIntegerField()),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['content_type', 'object_id'], name='maintenance_content_5a23c2_idx'),
+        ),
+        migrations.RunPython(record_existing_objects, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.1.1 on 2026-10-19 15:18
+
+from datetime import date
+
+from django.db import migrations, models
+from utils.methods import parse_time
+
+
+def schedule_pending_tasks(apps, schema_editor):
+    """Set the date from which each pending task has to be checked."""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    FieldObject = apps.get_model('maintenancemanagement', 'FieldObject')
+    Task = apps.get_model('maintenancemanagement', 'Task')
+    content_type = ContentType.objects.filter(app_label='maintenancemanagement', model='task').first()
+    if content_type is None:
+        return
+    tasks = Task.objects.in_bulk(
+        list(Task.objects.filter(over=False, is_triggered=False).values_list('pk', flat=True))
+    )
+    for condition in FieldObject.objects.filter(
+        content_type=content_type, object_id__in=list(tasks), field__field_group__name='Trigger Conditions'
+    ).select_related('field'):
+        task = tasks[condition.object_id]
+        if condition.field.name == 'Recurrence':
+            if task.end_date is None:
+                continue
+            check_at = task.end_date - parse_time(condition.value.split('|')[1])
+        else:
+            check_at = date.today()
+        if task.next_check_at is None or check_at < task.next_check_at:
+            task.next_check_at = check_at
+    Task.objects.bulk_update(list(tasks.values()), ['next_check_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('maintenancemanagement', '0025_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='next_check_at',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['over', 'is_triggered', 'next_check_at'], name='maintenance_over_938864_idx'),
+        ),
+        migrations.RunPython(schedule_pending_tasks, migrations.RunPython.noop),
+    ]
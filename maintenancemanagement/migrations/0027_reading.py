@@ -0,0 +1,28 @@
+# Generated by Django 3.1.1 on 2026-10-19 15:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenancemanagement', '0026_next_check_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reading',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('value', models.FloatField()),
+                ('read_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('field_object', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_set', related_query_name='reading', to='maintenancemanagement.fieldobject')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['field_object', 'read_at'], name='maintenance_field_o_ff0a2e_idx'),
+        ),
+    ]
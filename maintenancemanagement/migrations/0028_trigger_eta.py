@@ -0,0 +1,18 @@
+# Generated by Django 3.1.1 on 2026-10-19 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenancemanagement', '0027_reading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='trigger_eta',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
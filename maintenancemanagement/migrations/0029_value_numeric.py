@@ -0,0 +1,35 @@
+# Generated by Django 3.1.1 on 2026-10-19 15:59
+
+from django.db import migrations, models
+from utils.methods import parse_number
+
+
+def fill_value_numeric(apps, schema_editor):
+    """Set the numeric value of the field objects whose value is a number."""
+    FieldObject = apps.get_model('maintenancemanagement', 'FieldObject')
+    field_objects = []
+    for field_object in FieldObject.objects.exclude(value__isnull=True).exclude(value='').only('value').iterator():
+        field_object.value_numeric = parse_number(field_object.value)
+        if field_object.value_numeric is not None:
+            field_objects.append(field_object)
+    FieldObject.objects.bulk_update(field_objects, ['value_numeric'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenancemanagement', '0028_trigger_eta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fieldobject',
+            name='value_numeric',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='fieldobject',
+            index=models.Index(fields=['field', 'value_numeric'], name='maintenance_field_i_7fae85_idx'),
+        ),
+        migrations.RunPython(fill_value_numeric, migrations.RunPython.noop),
+    ]
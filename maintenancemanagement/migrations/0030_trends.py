@@ -0,0 +1,51 @@
+# Generated by Django 3.1.1 on 2026-10-19 16:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+from utils.trigger_tasks import SENSOR_CONDITIONS, get_watched_id
+
+
+def set_watched(apps, schema_editor):
+    """Set the field object watched by each sensor trigger condition."""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    FieldObject = apps.get_model('maintenancemanagement', 'FieldObject')
+    content_type = ContentType.objects.filter(app_label='maintenancemanagement', model='task').first()
+    if content_type is None:
+        return
+    conditions = list(
+        FieldObject.objects.filter(content_type=content_type, field__name__in=SENSOR_CONDITIONS).select_related('field')
+    )
+    watched_ids = {condition.pk: get_watched_id(condition) for condition in conditions}
+    existing = set(FieldObject.objects.filter(pk__in=set(watched_ids.values()) - {None}).values_list('pk', flat=True))
+    for condition in conditions:
+        condition.watched_id = watched_ids[condition.pk] if watched_ids[condition.pk] in existing else None
+    FieldObject.objects.bulk_update(conditions, ['watched'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('maintenancemanagement', '0029_value_numeric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trend',
+            fields=[
+                ('field_object', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', related_query_name='trend', serialize=False, to='maintenancemanagement.fieldobject')),
+                ('updated_at', models.DateTimeField()),
+                ('weight', models.FloatField(default=0)),
+                ('time', models.FloatField(default=0)),
+                ('time_squared', models.FloatField(default=0)),
+                ('value', models.FloatField(default=0)),
+                ('time_value', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fieldobject',
+            name='watched',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='watcher_set', related_query_name='watcher', to='maintenancemanagement.fieldobject'),
+        ),
+        migrations.RunPython(set_watched, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.1 on 2026-10-19 18:12
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_updated_at(apps, schema_editor):
+    """Set the last chunk date of the running upload sessions to their start."""
+    UploadSession = apps.get_model('maintenancemanagement', 'UploadSession')
+    UploadSession.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maintenancemanagement', '0030_trends'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_updated_at, migrations.RunPython.noop),
+    ]
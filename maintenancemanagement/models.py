@@ -1,16 +1,43 @@
 """This file define all models concerning the maintenance management."""
 
+import uuid
+
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.utils import timezone
 from usersmanagement.models import Team, UserProfile
 
 
+class Blob(models.Model):
+    """
+    Define the stored content of files.
+
+    Identical files share the same blob, which is deleted with the last file
+    referencing it.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    content = models.FileField(blank=False, null=False)
+    size = models.PositiveBigIntegerField()
+
+    def __str__(self):
+        """Define string representation of a blob."""
+        return self.sha256
+
+    def __repr__(self):
+        """Define formal representation of a blob."""
+        return "<Blob: id={id}, sha256={sha256}, size={size}>".format(id=self.id, sha256=self.sha256, size=self.size)
+
+
 class File(models.Model):
     """Define a file."""
 
     file = models.FileField(blank=False, null=False)
     is_manual = models.BooleanField(default=True)
+    blob = models.ForeignKey(
+        Blob, on_delete=models.PROTECT, related_name="file_set", related_query_name="file", null=True, blank=True
+    )
 
     def __str__(self):
         """Define string representation of a file."""
@@ -21,6 +48,38 @@ class File(models.Model):
         return self.file.name
 
 
+class UploadSession(models.Model):
+    """
+    Define a resumable upload of a file sent by chunks.
+
+    The chunks are appended to a temporary file until offset reaches size,
+    then the file is validated and a File is created. A session without a
+    chunk for settings.FILE_UPLOAD_SESSION_EXPIRATION hours is deleted.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="upload_session_set", related_query_name="upload_session"
+    )
+    file_name = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    is_manual = models.BooleanField(default=True)
+    sha256 = models.CharField(max_length=64, default="", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Define string representation of an upload session."""
+        return self.file_name
+
+    def __repr__(self):
+        """Define formal representation of an upload session."""
+        return "<UploadSession: id={id}, file_name='{name}', offset={offset}, size={size}>".format(
+            id=self.id, name=self.file_name, offset=self.offset, size=self.size
+        )
+
+
 class FieldGroup(models.Model):
     """Define a field group."""
 
@@ -61,6 +120,35 @@ class FieldValue(models.Model):
         return self.value
 
 
+class FieldObjectQuerySet(models.QuerySet):
+    """Queries on the numeric values of the field objects, run in SQL."""
+
+    def numeric(self):
+        """Keep the field objects whose value is a number."""
+        return self.filter(value_numeric__isnull=False)
+
+    def value_between(self, minimum=None, maximum=None):
+        """Keep the field objects whose value is between the given bounds.
+
+        The bounds are included, a missing one is not checked.
+        """
+        queryset = self.numeric()
+        if minimum is not None:
+            queryset = queryset.filter(value_numeric__gte=minimum)
+        if maximum is not None:
+            queryset = queryset.filter(value_numeric__lte=maximum)
+        return queryset
+
+    def value_statistics(self):
+        """Give the count, minimum, maximum and average of the values."""
+        return self.aggregate(
+            count=models.Count('value_numeric'),
+            minimum=models.Min('value_numeric'),
+            maximum=models.Max('value_numeric'),
+            average=models.Avg('value_numeric'),
+        )
+
+
 class FieldObject(models.Model):
     """
     Define a field object.
@@ -88,9 +176,30 @@ class FieldObject(models.Model):
     )
 
     value = models.CharField(max_length=100, default="", blank=True, null=True)
+    # The value as a number, kept by the signal receivers and the bulk
+    # writes, None for a value which is not a number.
+    value_numeric = models.FloatField(null=True, blank=True, editable=False)
+    # The field object watched by a sensor trigger condition, kept by the
+    # signal receivers and the bulk writes.
+    watched = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        related_name="watcher_set",
+        related_query_name="watcher",
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     description = models.CharField(max_length=100, default="", blank=True, null=True)
 
+    objects = FieldObjectQuerySet.as_manager()
+
+    class Meta:
+        """Add metadata on the class."""
+
+        indexes = [models.Index(fields=['field', 'value_numeric'])]
+
     def __str__(self):
         """Define string representation of a field object."""
         return str(self.id) + ' : ' + str(self.value) + str(self.field_value)
@@ -99,7 +208,11 @@ class FieldObject(models.Model):
         """Define the representation of FieldObject."""
         return "<FieldObject: id={id}, field={field}, field_value={field_value}, value={value},\
 description={description}>".format(
-            id=self.id, field=self.field, field_value=self.field_value, value=self.value, description=self.description
+            id=self.id,
+            field=self.field_id,
+            field_value=self.field_value_id,
+            value=self.value,
+            description=self.description
         )
 
 
@@ -115,6 +228,7 @@ class EquipmentType(models.Model):
         related_name="equipmentType_set",
         related_query_name="equipmentType"
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         """Define string representation of an equipment type."""
@@ -141,6 +255,7 @@ class Equipment(models.Model):
     files = models.ManyToManyField(
         File, verbose_name="Equipment File", related_name="equipment_set", related_query_name="equipment", blank=True
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         """Define string representation of an equipment."""
@@ -149,7 +264,7 @@ class Equipment(models.Model):
     def __repr__(self):
         """Define formal representation of an equipment."""
         return "<Equipment: id={id}, name={name}, equipment_type={type}>".format(
-            id=self.id, name=self.name, type=self.equipment_type
+            id=self.id, name=self.name, type=self.equipment_type_id
         )
 
 
@@ -204,6 +319,21 @@ class Task(models.Model):
     )
     is_triggered = models.BooleanField(default=True, null=True)
     over = models.BooleanField(default=False, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Date from which the trigger conditions are checked, kept by the signal
+    # receivers, None for a task without trigger condition.
+    next_check_at = models.DateField(null=True, blank=True, editable=False)
+    # Date at which the trends of the sensors reach a sensor condition of the
+    # pending task, None without a trend reaching one.
+    trigger_eta = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        """Add metadata on the class."""
+
+        indexes = [
+            models.Index(fields=['is_template', 'over', 'end_date']),
+            models.Index(fields=['over', 'is_triggered', 'next_check_at']),
+        ]
 
     def __str__(self):
         """Define string representation of a task."""
@@ -212,17 +342,106 @@ class Task(models.Model):
     def __repr__(self):
         """Define formal representation of a task."""
         return "<Task: id={id}, name='{name}', end_date={date}, duration={duration}, is_template={template}, \
-equipment={equipment}, equipment_type={type}, teams={teams}, files={files}, is_triggered={triggered}\
-over={over}>".format(
+equipment={equipment}, equipment_type={type}, is_triggered={triggered}, over={over}>".format(
             id=self.id,
             name=self.name,
             date=self.end_date,
             duration=self.duration,
             template=self.is_template,
-            equipment=self.equipment,
-            type=self.equipment_type,
-            teams=self.teams,
-            files=self.files,
+            equipment=self.equipment_id,
+            type=self.equipment_type_id,
             triggered=self.is_triggered,
             over=self.over
         )
+
+
+class Change(models.Model):
+    """
+    Define the last change of an object, for the synchronisation.
+
+    The id of the last change a client received is its synchronisation token.
+    A deleted object keeps its change as a tombstone.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    is_deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """Add metadata on the class."""
+
+        indexes = [models.Index(fields=['content_type', 'object_id'])]
+
+    def __str__(self):
+        """Define string representation of a change."""
+        return str(self.id)
+
+    def __repr__(self):
+        """Define formal representation of a change."""
+        return "<Change: id={id}, content_type={type}, object_id={object_id}, is_deleted={deleted}>".format(
+            id=self.id, type=self.content_type_id, object_id=self.object_id, deleted=self.is_deleted
+        )
+
+
+class Reading(models.Model):
+    """
+    Define a reading of a field object of an equipment, like a sensor value.
+
+    The readings are the history of the numeric values of the field objects,
+    used to replay the trigger conditions on the past values.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    field_object = models.ForeignKey(
+        FieldObject, on_delete=models.CASCADE, related_name="reading_set", related_query_name="reading"
+    )
+    value = models.FloatField()
+    read_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        """Add metadata on the class."""
+
+        indexes = [models.Index(fields=['field_object', 'read_at'])]
+
+    def __str__(self):
+        """Define string representation of a reading."""
+        return str(self.value)
+
+    def __repr__(self):
+        """Define formal representation of a reading."""
+        return "<Reading: id={id}, field_object={field_object}, value={value}, read_at={read_at}>".format(
+            id=self.id, field_object=self.field_object_id, value=self.value, read_at=self.read_at
+        )
+
+
+class Trend(models.Model):
+    """
+    Define the trend of the readings of a field object.
+
+    The trend is the exponentially weighted least squares line through the
+    readings. It keeps the weighted sums of the line, the times being in days
+    from updated_at, the date of the last reading, and is updated with each
+    new reading without reading the former ones.
+    """
+
+    field_object = models.OneToOneField(
+        FieldObject, on_delete=models.CASCADE, primary_key=True, related_name="trend", related_query_name="trend"
+    )
+    updated_at = models.DateTimeField()
+    weight = models.FloatField(default=0)
+    time = models.FloatField(default=0)
+    time_squared = models.FloatField(default=0)
+    value = models.FloatField(default=0)
+    time_value = models.FloatField(default=0)
+
+    def __str__(self):
+        """Define string representation of a trend."""
+        return "Trend of {}".format(self.field_object_id)
+
+    def __repr__(self):
+        """Define formal representation of a trend."""
+        return "<Trend: field_object={field_object}, updated_at={updated_at}, weight={weight}>".format(
+            field_object=self.field_object_id, updated_at=self.updated_at, weight=self.weight
+        )
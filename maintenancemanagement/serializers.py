@@ -4,12 +4,20 @@ import imghdr
 
 from PyPDF4.pdf import PdfFileReader
 
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
 from usersmanagement.serializers import TeamSerializer, UserProfileSerializer
+from utils.file_storage import store_file
+from utils.filters import FilterSerializer
 from utils.methods import ParseTimeException, parse_time
+from utils.previews import PREVIEW, THUMBNAIL, preview_path
+from utils.trigger_tasks import SENSOR_CONDITIONS
 
+from .caches import get_equipment_type_schema
 from .models import (
     Equipment,
     EquipmentType,
@@ -19,7 +27,9 @@ from .models import (
     FieldValue,
     File,
     Task,
+    UploadSession,
 )
+from .versions import record_changes, touch, touch_equipments
 
 TRIGGER_CONDITIONS = 'Trigger Conditions'
 END_CONDITIONS = 'End Conditions'
@@ -42,24 +52,69 @@ class TaskSerializer(serializers.ModelSerializer):
 
 
 class FileSerializer(serializers.ModelSerializer):
-    """Basic file serializer."""
+    """Basic file serializer.
+
+    The thumbnail and preview are the urls of the derivatives of the file,
+    None while they are not generated.
+    """
+
+    thumbnail = serializers.SerializerMethodField()
+    preview = serializers.SerializerMethodField()
 
     class Meta:
         """This class contains the serializer metadata."""
 
         model = File
-        fields = ['id', 'file', 'is_manual']
+        fields = ['id', 'file', 'is_manual', 'thumbnail', 'preview']
+
+    def get_thumbnail(self, obj):
+        """Give the url of the thumbnail of the file."""
+        return _get_variant_url(obj, THUMBNAIL)
+
+    def get_preview(self, obj):
+        """Give the url of the first page preview of the file."""
+        return _get_variant_url(obj, PREVIEW)
 
     def validate_file(self, file):
         """Check that the file sent is an image or if it is a pdf."""
         if not imghdr.what(file):
             try:
-                from io import BytesIO
-                PdfFileReader(BytesIO(file.read()))
+                PdfFileReader(file)
             except Exception:
                 raise serializers.ValidationError('File should be an image or a pdf.')
+            finally:
+                file.seek(0)
         return file
 
+    def create(self, validated_data):
+        """Create the File, storing its content once for identical files."""
+        return store_file(validated_data['file'], validated_data.get('is_manual', True))
+
+
+def _get_variant_url(file, variant):
+    if preview_path(file, variant) is None:
+        return None
+    return '{}?variant={}'.format(reverse('file-download', args=[file.pk]), variant)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Upload session serializer."""
+
+    class Meta:
+        """This class contains the serializer metadata."""
+
+        model = UploadSession
+        fields = ['id', 'file_name', 'size', 'offset', 'is_manual', 'sha256']
+        read_only_fields = ['offset']
+
+    def validate_size(self, size):
+        """Check that the announced size of the file is allowed."""
+        if size == 0 or size > settings.FILE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                'Size should be between 1 and {} bytes.'.format(settings.FILE_UPLOAD_MAX_SIZE)
+            )
+        return size
+
 
 class EquipmentSerializer(serializers.ModelSerializer):
     """Basic equipment serializer."""
@@ -74,31 +129,74 @@ class EquipmentSerializer(serializers.ModelSerializer):
 class EquipmentTypeSerializer(serializers.ModelSerializer):
     """Basic equimpent type serializer."""
 
+    equipment_set = serializers.PrimaryKeyRelatedField(
+        many=True, queryset=Equipment.objects.all(), required=False, write_only=True
+    )
+
     class Meta:
         """This class contains the serializer metadata."""
 
         model = EquipmentType
-        fields = ['id', 'name', 'fields_groups']
+        fields = ['id', 'name', 'fields_groups', 'equipment_set']
 
     def update(self, instance, validated_data):
-        """Redefine the update method."""
-        equipments = instance.equipment_set.all()
-
-        for attr, value in validated_data.items():
-            if attr == 'equipment_set':
-                for e in equipments:
-                    if e not in value:
-                        e.delete()
-                instance.equipment_set.set(value)
-            elif attr == 'fields_groups':
-                instance.fields_groups.set(value)
-                instance._apply_()
-            else:
-                setattr(instance, attr, value)
-        instance.save()
+        """Redefine the update method.
+
+        The equipments removed from the equipment set are deleted with a
+        single queryset delete. When the field groups change, the equipments
+        get a blank field object for each new expected field.
+        """
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                if attr == 'equipment_set':
+                    removed_equipments = instance.equipment_set.exclude(pk__in=[e.pk for e in value])
+                    _delete_field_objects(removed_equipments)
+                    removed_equipments.delete()
+                    moved_equipments = [e.pk for e in value if e.equipment_type_id != instance.pk]
+                    instance.equipment_set.set(value)
+                    touch(Equipment.objects.filter(pk__in=moved_equipments))
+                elif attr == 'fields_groups':
+                    instance.fields_groups.set(value)
+                    _add_expected_field_objects(instance)
+                else:
+                    setattr(instance, attr, value)
+            instance.save()
         return instance
 
 
+def _delete_field_objects(equipments):
+    """Delete the field objects of the equipments of a queryset."""
+    FieldObject.objects.filter(
+        content_type=ContentType.objects.get_for_model(Equipment), object_id__in=equipments.values('pk')
+    ).delete()
+
+
+def _add_expected_field_objects(equipment_type):
+    """Give the equipments of a type the field objects they miss.
+
+    The field objects of the fields which are no longer expected are kept,
+    as extra fields of the equipments.
+    """
+    content_type = ContentType.objects.get_for_model(Equipment)
+    expected_fields = Field.objects.filter(field_group__equipmentType=equipment_type).values_list('pk', flat=True)
+    equipment_ids = equipment_type.equipment_set.values_list('pk', flat=True)
+    existing = set(
+        FieldObject.objects.filter(
+            content_type=content_type, object_id__in=equipment_ids, field__in=expected_fields
+        ).values_list('object_id', 'field_id')
+    )
+    field_objects = FieldObject.objects.bulk_create(
+        [
+            FieldObject(content_type=content_type, object_id=equipment_id, field_id=field_id)
+            for equipment_id in equipment_ids for field_id in expected_fields
+            if (equipment_id, field_id) not in existing
+        ],
+        batch_size=1000
+    )
+    record_changes(FieldObject, [field_object.pk for field_object in field_objects])
+    touch_equipments({field_object.object_id for field_object in field_objects})
+
+
 class FieldValueSerializer(serializers.ModelSerializer):
     """Basic field value serializer."""
 
@@ -199,10 +297,7 @@ class FieldRequirementsSerializer(serializers.ModelSerializer):
     def get_value(self, obj):
         """Get the values of the FieldValues associated \
             with the Field as obj."""
-        if obj.value_set.count() == 0:
-            return []
-        else:
-            return obj.value_set.all().values_list('value', flat=True)
+        return [field_value.value for field_value in obj.value_set.all()]
 
 
 #############################################################################
@@ -286,6 +381,50 @@ class FieldObjectUpdateSerializer(serializers.ModelSerializer):
         return data
 
 
+class FieldObjectBulkValidationSerializer(serializers.ModelSerializer):
+    """Field object validation serializer for batches of field objects.
+
+    The Fields, with their FieldValues and FieldGroup, are given in the
+    context as a dict indexed by id, so validating a batch does not query
+    the database.
+    """
+
+    field = serializers.IntegerField()
+
+    class Meta:
+        """This class contains the serializer metadata."""
+
+        model = FieldObject
+        fields = ['field', 'value', 'description']
+
+    def validate_field(self, field_id):
+        """Get the Field of the given id in the context."""
+        field = self.context['fields'].get(field_id)
+        if field is None:
+            raise serializers.ValidationError('Invalid pk "{}" - object does not exist.'.format(field_id))
+        return field
+
+    def validate(self, data):
+        """Redefine the validate method."""
+        field = data.get("field")
+        field_values = {field_value.value: field_value for field_value in field.value_set.all()}
+        if field_values:
+            if data.get("value") not in field_values:
+                raise serializers.ValidationError({
+                    'error': ("Value doesn't match a FieldValue of the given Field"),
+                })
+            data.update({"field_value": field_values[data.get("value")]})
+            data.update({"value": ""})
+            return data
+        elif data.get("value") is None and field.field_group is not None \
+                and field.field_group.name == TRIGGER_CONDITIONS:
+            raise serializers.ValidationError({
+                'error': ("Value required"),
+            })
+        data.update({"field_value": None})
+        return data
+
+
 class FieldObjectNewFieldValidationSerializer(serializers.ModelSerializer):
     """Field object validation serializer for new field."""
 
@@ -318,8 +457,37 @@ class FieldObjectForTaskDetailsSerializer(serializers.ModelSerializer):
             return obj.value
 
 
+class EndConditionForTaskDetailsSerializer(FieldObjectForTaskDetailsSerializer):
+    """End condition details serializer for task.
+
+    The file of a Photo end condition is the file of the task whose name, or
+    path for the former conditions, is its value, with the urls of its
+    thumbnail and preview. The files of the task are given in the context,
+    by name and path, as files.
+    """
+
+    file = serializers.SerializerMethodField()
+
+    class Meta:
+        """This class contains the serializer metadata."""
+
+        model = FieldObject
+        fields = ['id', 'field_name', 'value', 'description', 'file']
+
+    def get_file(self, obj):
+        """Give the file of a Photo end condition."""
+        file = self.context.get('files', {}).get(obj.value)
+        if obj.field.name != 'Photo' or file is None:
+            return None
+        return FileSerializer(file).data
+
+
 class TriggerConditionForTaskDetailsSerializer(serializers.ModelSerializer):
-    """Field object details serializer for task."""
+    """Field object details serializer for task.
+
+    The field objects watched by the trigger conditions can be given in the
+    context, by id, as field_objects. They are fetched one by one otherwise.
+    """
 
     field_name = serializers.CharField(source='field.name')
     value = serializers.SerializerMethodField()
@@ -349,7 +517,10 @@ class TriggerConditionForTaskDetailsSerializer(serializers.ModelSerializer):
             return None
         else:
             field_object_id = int(obj.value.split('|')[1])
-            field_object = FieldObject.objects.get(id=field_object_id)
+            if 'field_objects' in self.context:
+                field_object = self.context['field_objects'][field_object_id]
+            else:
+                field_object = FieldObject.objects.select_related('field', 'field_value').get(id=field_object_id)
             return FieldObjectForTaskDetailsSerializer(field_object).data
 
 
@@ -383,7 +554,9 @@ class TriggerConditionsValidationSerializer(serializers.ModelSerializer):
         if data.get('delay') is not None:
             parse_time(data.get('delay'))
         if data.get('field_object_id') is not None:
-            FieldObject.objects.get(id=int(data.get('field_object_id')))
+            field_object = FieldObject.objects.get(id=int(data.get('field_object_id')))
+            if data.get('field').name == 'Frequency' and field_object.value_numeric is None:
+                raise serializers.ValidationError('The watched field object has no numeric value.')
         if data.get('field').name == 'Recurrence':
             if 'field_object_id' in data:
                 raise serializers.ValidationError('field_object_id not expected.')
@@ -417,7 +590,7 @@ class TriggerConditionsCreateSerializer(serializers.ModelSerializer):
         if data.get('field').name == 'Recurrence':
             value = f'{data.get("value")}|{data.get("delay")}'
         elif data.get('field').name == 'Frequency':
-            current_value = float(FieldObject.objects.get(id=int(data.get("field_object_id"))).value.replace(" ", ""))
+            current_value = FieldObject.objects.get(id=int(data.get("field_object_id"))).value_numeric
             next_trigger = current_value + float(data.get("value").replace(" ", ""))
             value = f'{data.get("value")}|{data.get("field_object_id")}|{data.get("delay")}|{next_trigger}'
         else:
@@ -430,6 +603,30 @@ class TriggerConditionsCreateSerializer(serializers.ModelSerializer):
         return data
 
 
+class TriggerConditionBacktestSerializer(serializers.Serializer):
+    """Serializer of a candidate sensor condition to replay."""
+
+    field = serializers.PrimaryKeyRelatedField(
+        queryset=Field.objects.filter(field_group__name=TRIGGER_CONDITIONS, name__in=SENSOR_CONDITIONS)
+    )
+    value = serializers.FloatField()
+
+    def validate(self, data):
+        """Check that a frequency is positive."""
+        if data['field'].name == 'Frequency' and data['value'] <= 0:
+            raise serializers.ValidationError('The frequency must be positive.')
+        return data
+
+
+class TriggerConditionsBacktestSerializer(serializers.Serializer):
+    """Serializer of the candidate conditions to replay on a field object."""
+
+    field_object = serializers.PrimaryKeyRelatedField(queryset=FieldObject.objects.all())
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    conditions = TriggerConditionBacktestSerializer(many=True, allow_empty=False)
+
+
 #############################################################################
 ########################## FIELD VALUE SERIALIZER ###########################
 #############################################################################
@@ -488,7 +685,8 @@ class EquipmentListingSerializer(serializers.ModelSerializer):
         """Get the explicit field associated with the \
             Equipement as obj."""
         content_type_object = ContentType.objects.get_for_model(obj)
-        fields = FieldObject.objects.filter(object_id=obj.id, content_type=content_type_object)
+        fields = FieldObject.objects.filter(object_id=obj.id,
+                                            content_type=content_type_object).select_related('field', 'field_value')
         return EquipmentFieldSerializer(fields, many=True).data
 
 
@@ -509,7 +707,8 @@ class EquipmentDetailsSerializer(serializers.ModelSerializer):
         """Get the explicit field associated with the \
             Equipement as obj."""
         content_type_object = ContentType.objects.get_for_model(obj)
-        fields = FieldObject.objects.filter(object_id=obj.id, content_type=content_type_object)
+        fields = FieldObject.objects.filter(object_id=obj.id,
+                                            content_type=content_type_object).select_related('field', 'field_value')
         return EquipmentFieldSerializer(fields, many=True).data
 
 
@@ -592,11 +791,7 @@ class EquipmentRequirementsSerializer(serializers.ModelSerializer):
     def get_field(self, obj):
         """Get the explicit field associated with the \
             EquipementType as obj."""
-        fields_groups = obj.fields_groups.all()
-        fields = []
-        for fields_group in fields_groups:
-            fields.extend(fields_group.field_set.all())
-        return FieldRequirementsSerializer(fields, many=True).data
+        return get_equipment_type_schema(obj.pk)['field']
 
 
 class EquipmentFieldDataProviderSerializer(serializers.ModelSerializer):
@@ -629,7 +824,8 @@ class EquipmentDetailsDataProviderSerializer(serializers.ModelSerializer):
         """Get the explicit field associated with the \
             Equipement as obj."""
         content_type_object = ContentType.objects.get_for_model(obj)
-        fields = FieldObject.objects.filter(object_id=obj.id, content_type=content_type_object)
+        fields = FieldObject.objects.filter(object_id=obj.id,
+                                            content_type=content_type_object).select_related('field', 'field_value')
         return EquipmentFieldDataProviderSerializer(fields, many=True).data
 
 
@@ -639,7 +835,11 @@ class EquipmentDetailsDataProviderSerializer(serializers.ModelSerializer):
 
 
 class TaskDetailsSerializer(serializers.ModelSerializer):
-    """Task details serializer."""
+    """Task details serializer.
+
+    The trigger and end conditions of a task are fetched in one query, and
+    the field objects watched by its trigger conditions in another one.
+    """
 
     equipment_type = EquipmentTypeSerializer()
     teams = TeamSerializer(many=True)
@@ -657,24 +857,40 @@ class TaskDetailsSerializer(serializers.ModelSerializer):
         model = Task
         fields = [
             'id', 'name', 'description', 'end_date', 'duration', 'is_template', 'equipment', 'teams', 'files', 'over',
-            'trigger_conditions', 'end_conditions', 'equipment_type', 'created_by', 'achieved_by'
+            'trigger_conditions', 'end_conditions', 'equipment_type', 'created_by', 'achieved_by', 'trigger_eta'
         ]
 
     def get_trigger_conditions(self, obj):
         """Return trigger conditions of the given task."""
-        content_type_object = ContentType.objects.get_for_model(obj)
-        trigger_fields_objects = FieldObject.objects.filter(
-            object_id=obj.id, content_type=content_type_object, field__field_group__name=TRIGGER_CONDITIONS
-        )
-        return TriggerConditionForTaskDetailsSerializer(trigger_fields_objects, many=True).data
+        trigger_fields_objects = self._get_conditions(obj, TRIGGER_CONDITIONS)
+        watched_ids = [
+            int(condition.value.split('|')[1])
+            for condition in trigger_fields_objects
+            if condition.field.name != "Recurrence"
+        ]
+        field_objects = FieldObject.objects.select_related('field', 'field_value').in_bulk(watched_ids)
+        return TriggerConditionForTaskDetailsSerializer(
+            trigger_fields_objects, many=True, context={'field_objects': field_objects}
+        ).data
 
     def get_end_conditions(self, obj):
         """Return end conditions of the given task."""
-        content_type_object = ContentType.objects.get_for_model(obj)
-        end_fields_objects = FieldObject.objects.filter(
-            object_id=obj.id, content_type=content_type_object, field__field_group__name=END_CONDITIONS
-        )
-        return FieldObjectForTaskDetailsSerializer(end_fields_objects, many=True).data
+        end_fields_objects = self._get_conditions(obj, END_CONDITIONS)
+        files = {}
+        for file in obj.files.all():
+            files[file.file.name] = files[file.file.path] = file
+        return EndConditionForTaskDetailsSerializer(end_fields_objects, many=True, context={'files': files}).data
+
+    def _get_conditions(self, obj, field_group_name):
+        if getattr(self, '_conditions_task', None) != obj.pk:
+            content_type_object = ContentType.objects.get_for_model(obj)
+            self._conditions = FieldObject.objects.filter(
+                object_id=obj.id,
+                content_type=content_type_object,
+                field__field_group__name__in=[TRIGGER_CONDITIONS, END_CONDITIONS]
+            ).select_related('field__field_group', 'field_value').order_by('pk')
+            self._conditions_task = obj.pk
+        return [condition for condition in self._conditions if condition.field.field_group.name == field_group_name]
 
     def get_duration(self, obj):
         """Return duration of the given task."""
@@ -701,7 +917,11 @@ class TaskDetailsSerializer(serializers.ModelSerializer):
 
 
 class TemplateDetailsSerializer(serializers.ModelSerializer):
-    """Task template details serializer."""
+    """Task template details serializer.
+
+    The condition fields of the templates can be given in the context, by id
+    of template, as conditions. They are fetched for each template otherwise.
+    """
 
     equipment_type = EquipmentTypeSerializer()
     teams = TeamSerializer(many=True)
@@ -722,18 +942,32 @@ class TemplateDetailsSerializer(serializers.ModelSerializer):
 
     def get_trigger_conditions(self, obj):
         """Return trigger conditions of the given task template."""
-        content_type_object = ContentType.objects.get_for_model(obj)
-        trigger_fields = Field.objects.filter(
-            object__object_id=obj.id, object__content_type=content_type_object, field_group__name=TRIGGER_CONDITIONS
-        )
+        if 'conditions' in self.context:
+            trigger_fields = [
+                field for field in self.context['conditions'].get(obj.id, [])
+                if field.field_group.name == TRIGGER_CONDITIONS
+            ]
+        else:
+            content_type_object = ContentType.objects.get_for_model(obj)
+            trigger_fields = Field.objects.filter(
+                object__object_id=obj.id,
+                object__content_type=content_type_object,
+                field_group__name=TRIGGER_CONDITIONS
+            )
         return FieldRequirementsSerializer(trigger_fields, many=True).data
 
     def get_end_conditions(self, obj):
         """Return end conditions of the given task template."""
-        content_type_object = ContentType.objects.get_for_model(obj)
-        end_fields = Field.objects.filter(
-            object__object_id=obj.id, object__content_type=content_type_object, field_group__name=END_CONDITIONS
-        )
+        if 'conditions' in self.context:
+            end_fields = [
+                field for field in self.context['conditions'].get(obj.id, [])
+                if field.field_group.name == END_CONDITIONS
+            ]
+        else:
+            content_type_object = ContentType.objects.get_for_model(obj)
+            end_fields = Field.objects.filter(
+                object__object_id=obj.id, object__content_type=content_type_object, field_group__name=END_CONDITIONS
+            )
         return FieldRequirementsSerializer(end_fields, many=True).data
 
     def get_duration(self, obj):
@@ -760,7 +994,11 @@ class TemplateDetailsSerializer(serializers.ModelSerializer):
 
 
 class TaskTemplateRequirementsSerializer(serializers.Serializer):
-    """Task template requirements serializer."""
+    """Task template requirements serializer.
+
+    The templates are fetched with their relations and the fields of their
+    conditions with their values in a constant number of queries.
+    """
 
     trigger_conditions = serializers.SerializerMethodField()
     end_conditions = serializers.SerializerMethodField()
@@ -773,19 +1011,30 @@ class TaskTemplateRequirementsSerializer(serializers.Serializer):
 
     def get_task_templates(self, obj):
         """Give task template data."""
-        templates = Task.objects.filter(is_template=True)
-        serializer = TemplateDetailsSerializer(templates, many=True)
+        templates = list(
+            Task.objects.filter(is_template=True).select_related('equipment', 'equipment_type').prefetch_related(
+                'teams__user_set', 'files__blob', 'equipment__files__blob', 'equipment_type__fields_groups'
+            )
+        )
+        conditions = {}
+        for field_object in FieldObject.objects.filter(
+            content_type=ContentType.objects.get_for_model(Task),
+            object_id__in=[template.id for template in templates],
+            field__field_group__name__in=[TRIGGER_CONDITIONS, END_CONDITIONS]
+        ).select_related('field__field_group').prefetch_related('field__value_set').order_by('pk'):
+            conditions.setdefault(field_object.object_id, []).append(field_object.field)
+        serializer = TemplateDetailsSerializer(templates, many=True, context={'conditions': conditions})
         return serializer.data
 
     def get_trigger_conditions(self, obj):
         """Return trigger conditions of the given task template."""
-        trigger_fields = FieldGroup.objects.get(name=TRIGGER_CONDITIONS).field_set.all()
+        trigger_fields = FieldGroup.objects.get(name=TRIGGER_CONDITIONS).field_set.prefetch_related('value_set')
         serializer = FieldRequirementsSerializer(trigger_fields, many=True)
         return serializer.data
 
     def get_end_conditions(self, obj):
         """Return end conditions of the given task template."""
-        end_fields = FieldGroup.objects.get(name=END_CONDITIONS).field_set.all()
+        end_fields = FieldGroup.objects.get(name=END_CONDITIONS).field_set.prefetch_related('value_set')
         return FieldRequirementsSerializer(end_fields, many=True).data
 
 
@@ -820,7 +1069,8 @@ class TaskListingSerializer(serializers.ModelSerializer):
 
         model = Task
         fields = [
-            'id', 'name', 'description', 'end_date', 'duration', 'is_template', 'equipment', 'teams', 'files', 'over'
+            'id', 'name', 'description', 'end_date', 'duration', 'is_template', 'equipment', 'teams', 'files', 'over',
+            'trigger_eta'
         ]
 
     def get_duration(self, obj):
@@ -870,11 +1120,7 @@ class EquipmentTypeDetailsSerializer(serializers.ModelSerializer):
     def get_field(self, obj):
         """Get the explicit field associated with the \
             EquipementType as obj."""
-        fields_groups = obj.fields_groups.all()
-        fields = []
-        for fields_group in fields_groups:
-            fields.extend(fields_group.field_set.all())
-        return FieldRequirementsSerializer(fields, many=True).data
+        return get_equipment_type_schema(obj.pk)['field']
 
 
 class EquipmentTypeValidationSerializer(serializers.ModelSerializer):
@@ -911,3 +1157,85 @@ class EquipmentTypeQuerySerializer(serializers.ModelSerializer):
 
         model = EquipmentType
         fields = ['id', 'name', 'field']
+
+
+#############################################################################
+############################## FILTER SERIALIZER ############################
+#############################################################################
+
+
+class EquipmentTypeFilterSerializer(FilterSerializer):
+    """Query parameters of the equipment types listing."""
+
+    search_fields = ['name']
+    ordering_fields = {'id': 'id', 'name': 'name'}
+
+
+class EquipmentFilterSerializer(FilterSerializer):
+    """Query parameters of the equipments listing."""
+
+    equipment_type = serializers.IntegerField(required=False)
+
+    filters = {'equipment_type': 'equipment_type'}
+    search_fields = ['name']
+    ordering_fields = {'id': 'id', 'name': 'name', 'equipment_type': 'equipment_type__name'}
+
+
+class TaskFilterSerializer(FilterSerializer):
+    """Query parameters of the tasks listing.
+
+    The equipment_type filter also matches the tasks of the equipments of the
+    type.
+    """
+
+    template = serializers.BooleanField(required=False)
+    equipment = serializers.IntegerField(required=False)
+    equipment_type = serializers.IntegerField(required=False)
+    team = serializers.IntegerField(required=False)
+    end_date_after = serializers.DateField(required=False)
+    end_date_before = serializers.DateField(required=False)
+    over = serializers.BooleanField(required=False)
+    is_triggered = serializers.BooleanField(required=False)
+
+    filters = {
+        'equipment': 'equipment',
+        'equipment_type': ('equipment_type', 'equipment__equipment_type'),
+        'team': 'teams',
+        'end_date_after': 'end_date__gte',
+        'end_date_before': 'end_date__lte',
+        'over': 'over',
+        'is_triggered': 'is_triggered',
+    }
+    search_fields = ['name', 'description']
+    ordering_fields = {
+        'id': 'id',
+        'name': 'name',
+        'end_date': 'end_date',
+        'over': 'over',
+        'is_triggered': 'is_triggered',
+    }
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """Serializer of the query parameters of the search."""
+
+    q = serializers.CharField(min_length=3, max_length=100)
+    page = serializers.IntegerField(required=False, min_value=1, default=1)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=100, default=20)
+
+
+class SearchResultSerializer(serializers.Serializer):
+    """Serializer of a result of the search."""
+
+    type = serializers.ChoiceField(choices=['task', 'equipment'])
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    match = serializers.CharField()
+    field = serializers.CharField(required=False)
+    rank = serializers.FloatField()
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    """Serializer of the query parameters of the synchronisation."""
+
+    since = serializers.IntegerField(required=False, min_value=0, default=0)
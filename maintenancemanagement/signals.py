@@ -0,0 +1,414 @@
+"""This file contains the signal receivers of the maintenance management."""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from usersmanagement.models import Team, UserProfile
+from utils.file_storage import release_blob
+from utils.forecast import forecast_tasks
+from utils.methods import parse_number
+from utils.previews import delete_previews, enqueue_previews, preview_key
+from utils.readings import record_readings
+from utils.trigger_tasks import get_watched_id, schedule_checks
+
+from .caches import (
+    invalidate_equipment_type_schemas,
+    invalidate_task_requirements,
+    invalidate_team_task_feeds,
+    invalidate_user_task_feeds,
+)
+from .models import (
+    Equipment,
+    EquipmentType,
+    Field,
+    FieldGroup,
+    FieldObject,
+    FieldValue,
+    File,
+    Task,
+)
+from .versions import (
+    record_changes,
+    touch,
+    touch_described_objects,
+    touch_field_object,
+    touch_file_owners,
+)
+
+
+@receiver(post_save, sender=File)
+def generate_file_previews(sender, instance, created, **kwargs):
+    """Generate the derivatives of a new file once it is committed."""
+    if created:
+        transaction.on_commit(lambda: enqueue_previews(instance.pk))
+
+
+@receiver(post_delete, sender=File)
+def release_file_blob(sender, instance, **kwargs):
+    """Delete the blob of a deleted file if it was the last to use it."""
+    if instance.blob_id is not None:
+        release_blob(instance.blob_id)
+    else:
+        key = preview_key(instance)
+        transaction.on_commit(lambda: delete_previews(key))
+
+
+@receiver(post_save, sender=EquipmentType)
+@receiver(post_delete, sender=EquipmentType)
+def invalidate_equipment_type(sender, instance, **kwargs):
+    """Invalidate the schema of a changed equipment type."""
+    invalidate_equipment_type_schemas([instance.pk])
+
+
+@receiver(m2m_changed, sender=EquipmentType.fields_groups.through)
+def invalidate_equipment_type_fields_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate the schemas of the equipment types whose groups changed."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_equipment_type_schemas([instance.pk])
+    elif pk_set:
+        invalidate_equipment_type_schemas(pk_set)
+    else:
+        invalidate_equipment_type_schemas(instance.equipmentType_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=FieldGroup)
+def invalidate_field_group(sender, instance, **kwargs):
+    """Invalidate the schemas of the equipment types of a deleted group."""
+    invalidate_equipment_type_schemas(instance.equipmentType_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Field)
+@receiver(pre_delete, sender=Field)
+def invalidate_field(sender, instance, **kwargs):
+    """Invalidate the schemas of the equipment types of a changed field."""
+    invalidate_equipment_type_schemas(
+        EquipmentType.objects.filter(fields_groups__field=instance.pk).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=FieldValue)
+@receiver(pre_delete, sender=FieldValue)
+def invalidate_field_value(sender, instance, **kwargs):
+    """Invalidate the schemas of the equipment types of a changed value."""
+    invalidate_equipment_type_schemas(
+        EquipmentType.objects.filter(fields_groups__field=instance.field_id).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Task)
+@receiver(pre_delete, sender=Task)
+def invalidate_task(sender, instance, **kwargs):
+    """Invalidate the task feeds of the members of the teams of a task."""
+    invalidate_team_task_feeds(instance.teams.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Task.teams.through)
+def invalidate_task_teams(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate the task feeds of the teams whose tasks changed."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        invalidate_team_task_feeds([instance.pk])
+    elif pk_set:
+        invalidate_team_task_feeds(pk_set)
+    else:
+        invalidate_team_task_feeds(instance.teams.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Task.files.through)
+def invalidate_task_files(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate the task feeds of the tasks whose files changed."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_team_task_feeds(instance.teams.values_list('pk', flat=True))
+    elif pk_set:
+        invalidate_team_task_feeds(Team.objects.filter(task__in=pk_set).values_list('pk', flat=True))
+    else:
+        invalidate_team_task_feeds(Team.objects.filter(task__files=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=File)
+def invalidate_file(sender, instance, **kwargs):
+    """Invalidate the task feeds of the tasks of a deleted file."""
+    invalidate_team_task_feeds(Team.objects.filter(task__files=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Team)
+@receiver(pre_delete, sender=Team)
+def invalidate_team(sender, instance, **kwargs):
+    """Invalidate the task feeds of the members of a changed team."""
+    invalidate_team_task_feeds([instance.pk])
+
+
+@receiver(m2m_changed, sender=UserProfile.groups.through)
+def invalidate_team_members(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate the task feeds of the members of the changed teams.
+
+    The users who join or leave a team get its tasks, and the other members
+    get its new list of users.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        invalidate_team_task_feeds([instance.pk])
+        invalidate_user_task_feeds(pk_set or [])
+    else:
+        invalidate_user_task_feeds([instance.pk])
+        invalidate_team_task_feeds(pk_set or instance.groups.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Field)
+@receiver(post_delete, sender=Field)
+@receiver(post_save, sender=FieldGroup)
+@receiver(post_delete, sender=FieldGroup)
+@receiver(post_save, sender=FieldValue)
+@receiver(post_delete, sender=FieldValue)
+@receiver(post_save, sender=EquipmentType)
+@receiver(post_delete, sender=EquipmentType)
+@receiver(post_save, sender=Equipment)
+@receiver(post_delete, sender=Equipment)
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def invalidate_requirements(sender, instance, **kwargs):
+    """Invalidate the task requirements when an object they show changes."""
+    invalidate_task_requirements()
+
+
+@receiver(m2m_changed, sender=EquipmentType.fields_groups.through)
+@receiver(m2m_changed, sender=Equipment.files.through)
+@receiver(m2m_changed, sender=UserProfile.groups.through)
+def invalidate_requirements_relations(sender, action, **kwargs):
+    """Invalidate the task requirements when a relation they show changes."""
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        invalidate_task_requirements()
+
+
+@receiver(pre_save, sender=Task)
+def invalidate_former_template(sender, instance, **kwargs):
+    """Invalidate the task requirements when a template stops being one."""
+    if instance.pk is not None and not instance.is_template and Task.objects.filter(
+        pk=instance.pk, is_template=True
+    ).exists():
+        invalidate_task_requirements()
+
+
+@receiver(post_save, sender=Task)
+@receiver(pre_delete, sender=Task)
+def invalidate_template(sender, instance, **kwargs):
+    """Invalidate the task requirements when a template changes."""
+    if instance.is_template:
+        invalidate_task_requirements()
+
+
+@receiver(m2m_changed, sender=Task.teams.through)
+@receiver(m2m_changed, sender=Task.files.through)
+def invalidate_template_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate the task requirements when a template's relations change."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        if instance.is_template:
+            invalidate_task_requirements()
+    elif pk_set is None or Task.objects.filter(pk__in=pk_set, is_template=True).exists():
+        invalidate_task_requirements()
+
+
+@receiver(post_save, sender=FieldObject)
+@receiver(post_delete, sender=FieldObject)
+def invalidate_template_conditions(sender, instance, **kwargs):
+    """Invalidate the task requirements when a template's conditions change."""
+    if instance.content_type_id == ContentType.objects.get_for_model(Task).pk and Task.objects.filter(
+        pk=instance.object_id, is_template=True
+    ).exists():
+        invalidate_task_requirements()
+
+
+@receiver(m2m_changed, sender=EquipmentType.fields_groups.through)
+def touch_equipment_type_fields_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    """Touch the equipment types whose groups changed."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch(EquipmentType.objects.filter(pk=instance.pk))
+    elif pk_set:
+        touch(EquipmentType.objects.filter(pk__in=pk_set))
+    else:
+        touch(instance.equipmentType_set.all())
+
+
+@receiver(pre_delete, sender=FieldGroup)
+def touch_field_group(sender, instance, **kwargs):
+    """Touch the equipment types of a deleted group."""
+    touch(instance.equipmentType_set.all())
+
+
+@receiver(post_save, sender=Field)
+@receiver(pre_delete, sender=Field)
+def touch_field(sender, instance, **kwargs):
+    """Touch the equipment types and the objects of a changed field."""
+    touch(EquipmentType.objects.filter(fields_groups__field=instance.pk))
+    touch_described_objects(FieldObject.objects.filter(field=instance.pk))
+
+
+@receiver(post_save, sender=FieldValue)
+@receiver(pre_delete, sender=FieldValue)
+def touch_field_value(sender, instance, **kwargs):
+    """Touch the equipment types and the objects of a changed value."""
+    touch(EquipmentType.objects.filter(fields_groups__field=instance.field_id))
+    touch_described_objects(FieldObject.objects.filter(field_value=instance.pk))
+
+
+@receiver(post_save, sender=FieldObject)
+@receiver(post_delete, sender=FieldObject)
+def touch_field_object_owner(sender, instance, **kwargs):
+    """Touch the task or the equipment of a changed field object."""
+    touch_field_object(instance)
+
+
+@receiver(m2m_changed, sender=Task.teams.through)
+@receiver(m2m_changed, sender=Task.files.through)
+def touch_task_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """Touch the tasks whose teams or files changed."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch(Task.objects.filter(pk=instance.pk))
+    elif pk_set:
+        touch(Task.objects.filter(pk__in=pk_set))
+    else:
+        touch(instance.task_set.all())
+
+
+@receiver(m2m_changed, sender=Equipment.files.through)
+def touch_equipment_files(sender, instance, action, reverse, pk_set, **kwargs):
+    """Touch the equipments whose files changed."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch(Equipment.objects.filter(pk=instance.pk))
+    elif pk_set:
+        touch(Equipment.objects.filter(pk__in=pk_set))
+    else:
+        touch(instance.equipment_set.all())
+
+
+@receiver(post_save, sender=File)
+@receiver(pre_delete, sender=File)
+def touch_file(sender, instance, **kwargs):
+    """Touch the tasks and equipments of a changed file."""
+    touch_file_owners([instance.pk])
+
+
+@receiver(post_save, sender=Team)
+@receiver(pre_delete, sender=Team)
+def touch_team(sender, instance, **kwargs):
+    """Touch the tasks of a changed team."""
+    touch(Task.objects.filter(teams=instance.pk))
+
+
+@receiver(m2m_changed, sender=UserProfile.groups.through)
+def touch_team_members(sender, instance, action, reverse, pk_set, **kwargs):
+    """Touch the tasks of the teams whose members changed."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        touch(Task.objects.filter(teams=instance.pk))
+    elif pk_set:
+        touch(Task.objects.filter(teams__in=pk_set))
+    else:
+        touch(Task.objects.filter(teams__in=instance.groups.values('pk')))
+
+
+@receiver(post_save, sender=UserProfile)
+def touch_user(sender, instance, update_fields, **kwargs):
+    """Touch the tasks created or achieved by a changed user.
+
+    The logins only change last_login, which is not in the tasks.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    touch(Task.objects.filter(created_by=instance.pk))
+    touch(Task.objects.filter(achieved_by=instance.pk))
+
+
+@receiver(post_save, sender=Task)
+def schedule_task_checks(sender, instance, **kwargs):
+    """Set the date from which a saved task has to be checked."""
+    schedule_checks([instance.pk])
+
+
+@receiver(post_save, sender=FieldObject)
+@receiver(post_delete, sender=FieldObject)
+def schedule_condition_checks(sender, instance, **kwargs):
+    """Set the date from which the task of a changed condition is checked."""
+    if instance.content_type_id == ContentType.objects.get_for_model(Task).pk:
+        schedule_checks([instance.object_id])
+
+
+@receiver(post_save, sender=Task)
+def clear_trigger_eta(sender, instance, **kwargs):
+    """Clear the forecast trigger date of a task over or triggered."""
+    if instance.trigger_eta is not None and (instance.over or instance.is_triggered):
+        instance.trigger_eta = None
+        Task.objects.filter(pk=instance.pk).update(trigger_eta=None)
+
+
+@receiver(post_save, sender=FieldObject)
+@receiver(post_delete, sender=FieldObject)
+def forecast_condition(sender, instance, **kwargs):
+    """Forecast the trigger date of the task of a changed condition."""
+    if instance.content_type_id == ContentType.objects.get_for_model(Task).pk:
+        forecast_tasks([instance.object_id])
+
+
+@receiver(pre_save, sender=FieldObject)
+def set_value_numeric(sender, instance, **kwargs):
+    """Set the numeric value of a field object from its value."""
+    instance.value_numeric = parse_number(instance.value)
+
+
+@receiver(pre_save, sender=FieldObject)
+def set_watched(sender, instance, **kwargs):
+    """Set the field object watched by a sensor trigger condition."""
+    watched_id = None
+    if instance.content_type_id == ContentType.objects.get_for_model(Task).pk:
+        watched_id = get_watched_id(instance)
+    if watched_id is not None and not FieldObject.objects.filter(pk=watched_id).exists():
+        watched_id = None
+    instance.watched_id = watched_id
+
+
+@receiver(post_save, sender=FieldObject)
+def record_reading(sender, instance, **kwargs):
+    """Record the value of a saved field object of an equipment, if numeric."""
+    record_readings([instance])
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Equipment)
+@receiver(post_save, sender=FieldObject)
+@receiver(post_save, sender=File)
+def record_change(sender, instance, **kwargs):
+    """Record the change of a saved synchronised object."""
+    record_changes(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Equipment)
+@receiver(post_delete, sender=FieldObject)
+@receiver(post_delete, sender=File)
+def record_deletion(sender, instance, **kwargs):
+    """Record the tombstone of a deleted synchronised object."""
+    record_changes(sender, [instance.pk], is_deleted=True)
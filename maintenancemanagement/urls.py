@@ -2,7 +2,14 @@
 
 from django.urls import path
 
-from .views import views_equipment, views_equipmentType, views_file, views_task
+from .views import (
+    views_equipment,
+    views_equipmentType,
+    views_file,
+    views_search,
+    views_sync,
+    views_task,
+)
 
 urlpatterns = []
 
@@ -10,6 +17,7 @@ urlpatterns_equipment = [
     path('equipments/', views_equipment.EquipmentList.as_view(), name='equipment-list'),
     path('equipments/<int:pk>/', views_equipment.EquipmentDetail.as_view(), name='equipment-detail'),
     path('equipments/requirements/', views_equipment.EquipmentRequirements.as_view(), name='equipement-requirements'),
+    path('equipments/import/', views_equipment.EquipmentImport.as_view(), name='equipment-import'),
     path(
         'removefieldfromequipment/',
         views_equipment.RemoveFieldFromEquipment.as_view(),
@@ -28,15 +36,29 @@ urlpatterns_task = [
     path('addteamtotask', views_task.AddTeamToTask.as_view(), name='add-team-to-task'),
     path('teamtasklist/<int:pk>', views_task.TeamTaskList.as_view(), name='team-task-list'),
     path('usertasklist/<int:pk>', views_task.UserTaskList.as_view(), name='team-task-list'),
-    path('tasks/requirements', views_task.TaskRequirements.as_view(), name='task_requirements')
+    path('tasks/requirements', views_task.TaskRequirements.as_view(), name='task_requirements'),
+    path('tasks/backtest', views_task.TriggerConditionsBacktest.as_view(), name='task_backtest'),
 ]
 
 urlpatterns_file = [
     path('files/', views_file.FileList.as_view(), name='file-list'),
-    path('files/<int:pk>/', views_file.FileDetail.as_view(), name='file-detail')
+    path('files/<int:pk>/', views_file.FileDetail.as_view(), name='file-detail'),
+    path('files/<int:pk>/download/', views_file.FileDownload.as_view(), name='file-download'),
+    path('files/uploads/', views_file.FileUploadList.as_view(), name='file-upload-list'),
+    path('files/uploads/<uuid:pk>/', views_file.FileUploadDetail.as_view(), name='file-upload-detail'),
+]
+
+urlpatterns_search = [
+    path('search/', views_search.Search.as_view(), name='search'),
+]
+
+urlpatterns_sync = [
+    path('sync/', views_sync.Sync.as_view(), name='sync'),
 ]
 
 urlpatterns += urlpatterns_equipment
 urlpatterns += urlpatterns_equipmenttype
 urlpatterns += urlpatterns_task
 urlpatterns += urlpatterns_file
+urlpatterns += urlpatterns_search
+urlpatterns += urlpatterns_sync
@@ -0,0 +1,75 @@
+"""This file maintains the versions of the objects sent to the clients.
+
+The versions are the updated_at dates of the objects sent in details and the
+changes of the synchronised objects.
+
+The details of a task or an equipment also change with their many to many
+relations, their field objects and the teams, users and files they contain,
+which don't save the task or the equipment. They touch it instead, from the
+signal receivers of signals.py and from the bulk writes, which send no
+signal. The bulk writes also record the changes of the objects they write.
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from .models import Change, Equipment, FieldObject, File, Task
+
+SYNCHRONISED_MODELS = (Task, Equipment, FieldObject, File)
+
+
+def record_changes(model, ids, is_deleted=False):
+    """Record a change of the objects of a model with the given ids.
+
+    The previous changes of the objects are deleted, the synchronisation
+    only needs the last one.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    content_type = ContentType.objects.get_for_model(model)
+    Change.objects.filter(content_type=content_type, object_id__in=ids).delete()
+    Change.objects.bulk_create(
+        [Change(content_type=content_type, object_id=pk, is_deleted=is_deleted) for pk in ids], batch_size=1000
+    )
+
+
+def touch(queryset):
+    """Set the updated_at date of the objects of a queryset to now.
+
+    A change of the objects is also recorded if they are synchronised.
+    """
+    if queryset.model not in SYNCHRONISED_MODELS:
+        return queryset.update(updated_at=timezone.now())
+    ids = list(queryset.values_list('pk', flat=True))
+    queryset.model.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+    record_changes(queryset.model, ids)
+    return len(ids)
+
+
+def touch_described_objects(field_objects):
+    """Touch the tasks and equipments described by the field objects.
+
+    The field objects are a queryset of FieldObject.
+    """
+    for model in (Task, Equipment):
+        content_type = ContentType.objects.get_for_model(model)
+        touch(model.objects.filter(pk__in=field_objects.filter(content_type=content_type).values('object_id')))
+
+
+def touch_field_object(field_object):
+    """Touch the task or the equipment described by a field object."""
+    model = ContentType.objects.get_for_id(field_object.content_type_id).model_class()
+    if model in (Task, Equipment):
+        touch(model.objects.filter(pk=field_object.object_id))
+
+
+def touch_file_owners(file_ids):
+    """Touch the tasks and equipments of the given files."""
+    touch(Task.objects.filter(files__in=file_ids))
+    touch(Equipment.objects.filter(files__in=file_ids))
+
+
+def touch_equipments(equipment_ids):
+    """Touch the given equipments."""
+    touch(Equipment.objects.filter(pk__in=equipment_ids))
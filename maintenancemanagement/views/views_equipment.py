@@ -6,26 +6,42 @@ from drf_yasg.utils import swagger_auto_schema
 
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
-from maintenancemanagement.models import (
-    Equipment,
-    EquipmentType,
-    Field,
-    FieldObject,
-)
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from maintenancemanagement.caches import get_equipment_requirements
+from maintenancemanagement.models import Equipment, EquipmentType, FieldObject
 from maintenancemanagement.serializers import (
     EquipmentCreateSerializer,
     EquipmentDetailsSerializer,
+    EquipmentFilterSerializer,
     EquipmentListingSerializer,
     EquipmentRequirementsSerializer,
     EquipmentUpdateSerializer,
-    FieldObjectCreateSerializer,
-    FieldObjectNewFieldValidationSerializer,
-    FieldObjectUpdateSerializer,
-    FieldObjectValidationSerializer,
 )
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from utils.audit import record_event
+from utils.conditional import (
+    add_validators,
+    get_not_modified_response,
+    get_version_validators,
+)
+from utils.equipment_import import (
+    ImportException,
+    import_equipments,
+    read_csv_rows,
+    read_ndjson_rows,
+)
+from utils.field_objects import (
+    FieldObjectsException,
+    create_field_objects,
+    get_expected_fields,
+    update_field_objects,
+    validate_field_object_updates,
+    validate_field_objects,
+)
+from utils.models import AuditEvent
 
 logger = logging.getLogger(__name__)
 
@@ -37,15 +53,11 @@ DELETE_EQUIPMENT = "maintenancemanagement.delete_equipment"
 UPDATED_LOGGER = "{user} UPDATED {object} with {params}"
 DELETED_LOGGER = "{user} DELETED {object}"
 
-
-def _get_expected_fields(equipment_type_id):
-    expected_fields_groups = EquipmentType.objects.get(id=equipment_type_id).fields_groups.all()
-    expected_fields = []
-    if expected_fields_groups:
-        for expected_fields_group in expected_fields_groups.all():
-            for expected_field in Field.objects.filter(field_group=expected_fields_group):
-                expected_fields.append(expected_field.id)
-    return expected_fields
+IMPORT_READERS = {
+    'text/csv': read_csv_rows,
+    'application/x-ndjson': read_ndjson_rows,
+    'application/ndjson': read_ndjson_rows,
+}
 
 
 class EquipmentList(APIView):
@@ -70,16 +82,24 @@ class EquipmentList(APIView):
 
     @swagger_auto_schema(
         operation_description='Send the list of Equipment in the database.',
-        query_serializer=None,
+        query_serializer=EquipmentFilterSerializer(many=False),
         responses={
             200: EquipmentListingSerializer(many=True),
+            400: "Bad request",
             401: "Unhauthorized",
         },
     )
     def get(self, request):
-        """Send the list of Equipment in the database."""
+        """Send the list of Equipment in the database.
+
+        The equipments can be filtered, searched and sorted with the query
+        parameters of EquipmentFilterSerializer.
+        """
         if request.user.has_perm(VIEW_EQUIPMENT):
-            equipments = Equipment.objects.all()
+            filter_serializer = EquipmentFilterSerializer(data=request.query_params.dict())
+            if not filter_serializer.is_valid():
+                return Response(filter_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            equipments = filter_serializer.filter_queryset(Equipment.objects.all())
             serializer = EquipmentListingSerializer(equipments, many=True)
             return Response(serializer.data)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
@@ -99,46 +119,24 @@ class EquipmentList(APIView):
             fields = request.data.pop('field', None)
             equipment_serializer = EquipmentCreateSerializer(data=request.data)
             if equipment_serializer.is_valid():
-                error = self._validate_fields(request, fields)
-                if error:
-                    return error
-                else:
+                try:
+                    validated_fields = validate_field_objects(
+                        fields, get_expected_fields(request.data.get('equipment_type'))
+                    )
+                except FieldObjectsException as e:
+                    return Response(e.error, status=status.HTTP_400_BAD_REQUEST)
+                with transaction.atomic():
                     equipment = equipment_serializer.save()
                     logger.info(
                         "{user} CREATED Equipment with {params}".format(user=request.user, params=request.data)
                     )
-                    self._save_fields(request, fields, equipment)
-                    equipment_details_serializer = EquipmentDetailsSerializer(equipment)
-                    return Response(equipment_details_serializer.data, status=status.HTTP_201_CREATED)
+                    create_field_objects(validated_fields, equipment, request.user)
+                record_event(equipment, AuditEvent.CREATED, request.user, equipment_serializer.validated_data)
+                equipment_details_serializer = EquipmentDetailsSerializer(equipment)
+                return Response(equipment_details_serializer.data, status=status.HTTP_201_CREATED)
             return Response(equipment_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
-    def _validate_fields(self, request, fields):
-        expected_fields = _get_expected_fields(request.data.get('equipment_type'))
-        if fields:
-            for field in fields:
-                if field.get('field') in expected_fields:
-                    expected_fields.remove(field.get('field'))
-                    validation_serializer = FieldObjectValidationSerializer(data=field)
-                else:
-                    validation_serializer = FieldObjectNewFieldValidationSerializer(data=field)
-                if not validation_serializer.is_valid():
-                    return Response(validation_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-        if expected_fields:
-            return Response(str(expected_fields) + " not expected", status=status.HTTP_400_BAD_REQUEST)
-
-    def _save_fields(self, request, fields, equipment):
-        if fields:
-            for field in fields:
-                if field.get('field', None) is None:
-                    field.update({'field': Field.objects.create(name=field.get('name')).pk})
-                field.update({'described_object': equipment})
-                field_object_serializer = FieldObjectCreateSerializer(data=field)
-                if field_object_serializer.is_valid():
-                    field_object_serializer.save()
-                    logger.info("{user} CREATED FieldObject with {params}".format(user=request.user, params=field))
-
 
 class EquipmentDetail(APIView):
     r"""
@@ -151,7 +149,8 @@ class EquipmentDetail(APIView):
     Return :
     response (Response) : the response.
 
-    GET request : return the equipment's data.
+    GET request : return the equipment's data, or HTTP 304 if the ETag or the \
+        date sent in If-None-Match or If-Modified-Since are current.
     PUT request : change the equipment with the data on the request \
             or send HTTP 400 if the data isn't well formed.
     DELETE request: delete the equipment and send HTTP 204.
@@ -170,6 +169,7 @@ class EquipmentDetail(APIView):
         query_serializer=None,
         responses={
             200: EquipmentDetailsSerializer(many=False),
+            304: "Not modified",
             401: "Unhauthorized",
             404: "Not found",
         },
@@ -177,12 +177,17 @@ class EquipmentDetail(APIView):
     def get(self, request, pk):
         """Send the Equipment corresponding to the given key."""
         try:
-            equipment = Equipment.objects.get(pk=pk)
+            equipment = Equipment.objects.select_related('equipment_type').get(pk=pk)
         except ObjectDoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
         if request.user.has_perm(VIEW_EQUIPMENT):
-            serializer = EquipmentDetailsSerializer(equipment)
-            return Response(serializer.data)
+            etag, last_modified = get_version_validators(equipment.updated_at, equipment.equipment_type.updated_at)
+            response = get_not_modified_response(request, etag, last_modified)
+            if response is None:
+                prefetch_related_objects([equipment], 'files__blob')
+                serializer = EquipmentDetailsSerializer(equipment)
+                response = add_validators(Response(serializer.data), etag, last_modified)
+            return response
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
     @swagger_auto_schema(
@@ -212,138 +217,49 @@ class EquipmentDetail(APIView):
                 else:
                     logger.info(UPDATED_LOGGER.format(user=request.user, object=repr(equipment), params=request.data))
                     equipment_serializer.save()
+                    record_event(equipment, AuditEvent.UPDATED, request.user, equipment_serializer.validated_data)
                     return Response(equipment_serializer.data, status=status.HTTP_200_OK)
             return Response(equipment_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
     def _update_equipment_with_equipment_type(self, request, equipment, equipment_serializer, field_objects):
-        if equipment.equipment_type.pk == request.data.get('equipment_type'):
-            new_field_objects, existing_field_objects = self._split_field_objects(field_objects)
-            error = self._validate_modification_fields(request, existing_field_objects)
-            if error:
-                return error
-            error = self._validate_new_fields(request, new_field_objects)
-            if error:
-                return error
-            logger.info(UPDATED_LOGGER.format(user=request.user, object=repr(equipment), params=request.data))
-            equipment = equipment_serializer.save()
-            self._save_modification_fields(request, existing_field_objects, equipment)
-            self._save_fields(request, new_field_objects, equipment)
-            equipment_details_serializer = EquipmentDetailsSerializer(equipment)
-            return Response(equipment_details_serializer.data, status=status.HTTP_200_OK)
-        else:
-            error = self._validate_fields(request, field_objects)
-            if error:
-                return error
+        try:
+            if equipment.equipment_type_id == request.data.get('equipment_type'):
+                new_field_objects, existing_field_objects = self._split_field_objects(field_objects)
+                updates = validate_field_object_updates(existing_field_objects, equipment)
+                validated_fields = validate_field_objects(new_field_objects, [])
             else:
+                updates = None
+                validated_fields = validate_field_objects(
+                    field_objects, get_expected_fields(request.data.get('equipment_type'))
+                )
+        except FieldObjectsException as e:
+            return Response(e.error, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            if updates is None:
                 content_type = ContentType.objects.get_for_model(equipment)
                 old_fields = FieldObject.objects.filter(object_id=equipment.pk, content_type=content_type)
                 for old_field in old_fields:
                     logger.info(DELETED_LOGGER.format(user=request.user, object=repr(old_field)))
-                    old_field.delete()
-                logger.info(UPDATED_LOGGER.format(user=request.user, object=repr(equipment), params=request.data))
-                equipment = equipment_serializer.save()
-                self._save_fields(request, field_objects, equipment)
-                equipment_details_serializer = EquipmentDetailsSerializer(equipment)
-                return Response(equipment_details_serializer.data, status=status.HTTP_200_OK)
+                old_fields.delete()
+            else:
+                update_field_objects(updates, request.user)
+            logger.info(UPDATED_LOGGER.format(user=request.user, object=repr(equipment), params=request.data))
+            equipment = equipment_serializer.save()
+            create_field_objects(validated_fields, equipment, request.user)
+        record_event(equipment, AuditEvent.UPDATED, request.user, equipment_serializer.validated_data)
+        equipment_details_serializer = EquipmentDetailsSerializer(equipment)
+        return Response(equipment_details_serializer.data, status=status.HTTP_200_OK)
 
     def _split_field_objects(self, field_objects):
         new_field_objects, existing_field_objects = [], []
-        for field_object in field_objects:
+        for field_object in field_objects or []:
             if field_object.get('id') is not None:
                 existing_field_objects.append(field_object)
             else:
                 new_field_objects.append(field_object)
         return new_field_objects, existing_field_objects
 
-    def _validate_new_fields(self, request, new_fields):
-        if new_fields:
-            for new_field in new_fields:
-                validation_serializer = FieldObjectNewFieldValidationSerializer(data=new_field)
-                if not validation_serializer.is_valid():
-                    return Response(validation_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    def _get_expected_fields(self, request):
-        expected_fields_groups = EquipmentType.objects.get(id=request.data.get('equipment_type')).fields_groups.all()
-        expected_fields = []
-        if expected_fields_groups:
-            for expected_fields_group in expected_fields_groups.all():
-                for expected_field in Field.objects.filter(field_group=expected_fields_group):
-                    expected_fields.append(expected_field.id)
-        return expected_fields
-
-    def _validate_fields(self, request, fields):
-        expected_fields = self._get_expected_fields(request)
-        if fields:
-            for field in fields:
-                if field.get('field') in expected_fields:
-                    expected_fields.remove(field.get('field'))
-                    validation_serializer = FieldObjectValidationSerializer(data=field)
-                else:
-                    validation_serializer = FieldObjectNewFieldValidationSerializer(data=field)
-                if not validation_serializer.is_valid():
-                    return Response(validation_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-        if expected_fields:
-            return Response(str(expected_fields) + " not expected", status=status.HTTP_400_BAD_REQUEST)
-
-    def _save_fields(self, request, fields, equipment):
-        if fields:
-            for field in fields:
-                if field.get('field', None) is None:
-                    field.update({'field': Field.objects.create(name=field.get('name')).pk})
-                    logger.info(
-                        "{user} CREATED Field with {params}".format(
-                            user=request.user, params={"name": field.get('name')}
-                        )
-                    )
-                field.update({'described_object': equipment})
-                field_object_serializer = FieldObjectCreateSerializer(data=field)
-                if field_object_serializer.is_valid():
-                    field_object_serializer.save()
-                    logger.info("{user} CREATED FieldObject with {params}".format(user=request.user, params=field))
-
-    def _validate_modification_fields(self, request, field_objects):
-        if field_objects:
-            for field_object in field_objects:
-                try:
-                    FieldObject.objects.get(pk=field_object.get('id'))
-                    field = Field.objects.get(pk=field_object.get('field'))
-                    if field.value_set is not None and field_object.get('field_value', None) is not None:
-                        if field_object.get('field_value').get('value', None) not in field.value_set.values_list(
-                            'value', flat=True
-                        ):
-                            return Response(
-                                field_object.get('field_value', None).get('value', None) + " is not a valid value",
-                                status=status.HTTP_400_BAD_REQUEST
-                            )
-                    elif field_object.get('value', None) is None:
-                        return Response(
-                            field_object.get('name') + " cant be null !", status=status.HTTP_400_BAD_REQUEST
-                        )
-                except ObjectDoesNotExist:
-                    return Response(
-                        "Field " + str(field_object.get('field')) + " doesn't exist",
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-    def _save_modification_fields(self, request, field_objects, equipment):
-        if field_objects:
-            for field_object_data in field_objects:
-                field_object = FieldObject.objects.get(pk=field_object_data.get('id'))
-                if field_object_data.get('field_value') is not None:
-                    field_object_data.update({"value": field_object_data.get('field_value').get('value')})
-                    field_object_data.update({'field_value': None})
-
-                field_object_serializer = FieldObjectUpdateSerializer(
-                    field_object, data=field_object_data, partial=True
-                )
-                if field_object_serializer.is_valid():
-                    logger.info(
-                        UPDATED_LOGGER.format(user=request.user, object=repr(field_object), params=field_object_data)
-                    )
-                    field_object_serializer.save()
-
     @swagger_auto_schema(
         operation_description='Delete the Equipment corresponding to the given key.',
         query_serializer=None,
@@ -361,25 +277,81 @@ class EquipmentDetail(APIView):
             return Response(status=status.HTTP_404_NOT_FOUND)
         if request.user.has_perm(DELETE_EQUIPMENT):
             logger.info(DELETED_LOGGER.format(user=request.user, object=repr(equipment)))
+            record_event(equipment, AuditEvent.DELETED, request.user)
             equipment.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
 
+class EquipmentImport(APIView):
+    r"""
+    \n# Import equipments of an equipment type from a CSV or NDJSON file.
+
+    The query parameter equipment_type is the id of the equipment type of the
+    imported equipments. The body of the request is the file, sent with the
+    Content-Type text/csv or application/x-ndjson. Each row contains the name
+    of the equipment and a value for each field of the equipment type, under
+    the name of the field (the first line of a CSV file contains the names).
+
+    The valid rows are imported and the response is a report containing the
+    number of created equipments and the errors of the invalid rows :
+    {
+        "created": 2,
+        "errors": [{"line": 3, "errors": {"Marque": ["..."]}}]
+    }
+    """
+
+    @swagger_auto_schema(
+        operation_description='Import equipments of an equipment type from a CSV or NDJSON file.',
+        query_serializer=None,
+        responses={
+            200: "The import report",
+            400: "Bad request",
+            401: "Unhauthorized",
+            404: "Not found",
+            415: "Unsupported media type",
+        },
+    )
+    def post(self, request):
+        """Import equipments of an equipment type from a CSV or NDJSON file."""
+        if request.user.has_perm(ADD_EQUIPMENT):
+            try:
+                equipment_type = EquipmentType.objects.get(pk=int(request.query_params.get('equipment_type')))
+            except (TypeError, ValueError):
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            except ObjectDoesNotExist:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            media_type = request.content_type.split(';')[0].strip()
+            if media_type not in IMPORT_READERS:
+                return Response(status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+            if request.stream is None:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            try:
+                report = import_equipments(equipment_type, IMPORT_READERS[media_type](request.stream), request.user)
+            except ImportException as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(report)
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+
 class EquipmentRequirements(APIView):
     """The view to get all equipements with their values."""
 
     @swagger_auto_schema(
         operation_description='Send the list of equipement types with their fields and the values associated.',
-        responses={200: 'The request went well.'}
+        responses={
+            200: EquipmentRequirementsSerializer(many=True),
+            401: "Unhauthorized",
+        },
     )
     def get(self, request):
         """Send the list of equipement types with their fields \
-            and the values associated."""
+            and the values associated.
+
+        The list is read from the cache, see caches.py.
+        """
         if request.user.has_perm(ADD_EQUIPMENT):
-            equipment_types = EquipmentType.objects.all()
-            serializer = EquipmentRequirementsSerializer(equipment_types, many=True)
-            return Response(serializer.data)
+            return Response(get_equipment_requirements())
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
 
@@ -399,7 +371,7 @@ class RemoveFieldFromEquipment(APIView):
                     return Response(
                         str(field_object) + ' is not a field of ' + str(equipment), status=status.HTTP_400_BAD_REQUEST
                     )
-                if field_object.field.id not in _get_expected_fields(equipment.equipment_type.id):
+                if field_object.field.id not in get_expected_fields(equipment.equipment_type.id):
                     logger.info(DELETED_LOGGER.format(user=request.user, object=repr(field_object)))
                     field_object.field.delete()
                     return Response(status=status.HTTP_204_NO_CONTENT)
@@ -6,10 +6,12 @@ from drf_yasg.utils import swagger_auto_schema
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Count, Max
 from maintenancemanagement.models import EquipmentType, FieldGroup, Field, FieldValue
 from maintenancemanagement.serializers import (
     EquipmentTypeCreateSerializer,
     EquipmentTypeDetailsSerializer,
+    EquipmentTypeFilterSerializer,
     EquipmentTypeQuerySerializer,
     EquipmentTypeSerializer,
     EquipmentTypeValidationSerializer,
@@ -21,6 +23,11 @@ from maintenancemanagement.serializers import (
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from utils.conditional import (
+    add_validators,
+    get_not_modified_response,
+    get_version_validators,
+)
 
 logger = logging.getLogger(__name__)
 User = settings.AUTH_USER_MODEL
@@ -54,16 +61,24 @@ class EquipmentTypeList(APIView):
 
     @swagger_auto_schema(
         operation_description='Send the list of EquipmentType in the database.',
-        query_serializer=None,
+        query_serializer=EquipmentTypeFilterSerializer(many=False),
         responses={
             200: EquipmentTypeSerializer(many=True),
+            400: "Bad request",
             401: "Unhauthorized",
         },
     )
     def get(self, request):
-        """Send the list of EquipmentType in the database."""
+        """Send the list of EquipmentType in the database.
+
+        The equipment types can be searched and sorted with the query
+        parameters of EquipmentTypeFilterSerializer.
+        """
         if request.user.has_perm(VIEW_EQUIPMENTTYPE):
-            equipment_types = EquipmentType.objects.all()
+            filter_serializer = EquipmentTypeFilterSerializer(data=request.query_params.dict())
+            if not filter_serializer.is_valid():
+                return Response(filter_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            equipment_types = filter_serializer.filter_queryset(EquipmentType.objects.all())
             serializer = EquipmentTypeSerializer(equipment_types, many=True)
             return Response(serializer.data)
         else:
@@ -153,7 +168,9 @@ class EquipmentTypeDetail(APIView):
     Return :
     response (Response) : the response.
 
-    GET request : return the equipment type's data.
+    GET request : return the equipment type's data, or HTTP 304 if the \
+        ETag or the date sent in If-None-Match or If-Modified-Since are \
+        current.
     PUT request : change the equipment type with the data on the request \
         or if the data isn't well formed, send HTTP 400.
     DELETE request: delete the equipment type and send HTTP 204.
@@ -171,6 +188,7 @@ class EquipmentTypeDetail(APIView):
         query_serializer=None,
         responses={
             200: EquipmentTypeDetailsSerializer(many=False),
+            304: "Not modified",
             401: "Unhauthorized",
             404: "Not found",
         },
@@ -178,12 +196,20 @@ class EquipmentTypeDetail(APIView):
     def get(self, request, pk):
         """Send the EquipmentType corresponding to the given key."""
         try:
-            equipment_type = EquipmentType.objects.get(pk=pk)
+            equipment_type = EquipmentType.objects.annotate(
+                equipments_updated_at=Max('equipment__updated_at'), equipments_count=Count('equipment')
+            ).get(pk=pk)
         except ObjectDoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
         if request.user.has_perm(VIEW_EQUIPMENTTYPE):
-            serializer = EquipmentTypeDetailsSerializer(equipment_type)
-            return Response(serializer.data)
+            etag, last_modified = get_version_validators(
+                equipment_type.updated_at, equipment_type.equipments_updated_at, equipment_type.equipments_count
+            )
+            response = get_not_modified_response(request, etag, last_modified)
+            if response is None:
+                serializer = EquipmentTypeDetailsSerializer(equipment_type)
+                response = add_validators(Response(serializer.data), etag, last_modified)
+            return response
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
     @swagger_auto_schema(
@@ -2,15 +2,31 @@
 
 # Create your views here.
 import logging
+import os
 
 from drf_yasg.utils import swagger_auto_schema
 
 from django.core.exceptions import ObjectDoesNotExist
-from maintenancemanagement.models import File
-from maintenancemanagement.serializers import FileSerializer
+from django.db import transaction
+from maintenancemanagement.models import File, UploadSession
+from maintenancemanagement.serializers import (
+    FileSerializer,
+    UploadSessionSerializer,
+)
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from utils.file_storage import create_file_from_blob
+from utils.previews import VARIANTS, preview_path
+from utils.responses import file_response
+from utils.uploads import (
+    UploadException,
+    UploadOffsetException,
+    UploadRangeException,
+    delete_session,
+    finish_upload,
+    write_chunk,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +45,7 @@ class FileList(APIView):
     def get(self, request):
         """Send the list of File in the database."""
         if request.user.is_authenticated :
-            files = File.objects.all()
+            files = File.objects.select_related('blob')
             serializer = FileSerializer(files, many=True)
             return Response(serializer.data)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
@@ -44,8 +60,15 @@ class FileList(APIView):
         },
     )
     def post(self, request):
-        """Add a File into the database."""
+        """Add a File into the database.
+
+        If the request contains the sha256 of the content instead of the file
+        and this content is already stored, the File is created without
+        uploading it again. Otherwise, HTTP 404 is sent.
+        """
         if request.user.is_authenticated :
+            if 'file' not in request.data and request.data.get('sha256'):
+                return _create_file_from_sha256(request)
             serializer = FileSerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save()
@@ -54,6 +77,15 @@ class FileList(APIView):
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
 
+def _create_file_from_sha256(request):
+    is_manual = str(request.data.get('is_manual', True)).lower() != 'false'
+    file = create_file_from_blob(request.data.get('sha256'), is_manual)
+    if file is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    logger.info("{user} CREATED File with {params}".format(user=request.user, params=request.data))
+    return Response(FileSerializer(file).data, status=status.HTTP_201_CREATED)
+
+
 class FileDetail(APIView):
     """Retrieve or delete a File."""
 
@@ -69,7 +101,7 @@ class FileDetail(APIView):
     def get(self, request, pk):
         """Send the File corresponding to the given key."""
         try:
-            file = File.objects.get(pk=pk)
+            file = File.objects.select_related('blob').get(pk=pk)
         except ObjectDoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
         if request.user.is_authenticated :
@@ -96,3 +128,202 @@ class FileDetail(APIView):
             file.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+
+class FileDownload(APIView):
+    r"""
+    \n# Download the content of a File.
+
+    The file is streamed and the view supports the Range, If-Range and
+    If-None-Match headers, so clients can resume a download or revalidate a
+    file they already have. With settings.FILE_DOWNLOAD_MODE, the sending can
+    be delegated to the front web server (X-Sendfile or X-Accel-Redirect).
+
+    The query parameter variant (thumbnail or preview) sends the thumbnail or
+    the first page preview of the file instead. HTTP 404 is sent while they
+    are not generated.
+    """
+
+    @swagger_auto_schema(
+        operation_description='Send the content of the File corresponding to the given key.',
+        query_serializer=None,
+        responses={
+            200: "The file content",
+            206: "Partial content",
+            304: "Not modified",
+            400: "Bad request",
+            401: "Unhauthorized",
+            404: "Not found",
+            416: "Range not satisfiable",
+        },
+    )
+    def get(self, request, pk):
+        """Send the content of the File corresponding to the given key."""
+        try:
+            file = File.objects.select_related('blob').get(pk=pk)
+        except ObjectDoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if request.user.is_authenticated :
+            variant = request.query_params.get('variant')
+            if variant is None:
+                path, name = file.file.path, file.file.name
+            elif variant in VARIANTS:
+                path = preview_path(file, variant)
+                if path is None:
+                    return Response(status=status.HTTP_404_NOT_FOUND)
+                name = os.path.splitext(file.file.name)[0] + os.path.splitext(path)[1]
+            else:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            if file.blob_id is not None:
+                etag = file.blob.sha256 if variant is None else '{}-{}'.format(file.blob.sha256, variant)
+            else:
+                etag = '{:x}-{:x}'.format(stat.st_size, stat.st_mtime_ns)
+            return file_response(request, path, name, etag, last_modified=stat.st_mtime)
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+
+class FileUploadList(APIView):
+    r"""
+    \n# Start a chunked upload of a File.
+
+    The request must contain :
+        - file_name (String): the name of the file
+        - size (int): the size of the whole file in bytes
+    The request can also contain :
+        - is_manual (Boolean)
+        - sha256 (String): the hash of the whole file, checked at the end
+
+    The chunks are then sent with PUT requests on the created upload session.
+    If a file with the same sha256 is already stored, no session is created and
+    the File is directly sent with HTTP 201.
+    """
+
+    @swagger_auto_schema(
+        operation_description='Start a chunked upload of a File.',
+        query_serializer=UploadSessionSerializer(many=False),
+        responses={
+            201: UploadSessionSerializer(many=False),
+            400: "Bad request",
+            401: "Unhauthorized",
+        },
+    )
+    def post(self, request):
+        """Start a chunked upload of a File."""
+        if request.user.is_authenticated :
+            serializer = UploadSessionSerializer(data=request.data)
+            if serializer.is_valid():
+                data = serializer.validated_data
+                if data.get('sha256'):
+                    file = create_file_from_blob(data['sha256'], data.get('is_manual', True))
+                    if file is not None:
+                        return Response(FileSerializer(file).data, status=status.HTTP_201_CREATED)
+                serializer.save(user=request.user)
+                return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+
+class FileUploadDetail(APIView):
+    r"""
+    \n# Send the chunks of a File, get or cancel the upload.
+
+    GET request : send the upload session, its offset is where the next
+        chunk must start to resume an interrupted upload.
+    PUT request : append the raw body of the request to the file. The
+        Content-Range header (bytes start-end/size) must start at the offset,
+        otherwise HTTP 409 is sent with the session. A body of another length
+        than the range is refused with HTTP 400 and the offset is kept. When
+        the last chunk is received, the file is checked and HTTP 201 is sent
+        with the File.
+    DELETE request : cancel the upload.
+    """
+
+    @swagger_auto_schema(
+        operation_description='Send the upload session corresponding to the given key.',
+        query_serializer=None,
+        responses={
+            200: UploadSessionSerializer(many=False),
+            401: "Unhauthorized",
+            404: "Not found",
+        },
+    )
+    def get(self, request, pk):
+        """Send the upload session corresponding to the given key."""
+        if request.user.is_authenticated :
+            try:
+                session = UploadSession.objects.get(pk=pk, user=request.user)
+            except ObjectDoesNotExist:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            return Response(UploadSessionSerializer(session).data)
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+    @swagger_auto_schema(
+        operation_description='Append a chunk to the upload session corresponding to the given key.',
+        query_serializer=None,
+        responses={
+            200: UploadSessionSerializer(many=False),
+            201: FileSerializer(many=False),
+            400: "Bad request",
+            401: "Unhauthorized",
+            404: "Not found",
+            409: "Conflict",
+        },
+    )
+    def put(self, request, pk):
+        """Append a chunk to the upload session of the given key."""
+        if request.user.is_authenticated :
+            with transaction.atomic():
+                try:
+                    session = UploadSession.objects.select_for_update().get(pk=pk, user=request.user)
+                except ObjectDoesNotExist:
+                    return Response(status=status.HTTP_404_NOT_FOUND)
+                start, end = _get_chunk_range(request, session)
+                try:
+                    if request.stream is not None:
+                        write_chunk(session, request.stream, start, end)
+                    if session.offset < session.size:
+                        return Response(UploadSessionSerializer(session).data)
+                    file = finish_upload(session)
+                except UploadOffsetException:
+                    return Response(UploadSessionSerializer(session).data, status=status.HTTP_409_CONFLICT)
+                except UploadRangeException as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                except UploadException as e:
+                    delete_session(session)
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            logger.info("{user} UPLOADED File with {params}".format(user=request.user, params=file.file.name))
+            return Response(FileSerializer(file).data, status=status.HTTP_201_CREATED)
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+    @swagger_auto_schema(
+        operation_description='Cancel the upload session corresponding to the given key.',
+        query_serializer=None,
+        responses={
+            204: "No content",
+            401: "Unhauthorized",
+            404: "Not found",
+        },
+    )
+    def delete(self, request, pk):
+        """Cancel the upload session corresponding to the given key."""
+        if request.user.is_authenticated :
+            try:
+                session = UploadSession.objects.get(pk=pk, user=request.user)
+            except ObjectDoesNotExist:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            delete_session(session)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+
+def _get_chunk_range(request, session):
+    content_range = request.META.get('HTTP_CONTENT_RANGE', '')
+    try:
+        start, end = content_range.split(' ')[1].split('/')[0].split('-')
+        return int(start), int(end)
+    except (IndexError, ValueError):
+        return session.offset, None
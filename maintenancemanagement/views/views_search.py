@@ -0,0 +1,54 @@
+"""This module defines the view of the search."""
+
+from drf_yasg.utils import swagger_auto_schema
+
+from maintenancemanagement.serializers import (
+    SearchQuerySerializer,
+    SearchResultSerializer,
+)
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from utils.search import search
+
+
+class Search(APIView):
+    r"""
+    \n# Search the tasks and equipments.
+
+    Parameter :
+    request (HttpRequest) : the request coming from the front-end
+
+    Return :
+    response (Response) : the response.
+
+    GET request : search the query in the names and descriptions of the \
+        tasks, the names of the equipments and their field values.
+    - The request must contain q (the searched text, at least 3 \
+        characters) and can contain page and page_size (at most 100).
+    - Only the tasks and equipments the user can view are searched. If the \
+        user is not authenticated, it will send HTTP 401.
+    """
+
+    @swagger_auto_schema(
+        operation_description='Send the tasks and equipments matching the query, the most similar first.',
+        query_serializer=SearchQuerySerializer(many=False),
+        responses={
+            200: SearchResultSerializer(many=True),
+            400: "Bad request",
+            401: "Unhauthorized",
+        },
+    )
+    def get(self, request):
+        """Send a page of the results of the search with their count."""
+        if request.user.is_authenticated:
+            query_serializer = SearchQuerySerializer(data=request.query_params.dict())
+            if not query_serializer.is_valid():
+                return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            page = query_serializer.validated_data['page']
+            page_size = query_serializer.validated_data['page_size']
+            count, results = search(
+                query_serializer.validated_data['q'], request.user, offset=(page - 1) * page_size, limit=page_size
+            )
+            return Response({'count': count, 'results': SearchResultSerializer(results, many=True).data})
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
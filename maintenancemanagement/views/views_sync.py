@@ -0,0 +1,58 @@
+"""This module defines the view of the synchronisation of the clients."""
+
+from drf_yasg.utils import swagger_auto_schema
+
+from maintenancemanagement.serializers import SyncQuerySerializer
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from utils.sync import get_changes, is_expired
+
+
+class Sync(APIView):
+    r"""
+    \n# Send the objects changed since the last synchronisation.
+
+    Parameter :
+    request (HttpRequest) : the request coming from the front-end
+
+    Return :
+    response (Response) : the response.
+
+    GET request : send the tasks, equipments, field objects and files \
+        created, updated or deleted since the given token.
+    - The request can contain since (the token of the last \
+        synchronisation, 0 or nothing for the first one).
+    - The response contains token (the token of the next \
+        synchronisation), more (true if other changes follow and the \
+        request must be sent again with the new token), the changed \
+        objects by type and deleted, the ids of the deleted objects by type.
+    - Only the objects the user can view are sent. If the user is not \
+        authenticated, it will send HTTP 401.
+    - If the token is older than the kept deletions, it will send \
+        HTTP 410 and the client must synchronise again from 0.
+    """
+
+    @swagger_auto_schema(
+        operation_description='Send the objects changed since the given token.',
+        query_serializer=SyncQuerySerializer(many=False),
+        responses={
+            200: "Ok",
+            400: "Bad request",
+            401: "Unhauthorized",
+            410: "Token expired",
+        },
+    )
+    def get(self, request):
+        """Send the objects changed since the given token."""
+        if request.user.is_authenticated:
+            query_serializer = SyncQuerySerializer(data=request.query_params.dict())
+            if not query_serializer.is_valid():
+                return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            since = query_serializer.validated_data['since']
+            if is_expired(since):
+                return Response(
+                    {'error': 'The token is too old, synchronise again from 0.'}, status=status.HTTP_410_GONE
+                )
+            return Response(get_changes(since, request.user))
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
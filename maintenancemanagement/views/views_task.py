@@ -1,12 +1,18 @@
 """This module defines the views corresponding to the tasks."""
 
 import logging
-from datetime import date
 
 from drf_yasg.utils import swagger_auto_schema
 
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import prefetch_related_objects
+from maintenancemanagement.caches import (
+    get_task_requirements,
+    get_user_task_feed,
+    set_task_requirements,
+    set_user_task_feed,
+)
 from maintenancemanagement.models import (
     Field,
     FieldGroup,
@@ -19,10 +25,12 @@ from maintenancemanagement.serializers import (
     FieldObjectValidationSerializer,
     TaskCreateSerializer,
     TaskDetailsSerializer,
+    TaskFilterSerializer,
     TaskListingSerializer,
     TaskSerializer,
     TaskTemplateRequirementsSerializer,
     TaskUpdateSerializer,
+    TriggerConditionsBacktestSerializer,
     TriggerConditionsCreateSerializer,
     TriggerConditionsValidationSerializer,
 )
@@ -31,7 +39,16 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from usersmanagement.models import Team, UserProfile
 from usersmanagement.views.views_team import belongs_to_team
+from utils.audit import record_event
+from utils.backtest import backtest
+from utils.conditional import (
+    add_validators,
+    get_not_modified_response,
+    get_version_validators,
+)
 from utils.methods import parse_time
+from utils.models import AuditEvent
+from utils.recurrence import regenerate_tasks
 
 logger = logging.getLogger(__name__)
 VIEW_TASK = "maintenancemanagement.view_task"
@@ -72,20 +89,30 @@ class TaskList(APIView):
 
     @swagger_auto_schema(
         operation_description='Send the list of Task in the database.',
-        query_serializer=None,
+        query_serializer=TaskFilterSerializer(many=False),
         responses={
             200: TaskListingSerializer(many=True),
+            400: "Bad request",
             401: "Unhauthorized",
         },
     )
     def get(self, request):
-        """Send the list of Task in the database."""
+        """Send the list of Task in the database.
+
+        The tasks can be filtered, searched and sorted with the query
+        parameters of TaskFilterSerializer. Without template=true, only the
+        tasks which are not templates are sent.
+        """
         if request.user.has_perm(VIEW_TASK):
-            only_template = request.GET.get("template", None)
-            if only_template == "true":
-                tasks = Task.objects.filter(is_template=True)
+            filter_serializer = TaskFilterSerializer(data=request.query_params.dict())
+            if not filter_serializer.is_valid():
+                return Response(filter_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            if filter_serializer.validated_data.get('template', False):
+                tasks = filter_serializer.filter_queryset(Task.objects.filter(is_template=True))
             else:
-                tasks = Task.objects.filter(is_template=False).order_by('over', 'end_date')
+                tasks = filter_serializer.filter_queryset(
+                    Task.objects.filter(is_template=False), default_ordering=['over', 'end_date']
+                )
             serializer = TaskListingSerializer(tasks, many=True)
             return Response(serializer.data)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
@@ -113,6 +140,10 @@ class TaskList(APIView):
                 task.created_by = request.user
                 task.save()
                 logger.info("{user} CREATED Task with {params}".format(user=request.user, params=request.data))
+                record_event(
+                    task, AuditEvent.CREATED, request.user,
+                    list(task_serializer.validated_data) + ['is_triggered', 'created_by']
+                )
                 self._save_conditions(request, conditions, task)
                 return Response(task_serializer.data, status=status.HTTP_201_CREATED)
             return Response(task_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -179,7 +210,8 @@ class TaskDetail(APIView):
     Return :
     response (Response) : the response.
 
-    GET request : return the task's data.
+    GET request : return the task's data, or HTTP 304 if the ETag or the \
+        date sent in If-None-Match or If-Modified-Since are current.
     PUT request : change the task with the data on the request \
         or if the data isn't well formed, send HTTP 400.
     DELETE request: delete the task and send HTTP 204.
@@ -205,6 +237,7 @@ class TaskDetail(APIView):
         query_serializer=None,
         responses={
             200: TaskDetailsSerializer(many=False),
+            304: "Not modified",
             401: "Unhauthorized",
             404: "Not found",
         },
@@ -212,12 +245,21 @@ class TaskDetail(APIView):
     def get(self, request, pk):
         """Send the Task corresponding to the given key."""
         try:
-            task = Task.objects.get(pk=pk)
+            task = Task.objects.select_related('equipment__equipment_type', 'equipment_type').get(pk=pk)
         except ObjectDoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
         if request.user.has_perm(VIEW_TASK) or participate_to_task(request.user, task):
-            serializer = TaskDetailsSerializer(task)
-            return Response(serializer.data)
+            etag, last_modified = get_version_validators(
+                task.updated_at, task.equipment and task.equipment.updated_at,
+                task.equipment and task.equipment.equipment_type.updated_at,
+                task.equipment_type and task.equipment_type.updated_at
+            )
+            response = get_not_modified_response(request, etag, last_modified)
+            if response is None:
+                prefetch_related_objects([task], 'files__blob', 'equipment__files__blob')
+                serializer = TaskDetailsSerializer(task)
+                response = add_validators(Response(serializer.data), etag, last_modified)
+            return response
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
     @swagger_auto_schema(
@@ -247,6 +289,10 @@ class TaskDetail(APIView):
                     logger.info(UPDATED_LOGGER.format(user=request.user, object=repr(task), params=data))
                     task = serializer.save()
                     self._check_if_over(request, task)
+                    record_event(
+                        task, AuditEvent.UPDATED, request.user,
+                        list(serializer.validated_data) + ['over', 'achieved_by']
+                    )
                     serializer_details = TaskDetailsSerializer(task)
                     return Response(serializer_details.data)
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -267,7 +313,7 @@ class TaskDetail(APIView):
                         task.files.add(end_file)
                         logger.info(UPDATED_LOGGER.format(user=request.user, object=repr(task), params=data))
                         task.save()
-                        end_condition.update({'value': end_file.file.path})
+                        end_condition.update({'value': end_file.file.name})
                     field_object_serializer = FieldObjectCreateSerializer(
                         field_object, data=end_condition, partial=True
                     )
@@ -290,55 +336,14 @@ class TaskDetail(APIView):
                 over = False
         if over is True:
             task.achieved_by = request.user
-
-            content_type_object = ContentType.objects.get_for_model(task)
-            if FieldObject.objects.filter(
-                object_id=task.id, content_type=content_type_object, field__field_group__name='Trigger Conditions'
-            ).count() > 0:
-                self._generate_new_task(request, task)
+            for new_task in regenerate_tasks([task]):
+                logger.info("{user} TRIGGER RECURRENT TASK ON {task}".format(user=request.user, task=new_task))
         task.over = over
         logger.info(
             "{user} UPDATED {object} with {params}".format(user=request.user, object=repr(task), params=request.data)
         )
         task.save()
 
-    def _generate_new_task(self, request, task):
-        content_type_object = ContentType.objects.get_for_model(task)
-        old_trigger_conditions = FieldObject.objects.filter(
-            object_id=task.id, content_type=content_type_object, field__field_group__name='Trigger Conditions'
-        )
-        end_fields_objects = FieldObject.objects.filter(
-            object_id=task.id, content_type=content_type_object, field__field_group__name='End Conditions'
-        )
-
-        new_task = Task.objects.get(pk=task.pk)
-        new_task.pk = None
-        new_task.achieved_by = None
-        new_task.save()
-        for old_trigger_condition in old_trigger_conditions:
-            self._create_new_trigger_condition(old_trigger_condition, new_task)
-        for end in end_fields_objects:
-            FieldObject.objects.create(described_object=new_task, field=end.field, description=end.description)
-
-        logger.info("{user} TRIGGER RECURRENT TASK ON {task}".format(user=request.user, task=new_task))
-
-    def _create_new_trigger_condition(self, trigger_condition, task):
-        new_trigger_condition = trigger_condition
-        new_trigger_condition.pk = None
-        new_trigger_condition.described_object = task
-        if trigger_condition.field.name == 'Recurrence':
-            new_trigger_condition.save()
-            task.end_date = date.today() + parse_time(trigger_condition.value.split('|')[0])
-            task.save()
-        elif trigger_condition.field.name == 'Frequency':
-            splited = trigger_condition.value.split('|')
-            trigger_condition.value = '|'.join(splited[:3])
-            new_frequency = float(FieldObject.objects.get(id=int(splited[1])).value) + float(splited[0])
-            trigger_condition.value += f'|{new_frequency}'
-            trigger_condition.save()
-        else:
-            trigger_condition.save()
-
     @swagger_auto_schema(
         operation_description='Delete the Task corresponding to the given key.',
         query_serializer=None,
@@ -356,6 +361,7 @@ class TaskDetail(APIView):
             return Response(status=status.HTTP_404_NOT_FOUND)
         if request.user.has_perm(DELETE_TASK):
             logger.info("{user} DELETED {object}".format(user=request.user, object=repr(task)))
+            record_event(task, AuditEvent.DELETED, request.user)
             task.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
@@ -470,6 +476,11 @@ class UserTaskList(APIView):
     response (Response) : the response.
 
     GET request : list all tasks of the user.
+    - The list is cached until the tasks, their teams or the members of \
+        the teams change.
+    - The response has ETag and Last-Modified headers. If the request \
+        sends them back in If-None-Match or If-Modified-Since and the list \
+        didn't change, it will send HTTP 304 without the list.
     """
 
     @swagger_auto_schema(
@@ -477,24 +488,29 @@ class UserTaskList(APIView):
         query_serializer=None,
         responses={
             200: TaskListingSerializer(many=True),
+            304: "Not modified",
             401: "Unhauthorized",
             404: "Not found",
         },
     )
     def get(self, request, pk):
         """Send the list of Task corresponding to the given User key."""
-        try:
-            user = UserProfile.objects.get(pk=pk)
-        except ObjectDoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
-
-        if request.user.has_perm(VIEW_TASK) or request.user == user:
+        if request.user.pk != pk:
+            if not UserProfile.objects.filter(pk=pk).exists():
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            if not request.user.has_perm(VIEW_TASK):
+                return Response(status=status.HTTP_401_UNAUTHORIZED)
+        feed = get_user_task_feed(pk)
+        if feed is None:
             tasks = Task.objects.filter(
-                teams__pk__in=user.groups.all().values_list("id", flat=True).iterator(), is_template=False
-            ).distinct().order_by('over', 'end_date')
-            serializer = TaskListingSerializer(tasks, many=True)
-            return Response(serializer.data)
-        return Response(status=status.HTTP_401_UNAUTHORIZED)
+                teams__pk__in=UserProfile.groups.through.objects.filter(userprofile=pk).values('group'),
+                is_template=False
+            ).distinct().order_by('over', 'end_date').prefetch_related('teams__user_set', 'files')
+            feed = set_user_task_feed(pk, TaskListingSerializer(tasks, many=True).data)
+        response = get_not_modified_response(request, feed['etag'], feed['last_modified'])
+        if response is None:
+            response = add_validators(Response(feed['data']), feed['etag'], feed['last_modified'])
+        return response
 
 
 @swagger_auto_schema(
@@ -524,7 +540,64 @@ class TaskRequirements(APIView):
         """Send the End Conditions and Trigger Conditions. \
             If specified, send the task templates as well."""
         if request.user.has_perm(ADD_TASK):
-            serializer = TaskTemplateRequirementsSerializer(1)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            requirements = get_task_requirements()
+            if requirements is None:
+                requirements = TaskTemplateRequirementsSerializer(1).data
+                set_task_requirements(requirements)
+            return Response(requirements, status=status.HTTP_200_OK)
         else:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+
+class TriggerConditionsBacktest(APIView):
+    r"""
+    \n# Replay candidate trigger conditions on the readings of a field object.
+
+    Parameter :
+    request (HttpRequest) : the request coming from the front-end
+
+    Return :
+    response (Response) : the response.
+
+    POST request : replay the conditions and send, for each condition, the
+    number of times it would have fired and the dates it would have fired at.
+
+    If the user doesn't have the permissions, it will send HTTP 401.
+
+    The request must contain :
+        - field_object : the id of the field object whose readings are
+            replayed
+        - conditions : the list of the conditions, each with :
+            - field : the id of the Above Threshold, Under Threshold or
+                Frequency field
+            - value : the threshold or the frequency
+    The request can contain :
+        - start : the date of the first reading replayed
+        - end : the date of the last reading replayed
+    """
+
+    @swagger_auto_schema(
+        operation_description='Replay candidate trigger conditions on the readings of a field object.',
+        query_serializer=None,
+        request_body=TriggerConditionsBacktestSerializer,
+        responses={
+            200: "OK",
+            400: "Bad request",
+            401: "Unhauthorized",
+        },
+    )
+    def post(self, request):
+        """Replay trigger conditions on the readings of a field object."""
+        if request.user.has_perm(ADD_TASK):
+            serializer = TriggerConditionsBacktestSerializer(data=request.data)
+            if serializer.is_valid():
+                data = serializer.validated_data
+                result = backtest(
+                    data['field_object'],
+                    [(condition['field'], condition['value']) for condition in data['conditions']],
+                    data.get('start'),
+                    data.get('end'),
+                )
+                return Response(result, status=status.HTTP_200_OK)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
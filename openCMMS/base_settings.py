@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utils.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,6 +89,46 @@ DATABASES = {
         }
 }
 
+# Cache
+# The task feeds, the equipment type schemas and the requirements are cached
+# until the objects they are built from change. The environment variable
+# CMMS_CACHE_BACKEND selects where they are kept:
+#   - 'database' (default) : a table shared by the gunicorn workers, created
+#     with `python manage.py createcachetable`. Each cache read is a query.
+#   - 'redis' : the redis server at CMMS_CACHE_LOCATION, shared by the
+#     workers without querying the database. It needs django-redis.
+#   - 'locmem' : the memory of each process, only for a single worker, as
+#     the other workers would not see the deletions.
+# CMMS_CACHE_MAX_ENTRIES bounds the number of cached documents of the
+# database and locmem caches: one task feed by user, one schema by equipment
+# type and the two requirements. Past it, a third of them is deleted.
+
+CACHE_BACKEND = os.environ.get('CMMS_CACHE_BACKEND', 'database')
+CACHE_MAX_ENTRIES = int(os.environ.get('CMMS_CACHE_MAX_ENTRIES', 10000))
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ.get('CMMS_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+            'TIMEOUT': None,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': {
+                'database': 'django.core.cache.backends.db.DatabaseCache',
+                'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+            }[CACHE_BACKEND],
+            'LOCATION': 'cmms_cache',
+            'TIMEOUT': None,
+            'OPTIONS': {
+                'MAX_ENTRIES': CACHE_MAX_ENTRIES,
+            },
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -181,6 +222,95 @@ JWT_AUTH = {
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+# How files are sent by the download endpoint :
+#   - None : Django streams the file itself (with HTTP Range support)
+#   - 'x-sendfile' : Apache/lighttpd send the file (X-Sendfile header)
+#   - 'x-accel-redirect' : nginx sends the file (X-Accel-Redirect header),
+#     FILE_DOWNLOAD_ACCEL_PREFIX must be an internal location on MEDIA_ROOT
+FILE_DOWNLOAD_MODE = None
+FILE_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+FILE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Chunked uploads : where the chunks are assembled, the maximum size of a
+# file (in bytes) and how long (in hours) an unfinished upload is kept after
+# its last chunk.
+FILE_UPLOAD_SESSION_DIR = os.path.join(MEDIA_ROOT, 'uploads/')
+FILE_UPLOAD_MAX_SIZE = 500 * 1024 * 1024
+FILE_UPLOAD_SESSION_EXPIRATION = 24
+
+# Thumbnails and first page previews of the files, generated in background.
+FILE_PREVIEW_DIR = os.path.join(MEDIA_ROOT, 'previews/')
+FILE_THUMBNAIL_SIZE = (256, 256)
+
+################################################################
+############################ IMPORT ############################
+################################################################
+
+# Number of rows inserted by transaction by the equipment import.
+EQUIPMENT_IMPORT_CHUNK_SIZE = 500
+
+################################################################
+############################ SEARCH ############################
+################################################################
+
+# Without PostgreSQL, the search uses an index built in each process, rebuilt
+# at least every SEARCH_INDEX_TIMEOUT seconds.
+SEARCH_INDEX_TIMEOUT = 60
+
+################################################################
+############################# SYNC #############################
+################################################################
+
+# Number of changes sent by synchronisation request, and the delay (in
+# seconds) after which a change is considered committed and the token can
+# move past it. A transaction open longer than this delay may be missed.
+SYNC_PAGE_SIZE = 500
+SYNC_SAFETY_DELAY = 10
+# How long (in days) the deletions are kept for the synchronisation. A
+# client not synchronised for longer must synchronise again from the start.
+SYNC_TOMBSTONE_RETENTION = 30
+
+################################################################
+############################ METRICS ###########################
+################################################################
+
+# A request executing at least METRICS_N_PLUS_ONE_THRESHOLD queries of a same
+# shape is logged as an N+1. Prometheus reads the metrics endpoint with the
+# header Authorization: Token METRICS_TOKEN, only superusers can if None.
+METRICS_N_PLUS_ONE_THRESHOLD = 10
+METRICS_TOKEN = None
+
+################################################################
+############################# AUDIT ############################
+################################################################
+
+# The audit events are added to the table at the end of each request, by
+# batches of AUDIT_BATCH_SIZE, and at least every AUDIT_FLUSH_INTERVAL seconds
+# for the events recorded outside of the requests.
+AUDIT_BATCH_SIZE = 100
+AUDIT_FLUSH_INTERVAL = 5
+
+################################################################
+########################### TRIGGERS ###########################
+################################################################
+
+# The due tasks are checked by batches of TRIGGER_BATCH_SIZE, each batch being
+# locked by the process checking it until its transaction ends.
+TRIGGER_BATCH_SIZE = 100
+
+# The date at which a sensor condition will be verified is forecast from the
+# trend of the readings, a reading weighing e times less every
+# TRIGGER_FORECAST_WINDOW days, up to TRIGGER_FORECAST_HORIZON days ahead. The
+# forecast date of a task is only written when it moves by more than
+# TRIGGER_FORECAST_TOLERANCE of the time left before it.
+TRIGGER_FORECAST_WINDOW = 7
+TRIGGER_FORECAST_HORIZON = 365
+TRIGGER_FORECAST_TOLERANCE = 0.1
+
+# The readings of the field objects are kept READING_RETENTION days, for the
+# backtests of the conditions.
+READING_RETENTION = 400
+
 ################################################################
 ############################# EMAIL ############################
 ################################################################
@@ -192,17 +322,32 @@ EMAIL_FILE_PATH = '/tmp/app-messages'
 ############################ LOGGING ###########################
 ################################################################
 
-FILE_HANDLER = 'logging.FileHandler'
+# The log files are written and the error mails sent by a thread of each
+# process, see utils/log_handlers.py. A file is rotated when it reaches
+# LOG_MAX_BYTES, LOG_BACKUP_COUNT old files being kept.
+FILE_HANDLER = 'utils.log_handlers.QueuedRotatingFileHandler'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Fraction of the SQL statements written in log/sql.log, between 0 (none)
+# and 1 (all). Django only logs them when DEBUG is True.
+SQL_LOG_SAMPLE_RATE = 0
 
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sql_sample': {
+            '()': 'utils.log_handlers.SamplingFilter',
+            'rate': SQL_LOG_SAMPLE_RATE,
+        },
+    },
     'formatters':
         {
             'verbose_http':
                 {
                     'format':
-                        '{levelname} {asctime} "{request.user} did {request.method} on {request.path} with {request.POST} and got {status_code}"',
+                        '{levelname} {asctime} "{request.user} did {request.method} on {request.path} and got {status_code}"',
                     'style':
                         '{',
                 },
@@ -230,6 +375,8 @@ LOGGING = {
                 {
                     'class': FILE_HANDLER,
                     'filename': os.path.join(BASE_DIR, 'log/', 'requests.log'),
+                    'max_bytes': LOG_MAX_BYTES,
+                    'backup_count': LOG_BACKUP_COUNT,
                     'level': 'DEBUG',
                     'formatter': 'verbose_http'
                 },
@@ -237,13 +384,17 @@ LOGGING = {
                 {
                     'class': FILE_HANDLER,
                     'filename': os.path.join(BASE_DIR, 'log/', 'sql.log'),
-                    'level': 'INFO',
+                    'max_bytes': LOG_MAX_BYTES,
+                    'backup_count': LOG_BACKUP_COUNT,
+                    'level': 'DEBUG',
                     'formatter': 'verbose_sql'
                 },
             'file_utils':
                 {
                     'class': FILE_HANDLER,
                     'filename': os.path.join(BASE_DIR, 'utils/log/', 'infos.log'),
+                    'max_bytes': LOG_MAX_BYTES,
+                    'backup_count': LOG_BACKUP_COUNT,
                     'level': 'INFO',
                     'formatter': 'verbose_base'
                 },
@@ -251,6 +402,8 @@ LOGGING = {
                 {
                     'class': FILE_HANDLER,
                     'filename': os.path.join(BASE_DIR, 'usersmanagement/log/', 'infos.log'),
+                    'max_bytes': LOG_MAX_BYTES,
+                    'backup_count': LOG_BACKUP_COUNT,
                     'level': 'INFO',
                     'formatter': 'verbose_base'
                 },
@@ -258,11 +411,13 @@ LOGGING = {
                 {
                     'class': FILE_HANDLER,
                     'filename': os.path.join(BASE_DIR, 'maintenancemanagement/log/', 'infos.log'),
+                    'max_bytes': LOG_MAX_BYTES,
+                    'backup_count': LOG_BACKUP_COUNT,
                     'level': 'INFO',
                     'formatter': 'verbose_base'
                 },
             'mail_error': {
-                'class': 'django.utils.log.AdminEmailHandler',
+                'class': 'utils.log_handlers.QueuedAdminEmailHandler',
                 'level': 'ERROR',
             }
         },
@@ -275,7 +430,8 @@ LOGGING = {
             },
             'django.db.backends': {
                 'handlers': ['file_sql'],
-                'level': 'INFO',
+                'filters': ['sql_sample'],
+                'level': 'DEBUG' if SQL_LOG_SAMPLE_RATE else 'INFO',
                 'propagate': False,
             },
             'utils': {
@@ -0,0 +1,127 @@
+import pytest
+from init_db_tests import init_db
+
+from django.contrib.auth.models import Permission
+from django.test import TestCase, override_settings
+from maintenancemanagement.models import Equipment, Field, FieldObject, Task
+from rest_framework.test import APIClient
+from usersmanagement.models import UserProfile
+from utils.audit import get_history, record_event
+from utils.models import AuditEvent, DataProvider
+
+
+class AuditTests(TestCase):
+
+    @pytest.fixture(scope="class", autouse=True)
+    def init_database(django_db_setup, django_db_blocker):
+        with django_db_blocker.unblock():
+            init_db()
+
+    def set_up_user(self, *codenames):
+        """
+            Set up a user with the given permissions.
+        """
+        user = UserProfile.objects.create(username='tom')
+        user.set_password('truc')
+        user.save()
+        for codename in codenames:
+            user.user_permissions.add(Permission.objects.get(codename=codename))
+        return user
+
+    def test_US41_I1_history_of_a_task(self):
+        """
+            Test that the creation, update and deletion of a task are
+            recorded and sent by the history endpoint.
+
+            Inputs:
+                user (UserProfile): a user with the permissions on the tasks
+                and to view the audit events.
+
+            Expected Output:
+                We expect the three events with their user and changed
+                fields, even after the deletion of the task.
+        """
+        user = self.set_up_user('add_task', 'change_task', 'delete_task', 'view_auditevent')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post('/api/maintenancemanagement/tasks/', {'name': 'Vidange'}, format='json')
+        pk = response.json()['id']
+        client.put('/api/maintenancemanagement/tasks/{}/'.format(pk), {'description': 'Moteur'}, format='json')
+        client.delete('/api/maintenancemanagement/tasks/{}/'.format(pk))
+        response = client.get('/api/history/task/{}/'.format(pk))
+        self.assertEqual(response.status_code, 200)
+        events = response.json()
+        self.assertEqual([event['action'] for event in events], ['created', 'updated', 'deleted'])
+        self.assertEqual({event['user'] for event in events}, {user.pk})
+        self.assertEqual(events[0]['changes']['name'], 'Vidange')
+        self.assertEqual(events[0]['changes']['created_by_id'], user.pk)
+        self.assertEqual(events[1]['changes']['description'], 'Moteur')
+        self.assertEqual(events[2]['changes'], {})
+
+    def test_US41_I2_history_without_perms(self):
+        """
+            Test that the history is only sent to the users allowed to view
+            the audit events, and only for the audited models.
+
+            Inputs:
+                user (UserProfile): a user without permission, then with it.
+
+            Expected Output:
+                We expect an HTTP 401, then an HTTP 404 for a model which is
+                not audited.
+        """
+        client = APIClient()
+        client.force_authenticate(user=self.set_up_user())
+        self.assertEqual(client.get('/api/history/task/1/').status_code, 401)
+        client.force_authenticate(user=UserProfile.objects.create(username='jerry', is_superuser=True))
+        self.assertEqual(client.get('/api/history/team/1/').status_code, 404)
+
+    @override_settings(AUDIT_BATCH_SIZE=2)
+    def test_US41_I3_events_flushed_by_batches(self):
+        """
+            Test that the buffered events are added to the table once the
+            buffer is full.
+
+            Inputs:
+                events : three events recorded outside of a request.
+
+            Expected Output:
+                We expect the first two events in the table, the third one
+                after a flush.
+        """
+        task = Task.objects.create(name='Vidange')
+        for action in (AuditEvent.CREATED, AuditEvent.UPDATED, AuditEvent.UPDATED):
+            record_event(task, action, fields=['name'])
+        self.assertEqual(AuditEvent.objects.filter(object_id=task.pk).count(), 2)
+        self.assertEqual(get_history(Task, task.pk).count(), 3)
+
+    def test_US41_U1_repr_without_queries(self):
+        """
+            Test that the representations of a task and a dataprovider don't
+            load their related objects.
+
+            Inputs:
+                task (Task): a task with an equipment.
+                dataprovider (DataProvider): a dataprovider.
+
+            Expected Output:
+                We expect no query.
+        """
+        equipment = Equipment.objects.get(name='Embouteilleuse AXB1')
+        field_object = FieldObject.objects.create(
+            described_object=equipment, field=Field.objects.get(name='Marque'), value='Bosch'
+        )
+        task = Task.objects.create(name='Vidange', equipment=equipment)
+        dataprovider = DataProvider.objects.create(
+            name='Capteur',
+            file_name='fichier_test_dataprovider.py',
+            ip_address='127.0.0.1',
+            equipment=equipment,
+            field_object=field_object,
+            recurrence='10d'
+        )
+        task = Task.objects.get(pk=task.pk)
+        dataprovider = DataProvider.objects.get(pk=dataprovider.pk)
+        with self.assertNumQueries(0):
+            self.assertIn('equipment={}'.format(equipment.pk), repr(task))
+            self.assertIn('field_object={}'.format(field_object.pk), repr(dataprovider))
@@ -1,3 +1,7 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
 from io import BytesIO
 
 import pytest
@@ -5,7 +9,11 @@ from init_db_tests import init_db
 from PIL import Image
 
 from django.contrib.auth.models import Permission
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from maintenancemanagement.caches import get_equipment_requirements
 from maintenancemanagement.models import (
     Equipment,
     EquipmentType,
@@ -13,6 +21,7 @@ from maintenancemanagement.models import (
     FieldGroup,
     FieldObject,
     FieldValue,
+    Reading,
 )
 from maintenancemanagement.serializers import (
     EquipmentDetailsSerializer,
@@ -21,12 +30,28 @@ from maintenancemanagement.serializers import (
 from openCMMS import settings
 from rest_framework.test import APIClient
 from usersmanagement.models import UserProfile
+from utils.methods import parse_number
+from utils.readings import prune_readings
 
 User = settings.AUTH_USER_MODEL
 
 
+# The files stored by the tests go to a temporary media directory.
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    FILE_UPLOAD_SESSION_DIR=os.path.join(MEDIA_ROOT, 'uploads/'),
+    FILE_PREVIEW_DIR=os.path.join(MEDIA_ROOT, 'previews/')
+)
 class EquipmentTests(TestCase):
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
     @pytest.fixture(scope="class", autouse=True)
     def init_database(django_db_setup, django_db_blocker):
         with django_db_blocker.unblock():
@@ -206,6 +231,36 @@ class EquipmentTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(serializer.data, response.json())
 
+    def test_US4_I3_equipmentdetail_get_not_modified(self):
+        """
+            Test that an unchanged equipment detail is answered with HTTP 304.
+
+            Inputs:
+                user (UserProfile): a UserProfile with permissions to view equipments.
+
+            Expected Output:
+                We expect HTTP 304 while the equipment doesn't change, then
+                HTTP 200 once one of its field objects changes.
+        """
+        user = UserProfile.objects.create(username="user", password="p4ssword")
+        self.add_view_perm(user)
+        c = APIClient()
+        c.force_authenticate(user=user)
+        equipment = Equipment.objects.get(name="Peugeot Partner")
+        field_object = FieldObject.objects.create(
+            described_object=equipment, field=Field.objects.get(name="Capacité"), value="60000"
+        )
+        response = c.get("/api/maintenancemanagement/equipments/" + str(equipment.id) + "/")
+        etag = response['ETag']
+        response = c.get("/api/maintenancemanagement/equipments/" + str(equipment.id) + "/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        field_object.value = "45000"
+        field_object.save()
+        response = c.get("/api/maintenancemanagement/equipments/" + str(equipment.id) + "/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['field'][0]['value'], "45000")
+
     def test_US4_I3_equipmentdetail_get_non_existing_equipment_with_perm(self):
         """
             Test if a user with perm can't receive an unavailable equipment data
@@ -398,6 +453,159 @@ class EquipmentTests(TestCase):
         response = client.get('/api/maintenancemanagement/equipments/requirements/')
         self.assertEqual(response.status_code, 401)
 
+    def test_US4_I8_equipmentrequirements_cached_and_invalidated(self):
+        """
+            Test if the equipment types requirements are cached and follow the changes of the fields
+
+            Inputs:
+                user (UserProfile): a UserProfile with permissions to add equipments.
+
+            Expected Output:
+                We expect a cached read to make a single query.
+                We expect a new value and a renamed equipment type to be in the next response.
+        """
+        user = UserProfile.objects.create(username="user", password="p4ssword")
+        self.add_add_perm(user)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        client.get('/api/maintenancemanagement/equipments/requirements/')
+        with self.assertNumQueries(1):
+            get_equipment_requirements()
+        marque = Field.objects.get(name="marque")
+        FieldValue.objects.create(value="Krones", field=marque)
+        embouteilleuse = EquipmentType.objects.get(name="embouteilleuse")
+        embouteilleuse.name = "Remplisseuse"
+        embouteilleuse.save()
+        response = client.get('/api/maintenancemanagement/equipments/requirements/')
+        schema = [schema for schema in response.json() if schema['id'] == embouteilleuse.id][0]
+        self.assertEqual(schema['name'], "Remplisseuse")
+        self.assertEqual(
+            [field['value'] for field in schema['field'] if field['id'] == marque.id][0], ["Bosch", "Gai", "Krones"]
+        )
+        embouteilleuse.fields_groups.clear()
+        response = client.get('/api/maintenancemanagement/equipments/requirements/')
+        schema = [schema for schema in response.json() if schema['id'] == embouteilleuse.id][0]
+        self.assertEqual(schema['field'], [])
+
+    def test_equipment_import_csv_with_perm(self):
+        """
+            Test if a user with perm can import equipments from a CSV file
+
+            Inputs:
+                user (UserProfile): a UserProfile with permissions to add equipments.
+                csv (str): three equipments of the type embouteilleuse, the last one with a wrong value.
+
+            Expected Output:
+                We expect a 200 status code and a report with two created equipments and an error on line 4.
+                We expect the equipments to have their field objects.
+        """
+        user = UserProfile.objects.create(username="user", password="p4ssword")
+        self.add_add_perm(user)
+        c = APIClient()
+        c.force_authenticate(user=user)
+        embouteilleuse = EquipmentType.objects.get(name="embouteilleuse")
+        csv = (
+            "name,Capacité,Pression Normale,marque\n"
+            "Embouteilleuse I1,60000,5 bars,Bosch\n"
+            "\"Embouteilleuse, I2\",45000,4 bars,Gai\n"
+            "Embouteilleuse I3,45000,4 bars,Audi\n"
+        )
+        response = c.post(
+            "/api/maintenancemanagement/equipments/import/?equipment_type=" + str(embouteilleuse.id),
+            csv.encode(),
+            content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(response.json()['errors'][0]['line'], 4)
+        self.assertIn('marque', response.json()['errors'][0]['errors'])
+        equipment = Equipment.objects.get(name="Embouteilleuse, I2", equipment_type=embouteilleuse)
+        data = EquipmentDetailsSerializer(equipment).data
+        self.assertEqual(
+            sorted((field['field_name'], field['value']) for field in data['field']),
+            [("Capacité", "45000"), ("Pression Normale", "4 bars"), ("marque", "")]
+        )
+        self.assertEqual([field['field_value']['value'] for field in data['field'] if field['field_value']], ["Gai"])
+        self.assertFalse(Equipment.objects.filter(name="Embouteilleuse I3").exists())
+
+    def test_equipment_import_ndjson_with_perm(self):
+        """
+            Test if a user with perm can import equipments from a NDJSON file
+
+            Inputs:
+                user (UserProfile): a UserProfile with permissions to add equipments.
+                ndjson (str): an equipment, a malformed line and an equipment with a missing field.
+
+            Expected Output:
+                We expect a 200 status code and a report with one created equipment and errors on lines 2 and 3.
+        """
+        user = UserProfile.objects.create(username="user", password="p4ssword")
+        self.add_add_perm(user)
+        c = APIClient()
+        c.force_authenticate(user=user)
+        embouteilleuse = EquipmentType.objects.get(name="embouteilleuse")
+        ndjson = (
+            '{"name": "Embouteilleuse N1", "Capacité": 60000, "Pression Normale": "5 bars", "marque": "Gai"}\n'
+            '{"name": "Embouteilleuse N2"\n'
+            '{"name": "Embouteilleuse N3", "Capacité": "60000", "marque": "Gai"}\n'
+        )
+        response = c.post(
+            "/api/maintenancemanagement/equipments/import/?equipment_type=" + str(embouteilleuse.id),
+            ndjson.encode(),
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([error['line'] for error in response.json()['errors']], [2, 3])
+        self.assertEqual(list(response.json()['errors'][1]['errors']), ['Pression Normale'])
+        equipment = Equipment.objects.get(name="Embouteilleuse N1")
+        self.assertEqual(FieldObject.objects.get(object_id=equipment.id, field__name="Capacité").value, "60000")
+
+    def test_equipment_import_with_wrong_request(self):
+        """
+            Test if an import with a wrong content type or equipment type is refused
+
+            Inputs:
+                user (UserProfile): a UserProfile with permissions to add equipments.
+
+            Expected Output:
+                We expect a 415 status code for a JSON body, a 404 for an unknown equipment type and a 400 without
+                equipment type.
+        """
+        user = UserProfile.objects.create(username="user", password="p4ssword")
+        self.add_add_perm(user)
+        c = APIClient()
+        c.force_authenticate(user=user)
+        embouteilleuse = EquipmentType.objects.get(name="embouteilleuse")
+        url = "/api/maintenancemanagement/equipments/import/?equipment_type="
+        response = c.post(url + str(embouteilleuse.id), [{"name": "E1"}], format='json')
+        self.assertEqual(response.status_code, 415)
+        response = c.post(url + "-1", b"name\nE1\n", content_type='text/csv')
+        self.assertEqual(response.status_code, 404)
+        response = c.post(url, b"name\nE1\n", content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+    def test_equipment_import_without_perm(self):
+        """
+            Test if a user without perm can't import equipments
+
+            Inputs:
+                user (UserProfile): a UserProfile without permissions to add equipments.
+
+            Expected Output:
+                We expect a 401 status code in the response.
+        """
+        user = UserProfile.objects.create(username="user", password="p4ssword")
+        c = APIClient()
+        c.force_authenticate(user=user)
+        embouteilleuse = EquipmentType.objects.get(name="embouteilleuse")
+        response = c.post(
+            "/api/maintenancemanagement/equipments/import/?equipment_type=" + str(embouteilleuse.id),
+            b"name\nE1\n",
+            content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, 401)
+
     def test_US7_I1_equipmentlist_post_with_file_with_perm(self):
         """
             Test if a user with perm can add an equipment with a file
@@ -866,6 +1074,231 @@ class EquipmentTests(TestCase):
         )
         self.assertEqual(response.status_code, 201)
 
+    def test_US21_I2_equipmentdetails_put_with_many_fields_with_perm(self):
+        """
+            Test if updating an equipment with many fields makes a number of queries independent of the fields
+
+            Inputs:
+                user (UserProfile): a UserProfile with permissions to add and change equipments.
+                post data (JSON): a mock-up of an equipment with 60 new fields.
+                put data (JSON): the modification of the 60 fields.
+
+            Expected Output:
+                We expect a 200 status code in the response and the same number of queries for 60 fields as for 2.
+                We expect the field objects to hold the new values.
+        """
+        user = UserProfile.objects.create(username="user", password="p4ssword")
+        self.add_change_perm(user)
+        self.add_add_perm(user)
+        c = APIClient()
+        c.force_authenticate(user=user)
+        embouteilleuse = EquipmentType.objects.get(name="embouteilleuse")
+        expected_fields = [
+            {
+                "field": Field.objects.get(name="Capacité").id,
+                "value": "60000"
+            }, {
+                "field": Field.objects.get(name="Pression Normale").id,
+                "value": "5 bars"
+            }, {
+                "field": Field.objects.get(name="marque").id,
+                "value": "Gai"
+            }
+        ]
+        queries = []
+        for number in (2, 60):
+            new_fields = [{"name": "Field " + str(i), "value": str(i)} for i in range(number)]
+            response = c.post(
+                "/api/maintenancemanagement/equipments/", {
+                    "name": "Embouteilleuse " + str(number),
+                    "equipment_type": embouteilleuse.id,
+                    "field": expected_fields + new_fields
+                },
+                format='json'
+            )
+            self.assertEqual(response.status_code, 201)
+            field_objects = [
+                {
+                    "id": field_object['id'],
+                    "field": field_object['field'],
+                    "value": "Bosch" if field_object['field_name'] == "marque" else "new " + str(field_object['value']),
+                } for field_object in response.json()['field']
+            ]
+            with CaptureQueriesContext(connection) as context:
+                response = c.put(
+                    "/api/maintenancemanagement/equipments/" + str(response.json()['id']) + "/", {
+                        "equipment_type": embouteilleuse.id,
+                        "field": field_objects
+                    },
+                    format='json'
+                )
+            self.assertEqual(response.status_code, 200)
+            queries.append(len(context.captured_queries))
+        self.assertEqual(queries[0], queries[1])
+        equipment = Equipment.objects.get(name="Embouteilleuse 60")
+        values = FieldObject.objects.filter(object_id=equipment.id, field__name="Field 42").values_list('value')
+        self.assertEqual(list(values), [("new 42", )])
+
+    @override_settings(READING_RETENTION=30)
+    def test_US48_I2_readings_of_the_equipment_api(self):
+        """
+            Test that the numeric values written through the equipment API are recorded as readings, and that the
+            old readings are pruned.
+
+            Inputs:
+                user (UserProfile): a UserProfile with permissions to add and change equipments.
+                post data (JSON): an equipment with a capacity and a pressure.
+                put data (JSON): a new capacity, then the same one again.
+
+            Expected Output:
+                We expect a reading for the created capacity and one for the changed one, none for a text or an
+                unchanged value, and only the readings of the last 30 days after the pruning.
+        """
+        user = UserProfile.objects.create(username="user", password="p4ssword")
+        self.add_change_perm(user)
+        self.add_add_perm(user)
+        c = APIClient()
+        c.force_authenticate(user=user)
+        embouteilleuse = EquipmentType.objects.get(name="embouteilleuse")
+        capacity = Field.objects.get(name="Capacité")
+        response = c.post(
+            "/api/maintenancemanagement/equipments/", {
+                "name": "Embouteilleuse",
+                "equipment_type": embouteilleuse.id,
+                "field": [
+                    {
+                        "field": capacity.id,
+                        "value": "60 000"
+                    }, {
+                        "field": Field.objects.get(name="Pression Normale").id,
+                        "value": "5 bars"
+                    }, {
+                        "field": Field.objects.get(name="marque").id,
+                        "value": "Gai"
+                    }
+                ]
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        equipment_id = response.json()['id']
+        field_object = FieldObject.objects.get(field=capacity, object_id=equipment_id)
+        for _ in range(2):
+            response = c.put(
+                "/api/maintenancemanagement/equipments/" + str(equipment_id) + "/", {
+                    "equipment_type": embouteilleuse.id,
+                    "field": [{
+                        "id": field_object.id,
+                        "field": capacity.id,
+                        "value": "45000"
+                    }]
+                },
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+        readings = Reading.objects.filter(field_object__object_id=equipment_id, field_object__field__in=[
+            capacity, Field.objects.get(name="Pression Normale")
+        ]).order_by('id')
+        self.assertEqual([(reading.field_object_id, reading.value) for reading in readings],
+                         [(field_object.id, 60000), (field_object.id, 45000)])
+
+        Reading.objects.filter(pk=readings[0].pk).update(read_at=timezone.now() - timedelta(days=31))
+        prune_readings()
+        self.assertEqual(list(readings.values_list('value', flat=True)), [45000])
+
+    def test_US50_U1_parse_number(self):
+        """
+            Test the conversion of the values of the field objects into numbers.
+
+            Inputs:
+                values (list): numbers, a number with spaces between its thousands, texts and None.
+
+            Expected Output:
+                We expect the numbers, and None for the values which are not finite numbers.
+        """
+        self.assertEqual(
+            [parse_number(value) for value in ["12", "-1.5", "60 000", "5 bars", "", "nan", "inf", None]],
+            [12, -1.5, 60000, None, None, None, None, None]
+        )
+
+    def test_US50_I1_value_numeric_follows_value(self):
+        """
+            Test that the numeric values of the field objects follow their values and can be queried in SQL.
+
+            Inputs:
+                user (UserProfile): a UserProfile with permissions to add and change equipments.
+                post data (JSON): two equipments with a capacity and a pressure.
+                put data (JSON): a new capacity for the first equipment.
+
+            Expected Output:
+                We expect the numeric values of the created, updated and saved field objects, None for a text,
+                and the capacities in a range and their statistics computed by the database.
+        """
+        user = UserProfile.objects.create(username="user", password="p4ssword")
+        self.add_change_perm(user)
+        self.add_add_perm(user)
+        c = APIClient()
+        c.force_authenticate(user=user)
+        embouteilleuse = EquipmentType.objects.get(name="embouteilleuse")
+        capacity = Field.objects.get(name="Capacité")
+        pressure = Field.objects.get(name="Pression Normale")
+        ids = []
+        for value in ("60 000", "20000"):
+            response = c.post(
+                "/api/maintenancemanagement/equipments/", {
+                    "name": "Embouteilleuse " + value,
+                    "equipment_type": embouteilleuse.id,
+                    "field": [{
+                        "field": capacity.id,
+                        "value": value
+                    }, {
+                        "field": pressure.id,
+                        "value": "5 bars"
+                    }, {
+                        "field": Field.objects.get(name="marque").id,
+                        "value": "Gai"
+                    }]
+                },
+                format='json'
+            )
+            self.assertEqual(response.status_code, 201)
+            ids.append(response.json()['id'])
+        capacities = FieldObject.objects.filter(field=capacity, object_id__in=ids)
+        self.assertEqual(sorted(capacities.values_list('value_numeric', flat=True)), [20000, 60000])
+        self.assertEqual(
+            list(FieldObject.objects.filter(field=pressure, object_id__in=ids).values_list('value_numeric', flat=True)),
+            [None, None]
+        )
+
+        field_object = capacities.get(object_id=ids[0])
+        response = c.put(
+            "/api/maintenancemanagement/equipments/" + str(ids[0]) + "/", {
+                "equipment_type": embouteilleuse.id,
+                "field": [{
+                    "id": field_object.id,
+                    "field": capacity.id,
+                    "value": "45000"
+                }]
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FieldObject.objects.get(pk=field_object.pk).value_numeric, 45000)
+        self.assertEqual(list(capacities.value_between(30000, 50000)), [field_object])
+        self.assertEqual(
+            capacities.value_statistics(), {
+                'count': 2,
+                'minimum': 20000,
+                'maximum': 45000,
+                'average': 32500
+            }
+        )
+
+        field_object = FieldObject.objects.get(pk=field_object.pk)
+        field_object.value = "unknown"
+        field_object.save()
+        self.assertEqual(list(capacities.numeric().values_list('value_numeric', flat=True)), [20000])
+
     def test_US21_I2_equipmentdetails_put_with_all_fields_with_perm(self):
         """
             Test if a user with perm can update an equipment with fields from equipment type
@@ -3,6 +3,7 @@ from maintenancemanagement.models import (
     EquipmentType,
     Field,
     FieldGroup,
+    FieldObject,
     FieldValue,
 )
 from maintenancemanagement.serializers import (
@@ -151,6 +152,31 @@ class EquipmentTypeTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(serializer.data, response.json())
 
+    def test_US4_I11_equipmenttypedetail_get_not_modified(self):
+        """
+        Test that an unchanged equipmenttype detail is answered with HTTP 304.
+
+                Inputs:
+                    user (UserProfile): A UserProfile we create with the required permissions.
+
+                Expected outputs:
+                    We expect HTTP 304 while the equipmenttype doesn't change,
+                    then HTTP 200 once an equipment is added to it.
+        """
+        user = self.set_up_perm()
+        tool = EquipmentType.objects.create(name="tool")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get('/api/maintenancemanagement/equipmenttypes/' + str(tool.id) + "/")
+        etag = response['ETag']
+        response = client.get('/api/maintenancemanagement/equipmenttypes/' + str(tool.id) + "/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Equipment.objects.create(name="hammer", equipment_type=tool)
+        response = client.get('/api/maintenancemanagement/equipmenttypes/' + str(tool.id) + "/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['equipments'][0]['name'], "hammer")
+
     def test_US4_I11_equipmenttypedetail_get_without_perm(self):
         """
         Test if a user without perm can retrieve an equipmenttype
@@ -193,6 +219,78 @@ class EquipmentTypeTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(EquipmentType.objects.get(name="car"))
 
+    def test_US4_I12_equipmenttypedetail_put_equipment_set_with_perm(self):
+        """
+        Test if the equipments removed from the equipment set of an equipmenttype are deleted
+
+                Inputs:
+                    user (UserProfile): A UserProfile we create with the required permissions.
+                    data (json): The equipment set of the equipmenttype without one of its equipments
+
+                Expected outputs:
+                    We expect a 200 status code in the response
+                    We expect the removed equipment and its field objects to be deleted and the others to be kept
+        """
+        self.set_up_perm()
+        tool = EquipmentType.objects.create(name="tool")
+        field_group = FieldGroup.objects.create(name="tool", is_equipment=True)
+        tool.fields_groups.set([field_group])
+        field = Field.objects.create(name="Poids", field_group=field_group)
+        hammer = Equipment.objects.create(name="hammer", equipment_type=tool)
+        saw = Equipment.objects.create(name="saw", equipment_type=tool)
+        FieldObject.objects.create(described_object=hammer, field=field, value="1kg")
+        FieldObject.objects.create(described_object=saw, field=field, value="2kg")
+        client = APIClient()
+        user = UserProfile.objects.get(username='tom')
+        client.force_authenticate(user=user)
+        response = client.put(
+            '/api/maintenancemanagement/equipmenttypes/' + str(tool.id) + '/', {"equipment_set": [hammer.id]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(tool.equipment_set.all()), [hammer])
+        self.assertEqual(list(FieldObject.objects.filter(field=field).values_list('value', flat=True)), ["1kg"])
+
+    def test_US4_I12_equipmenttypedetail_put_fields_groups_with_perm(self):
+        """
+        Test if the equipments of an equipmenttype get the fields of a new field group
+
+                Inputs:
+                    user (UserProfile): A UserProfile we create with the required permissions.
+                    data (json): The field groups of the equipmenttype with a new one
+
+                Expected outputs:
+                    We expect a 200 status code in the response
+                    We expect each equipment to get a blank field object for the new field and to keep its values
+        """
+        self.set_up_perm()
+        tool = EquipmentType.objects.create(name="tool")
+        field_group = FieldGroup.objects.create(name="tool", is_equipment=True)
+        tool.fields_groups.set([field_group])
+        field = Field.objects.create(name="Poids", field_group=field_group)
+        new_field_group = FieldGroup.objects.create(name="tool dimensions", is_equipment=True)
+        new_field = Field.objects.create(name="Longueur", field_group=new_field_group)
+        hammer = Equipment.objects.create(name="hammer", equipment_type=tool)
+        saw = Equipment.objects.create(name="saw", equipment_type=tool)
+        FieldObject.objects.create(described_object=hammer, field=field, value="1kg")
+        client = APIClient()
+        user = UserProfile.objects.get(username='tom')
+        client.force_authenticate(user=user)
+        response = client.put(
+            '/api/maintenancemanagement/equipmenttypes/' + str(tool.id) + '/',
+            {"fields_groups": [field_group.id, new_field_group.id]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(FieldObject.objects.filter(field=new_field).values_list('object_id', 'value')),
+            [(hammer.id, ""), (saw.id, "")]
+        )
+        self.assertEqual(
+            sorted(FieldObject.objects.filter(field=field).values_list('object_id', 'value')), [(hammer.id, "1kg"),
+                                                                                                 (saw.id, "")]
+        )
+
     def test_US4_I12_equipmenttypedetail_put_without_perm(self):
         """
         Test if a user without perm can update an equipmenttype
@@ -1,6 +1,11 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from hashlib import sha256
 from io import BytesIO
 
-from maintenancemanagement.models import File
+from maintenancemanagement.models import Blob, File, UploadSession
 from maintenancemanagement.serializers import FileSerializer
 from openCMMS import settings
 from PIL import Image
@@ -8,12 +13,29 @@ from usersmanagement.models import UserProfile
 
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APIClient
+from utils.previews import delete_previews, generate_previews
+from utils.uploads import clean_upload_sessions
 
 
+# The files stored by the tests go to a temporary media directory.
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    FILE_UPLOAD_SESSION_DIR=os.path.join(MEDIA_ROOT, 'uploads/'),
+    FILE_PREVIEW_DIR=os.path.join(MEDIA_ROOT, 'previews/')
+)
 class FileTests(TestCase):
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
     def set_up_perm(self):
         """
             Set up a user with permissions
@@ -229,7 +251,7 @@ class FileTests(TestCase):
         response1 = client.post('/api/maintenancemanagement/files/', data, format='multipart')
         pk = response1.data['id']
         response = client.get(f'/api/maintenancemanagement/files/{pk}/')
-        path = settings.BASE_DIR + response.data["file"]
+        path = os.path.join(MEDIA_ROOT, response.data["file"].split(settings.MEDIA_URL, 1)[1])
         with Image.open(path) as img:
             colors = img.getcolors()
         self.assertEqual(colors, [(3600, 255)])
@@ -297,3 +319,498 @@ class FileTests(TestCase):
         user = UserProfile.objects.get(id=user.pk)
         response = client.delete(f'/api/maintenancemanagement/files/{pk}/')
         self.assertEqual(response.status_code, 401)
+
+    def test_files_download_file_with_connected(self):
+        """
+        Test if a user can download the content of a file.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    file (BytesIO): a File-like object we use to create a file in the database.
+
+                Expected Outputs:
+                    We expect the response's status code to be 200 and the content to be the uploaded one.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = self.temporary_image('png').read()
+        response1 = client.post(
+            '/api/maintenancemanagement/files/', {
+                'file': BytesIO(content),
+                'is_manual': 'False'
+            },
+            format='multipart'
+        )
+        pk = response1.data['id']
+        response = client.get(f'/api/maintenancemanagement/files/{pk}/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_files_download_file_with_range(self):
+        """
+        Test if a user can download a part of a file with a Range header.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    file (BytesIO): a File-like object we use to create a file in the database.
+
+                Expected Outputs:
+                    We expect the response's status code to be 206 and to only contain the asked bytes.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = self.temporary_image('png').read()
+        response1 = client.post(
+            '/api/maintenancemanagement/files/', {
+                'file': BytesIO(content),
+                'is_manual': 'False'
+            },
+            format='multipart'
+        )
+        pk = response1.data['id']
+        response = client.get(f'/api/maintenancemanagement/files/{pk}/download/', HTTP_RANGE='bytes=2-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), content[2:10])
+        self.assertEqual(response['Content-Range'], f'bytes 2-9/{len(content)}')
+        response = client.get(f'/api/maintenancemanagement/files/{pk}/download/', HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), content[-4:])
+        response = client.get(
+            f'/api/maintenancemanagement/files/{pk}/download/', HTTP_RANGE=f'bytes={len(content)}-'
+        )
+        self.assertEqual(response.status_code, 416)
+
+    def test_files_download_file_with_if_range(self):
+        """
+        Test if a Range header is only honoured when If-Range is the strong ETag of the file.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    file (BytesIO): a File-like object we use to create a file in the database.
+
+                Expected Outputs:
+                    We expect a 206 for the ETag of the file, and a 200 with the whole file for the weak
+                    version of the ETag and for another ETag.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = self.temporary_image('png').read()
+        pk = client.post(
+            '/api/maintenancemanagement/files/', {
+                'file': BytesIO(content),
+                'is_manual': 'False'
+            },
+            format='multipart'
+        ).data['id']
+        url = f'/api/maintenancemanagement/files/{pk}/download/'
+        etag = client.get(url)['ETag']
+        response = client.get(url, HTTP_RANGE='bytes=2-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), content[2:10])
+        for if_range in ('W/' + etag, '"other"'):
+            response = client.get(url, HTTP_RANGE='bytes=2-9', HTTP_IF_RANGE=if_range)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), content)
+
+    def test_files_download_file_not_modified(self):
+        """
+        Test if a client revalidating a file with its ETag gets a 304.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    file (BytesIO): a File-like object we use to create a file in the database.
+
+                Expected Outputs:
+                    We expect the response's status code to be 304.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        data = {'file': self.temporary_image('png'), 'is_manual': 'False'}
+        pk = client.post('/api/maintenancemanagement/files/', data, format='multipart').data['id']
+        etag = client.get(f'/api/maintenancemanagement/files/{pk}/download/')['ETag']
+        response = client.get(f'/api/maintenancemanagement/files/{pk}/download/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_files_download_file_with_accel_redirect(self):
+        """
+        Test if the download is delegated to the web server in x-accel-redirect mode.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    file (BytesIO): a File-like object we use to create a file in the database.
+
+                Expected Outputs:
+                    We expect the response to contain the X-Accel-Redirect header and no content.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        data = {'file': self.temporary_image('png'), 'is_manual': 'False'}
+        response1 = client.post('/api/maintenancemanagement/files/', data, format='multipart')
+        pk = response1.data['id']
+        name = File.objects.get(pk=pk).file.name
+        with override_settings(FILE_DOWNLOAD_MODE='x-accel-redirect'):
+            response = client.get(f'/api/maintenancemanagement/files/{pk}/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + name)
+        self.assertEqual(response.content, b'')
+
+    def test_files_download_file_without_connected(self):
+        """
+        Test if a client with no authenticated user can't download a file.
+
+                Inputs:
+                    client (APIClient): the client that will be used to do the GET with no user authenticated.
+
+                Expected Outputs:
+                    We expect the response's status_code to be 401.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        data = {'file': self.temporary_image('png'), 'is_manual': 'False'}
+        pk = client.post('/api/maintenancemanagement/files/', data, format='multipart').data['id']
+        client = APIClient()
+        response = client.get(f'/api/maintenancemanagement/files/{pk}/download/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_files_chunked_upload_with_connected(self):
+        """
+        Test if a user can upload a file by chunks and resume the upload.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    content (bytes): a png picture we send in three chunks.
+
+                Expected Outputs:
+                    We expect the offset to follow the chunks, a misplaced chunk to be refused with a 409
+                    and the last chunk to create the File with the uploaded content.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = self.temporary_image('png').read()
+        response = client.post(
+            '/api/maintenancemanagement/files/uploads/', {
+                'file_name': 'chunked.png',
+                'size': len(content),
+                'is_manual': False,
+                'sha256': sha256(content).hexdigest()
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        url = f"/api/maintenancemanagement/files/uploads/{response.data['id']}/"
+        response = client.put(url, content[:20], content_type='application/octet-stream')
+        self.assertEqual(response.data['offset'], 20)
+        response = client.put(
+            url, content[10:30], content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 10-29/*'
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(client.get(url).data['offset'], 20)
+        response = client.put(
+            url, content[20:40], content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 20-39/*'
+        )
+        self.assertEqual(response.data['offset'], 40)
+        response = client.put(url, content[40:], content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 201)
+        file = File.objects.get(pk=response.data['id'])
+        self.assertFalse(file.is_manual)
+        with file.file.open('rb') as uploaded:
+            self.assertEqual(uploaded.read(), content)
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_files_chunked_upload_text_file(self):
+        """
+        Test if a user can't upload a text file by chunks.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+
+                Expected Outputs:
+                    We expect the first chunk to be refused with a 400 and the upload to be cancelled.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = b'Coco veut un gateau'
+        response = client.post(
+            '/api/maintenancemanagement/files/uploads/', {
+                'file_name': 'coco.txt',
+                'size': len(content)
+            }, format='json'
+        )
+        url = f"/api/maintenancemanagement/files/uploads/{response.data['id']}/"
+        response = client.put(url, content, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_files_chunked_upload_with_bad_hash(self):
+        """
+        Test if an upload whose content doesn't match the announced sha256 is refused.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+
+                Expected Outputs:
+                    We expect the last chunk to be refused with a 400.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = self.temporary_image('png').read()
+        response = client.post(
+            '/api/maintenancemanagement/files/uploads/', {
+                'file_name': 'chunked.png',
+                'size': len(content),
+                'sha256': sha256(b'something else').hexdigest()
+            },
+            format='json'
+        )
+        url = f"/api/maintenancemanagement/files/uploads/{response.data['id']}/"
+        response = client.put(url, content, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+
+    def test_files_chunked_upload_with_bad_range(self):
+        """
+        Test if a chunk whose length doesn't match its Content-Range is refused.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    content (bytes): a png picture we send in two chunks.
+
+                Expected Outputs:
+                    We expect a truncated chunk to be refused with a 400, the offset to be kept and the
+                    upload to be resumed with the right chunk.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = self.temporary_image('png').read()
+        response = client.post(
+            '/api/maintenancemanagement/files/uploads/', {
+                'file_name': 'chunked.png',
+                'size': len(content),
+                'sha256': sha256(content).hexdigest()
+            },
+            format='json'
+        )
+        url = f"/api/maintenancemanagement/files/uploads/{response.data['id']}/"
+        response = client.put(
+            url, content[:20], content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 0-19/*'
+        )
+        self.assertEqual(response.data['offset'], 20)
+        response = client.put(
+            url, content[20:30], content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 20-39/*'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(client.get(url).data['offset'], 20)
+        response = client.put(
+            url,
+            content[20:],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 20-{len(content) - 1}/{len(content)}'
+        )
+        self.assertEqual(response.status_code, 201)
+        with File.objects.get(pk=response.data['id']).file.open('rb') as uploaded:
+            self.assertEqual(uploaded.read(), content)
+
+    def test_files_chunked_upload_expiration(self):
+        """
+        Test if only the upload sessions without a recent chunk are deleted.
+
+                Inputs:
+                    sessions (UploadSession): two sessions started two days ago, one receiving a chunk now.
+
+                Expected Outputs:
+                    We expect only the session without a chunk since two days to be deleted.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = self.temporary_image('png').read()
+        urls = []
+        for _ in range(2):
+            response = client.post(
+                '/api/maintenancemanagement/files/uploads/', {
+                    'file_name': 'chunked.png',
+                    'size': len(content)
+                }, format='json'
+            )
+            urls.append(f"/api/maintenancemanagement/files/uploads/{response.data['id']}/")
+        two_days_ago = timezone.now() - timedelta(days=2)
+        UploadSession.objects.update(created_at=two_days_ago, updated_at=two_days_ago)
+        client.put(urls[0], content[:20], content_type='application/octet-stream')
+        clean_upload_sessions()
+        self.assertEqual(client.get(urls[0]).data['offset'], 20)
+        self.assertEqual(client.get(urls[1]).status_code, 404)
+
+    def test_files_chunked_upload_without_connected(self):
+        """
+        Test if a client with no authenticated user can't start a chunked upload.
+
+                Inputs:
+                    client (APIClient): the client that will be used to do the POST with no user authenticated.
+
+                Expected Outputs:
+                    We expect the response's status_code to be 401.
+        """
+        client = APIClient()
+        response = client.post(
+            '/api/maintenancemanagement/files/uploads/', {
+                'file_name': 'chunked.png',
+                'size': 10
+            }, format='json'
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_files_identical_files_share_content(self):
+        """
+        Test if identical uploads share the same stored content until the last one is deleted.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    content (bytes): a png picture we upload twice.
+
+                Expected Outputs:
+                    We expect both files to reference the same blob, the blob to be kept when the first file is
+                    deleted and to be deleted with the second one.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = self.temporary_image('png').read()
+        pk1 = client.post(
+            '/api/maintenancemanagement/files/', {
+                'file': BytesIO(content),
+                'is_manual': 'False'
+            }, format='multipart'
+        ).data['id']
+        pk2 = client.post(
+            '/api/maintenancemanagement/files/', {
+                'file': BytesIO(content),
+                'is_manual': 'True'
+            }, format='multipart'
+        ).data['id']
+        file1, file2 = File.objects.get(pk=pk1), File.objects.get(pk=pk2)
+        self.assertEqual(file1.blob, file2.blob)
+        self.assertEqual(file1.file.name, file2.file.name)
+        self.assertEqual(file1.blob.sha256, sha256(content).hexdigest())
+        blob = file1.blob
+        client.delete(f'/api/maintenancemanagement/files/{pk1}/')
+        self.assertTrue(Blob.objects.filter(pk=blob.pk).exists())
+        client.delete(f'/api/maintenancemanagement/files/{pk2}/')
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+
+    def test_files_add_file_with_known_sha256(self):
+        """
+        Test if a user can add a file already stored by only sending its sha256.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    content (bytes): a png picture we upload once.
+
+                Expected Outputs:
+                    We expect the file to be created from its sha256 and an unknown sha256 to send a 404.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        content = self.temporary_image('png').read()
+        client.post('/api/maintenancemanagement/files/', {'file': BytesIO(content)}, format='multipart')
+        response = client.post(
+            '/api/maintenancemanagement/files/', {
+                'sha256': sha256(content).hexdigest(),
+                'is_manual': False
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(File.objects.get(pk=response.data['id']).is_manual)
+        response = client.post(
+            '/api/maintenancemanagement/files/uploads/', {
+                'file_name': 'again.png',
+                'size': len(content),
+                'sha256': sha256(content).hexdigest()
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('file', response.data)
+        response = client.post(
+            '/api/maintenancemanagement/files/', {'sha256': sha256(b'unknown').hexdigest()}, format='json'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_files_thumbnail_of_image(self):
+        """
+        Test if the thumbnail of an image is generated and sent to a user.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    file (BytesIO): a big png picture we send with a POST.
+
+                Expected Outputs:
+                    We expect no thumbnail url before the generation, then a thumbnail url sending a small jpeg
+                    and no preview url.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        file_obj = BytesIO()
+        Image.new('RGB', (1200, 600), (200, 30, 30)).save(file_obj, 'png')
+        file_obj.seek(0)
+        content = file_obj.read()
+        delete_previews(sha256(content).hexdigest())
+        pk = client.post(
+            '/api/maintenancemanagement/files/', {
+                'file': BytesIO(content),
+                'is_manual': 'False'
+            }, format='multipart'
+        ).data['id']
+        response = client.get(f'/api/maintenancemanagement/files/{pk}/')
+        self.assertIsNone(response.data['thumbnail'])
+        response = client.get(f'/api/maintenancemanagement/files/{pk}/download/?variant=thumbnail')
+        self.assertEqual(response.status_code, 404)
+        generate_previews(pk)
+        response = client.get(f'/api/maintenancemanagement/files/{pk}/')
+        self.assertEqual(
+            response.data['thumbnail'], f'/api/maintenancemanagement/files/{pk}/download/?variant=thumbnail'
+        )
+        self.assertIsNone(response.data['preview'])
+        response = client.get(response.data['thumbnail'])
+        self.assertEqual(response.status_code, 200)
+        thumbnail = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(thumbnail.format, 'JPEG')
+        self.assertEqual(thumbnail.size, (256, 128))
+
+    def test_files_preview_of_pdf(self):
+        """
+        Test if the first page preview of a pdf is generated and sent to a user.
+
+                Inputs:
+                    user (UserProfile): a user we created with no permission.
+                    file (BytesIO): a pdf we send with a POST.
+
+                Expected Outputs:
+                    We expect a preview url sending a one page pdf and an unknown variant to send a 400.
+        """
+        user = self.set_up_without_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        data = {'file': self.temporary_image('PDF'), 'is_manual': 'True'}
+        pk = client.post('/api/maintenancemanagement/files/', data, format='multipart').data['id']
+        generate_previews(pk)
+        response = client.get('/api/maintenancemanagement/files/')
+        preview = [file['preview'] for file in response.data if file['id'] == pk][0]
+        self.assertEqual(preview, f'/api/maintenancemanagement/files/{pk}/download/?variant=preview')
+        response = client.get(preview)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF-'))
+        response = client.get(f'/api/maintenancemanagement/files/{pk}/download/?variant=original')
+        self.assertEqual(response.status_code, 400)
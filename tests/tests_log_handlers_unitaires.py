@@ -0,0 +1,98 @@
+import logging
+import os
+import tempfile
+
+from django.core import mail
+from django.test import TestCase
+from utils.log_handlers import (
+    QueuedAdminEmailHandler,
+    QueuedRotatingFileHandler,
+    SamplingFilter,
+    flush,
+)
+
+
+class LogHandlersTests(TestCase):
+
+    def setUp(self):
+        """
+            Set up a logger without handlers.
+        """
+        self.logger = logging.getLogger('tests.log_handlers')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def add_handler(self, handler):
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler
+
+    def test_US40_U1_queued_rotating_file_handler(self):
+        """
+            Test that the records are formatted with the formatter of the
+            handler, written by the listener and the files rotated.
+
+            Inputs:
+                records : records logged with a maximum size of 100 bytes.
+
+            Expected Output:
+                We expect the formatted records in the file and its rotated
+                copy, and the other handlers to get the original records.
+        """
+        filename = os.path.join(self.directory.name, 'infos.log')
+        handler = self.add_handler(QueuedRotatingFileHandler(filename, max_bytes=100, backup_count=1))
+        handler.setFormatter(logging.Formatter('{levelname} {message}', style='{'))
+        records = []
+        other_handler = self.add_handler(logging.Handler())
+        other_handler.emit = records.append
+        self.logger.info('Created task %s', 'Vidange')
+        self.logger.info('x' * 100)
+        flush()
+        handler.close()
+        flush()
+        with open(filename + '.1') as log_file:
+            self.assertEqual(log_file.read(), 'INFO Created task Vidange\n')
+        with open(filename) as log_file:
+            self.assertEqual(log_file.read(), 'INFO ' + 'x' * 100 + '\n')
+        self.assertEqual(records[0].msg, 'Created task %s')
+        self.assertEqual(records[0].args, ('Vidange', ))
+
+    def test_US40_U2_queued_admin_email_handler(self):
+        """
+            Test that the errors are mailed to the admins by the listener.
+
+            Inputs:
+                record : an error with its exception.
+
+            Expected Output:
+                We expect a mail with the traceback of the exception.
+        """
+        self.add_handler(QueuedAdminEmailHandler())
+        with self.settings(ADMINS=[('Admin', 'admin@example.com')]):
+            try:
+                raise ValueError('Broken')
+            except ValueError:
+                self.logger.exception('Import failed')
+            flush()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Import failed', mail.outbox[0].subject)
+        self.assertIn('Exception Value: Broken', mail.outbox[0].body)
+
+    def test_US40_U3_sampling_filter(self):
+        """
+            Test that the sampling filter keeps the given fraction of the
+            records.
+
+            Inputs:
+                rate (float): 0, 1 and 0.5.
+
+            Expected Output:
+                We expect no record, all the records and about half of them.
+        """
+        record = logging.makeLogRecord({'msg': 'SELECT 1'})
+        self.assertFalse(any(SamplingFilter(0).filter(record) for _ in range(100)))
+        self.assertTrue(all(SamplingFilter(1).filter(record) for _ in range(100)))
+        kept = sum(SamplingFilter(0.5).filter(record) for _ in range(1000))
+        self.assertTrue(300 < kept < 700)
@@ -0,0 +1,149 @@
+import pytest
+from init_db_tests import init_db
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from maintenancemanagement.models import Equipment, Task
+from rest_framework.test import APIClient
+from usersmanagement.models import UserProfile
+from utils.metrics import Histogram, RequestMeasures, get_query_shape
+
+
+class MetricsTests(TestCase):
+
+    @pytest.fixture(scope="class", autouse=True)
+    def init_database(django_db_setup, django_db_blocker):
+        with django_db_blocker.unblock():
+            init_db()
+
+    def set_up_user(self, is_superuser=False):
+        """
+            Set up a user.
+        """
+        user = UserProfile.objects.create(username='tom', is_superuser=is_superuser)
+        user.set_password('truc')
+        user.save()
+        return user
+
+    def get_metrics(self, client):
+        response = client.get('/api/metrics/')
+        return response, response.content.decode()
+
+    def test_US39_I1_metrics_of_a_view(self):
+        """
+            Test that the requests to a view are measured and exposed in the
+            Prometheus text format.
+
+            Inputs:
+                user (UserProfile): a superuser.
+
+            Expected Output:
+                We expect the histograms of the equipment list to count the
+                request.
+        """
+        client = APIClient()
+        client.force_authenticate(user=self.set_up_user(is_superuser=True))
+        _, before = self.get_metrics(client)
+        client.get('/api/maintenancemanagement/equipments/')
+        response, after = self.get_metrics(client)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        labels = 'view="equipment-list",method="GET"'
+        count_line = 'opencmms_request_duration_seconds_count{{{}}} '.format(labels)
+
+        def get_count(text):
+            for line in text.splitlines():
+                if line.startswith(count_line):
+                    return int(line.split()[-1])
+            return 0
+
+        self.assertEqual(get_count(after), get_count(before) + 1)
+        self.assertIn('# TYPE opencmms_request_db_queries histogram', after)
+        self.assertIn('opencmms_request_db_queries_bucket{{{},le="+Inf"}}'.format(labels), after)
+        self.assertIn('opencmms_request_serializer_duration_seconds_sum{{{}}}'.format(labels), after)
+
+    def test_US39_I2_metrics_without_perms(self):
+        """
+            Test that the metrics are only sent to the superusers and to the
+            requests with the metrics token.
+
+            Inputs:
+                user (UserProfile): a user who is not a superuser.
+
+            Expected Output:
+                We expect an HTTP 401 without the token and the metrics with
+                it.
+        """
+        client = APIClient()
+        client.force_authenticate(user=self.set_up_user())
+        response, _ = self.get_metrics(client)
+        self.assertEqual(response.status_code, 401)
+        client = APIClient()
+        with override_settings(METRICS_TOKEN='secret'):
+            client.credentials(HTTP_AUTHORIZATION='Token wrong')
+            self.assertEqual(self.get_metrics(client)[0].status_code, 401)
+            client.credentials(HTTP_AUTHORIZATION='Token secret')
+            self.assertEqual(self.get_metrics(client)[0].status_code, 200)
+
+    @override_settings(METRICS_N_PLUS_ONE_THRESHOLD=3)
+    def test_US39_I3_n_plus_one(self):
+        """
+            Test that the queries of a same shape repeated by a request are
+            flagged.
+
+            Inputs:
+                queries : a query of the equipments repeated for each task.
+
+            Expected Output:
+                We expect the shape of the repeated query to be flagged, not
+                the one executed once.
+        """
+        tasks = [Task.objects.create(name='Task {}'.format(i)) for i in range(4)]
+        measures = RequestMeasures()
+        with connection.execute_wrapper(measures):
+            list(Task.objects.all())
+            for task in tasks:
+                list(Equipment.objects.filter(pk=task.pk))
+        n_plus_one = measures.get_n_plus_one()
+        self.assertEqual(len(n_plus_one), 1)
+        self.assertIn('maintenancemanagement_equipment', n_plus_one[0][0])
+        self.assertEqual(n_plus_one[0][1], 4)
+        self.assertEqual(measures.queries, 5)
+
+    def test_US39_U1_query_shape(self):
+        """
+            Test that the queries with other parameters have the same shape.
+
+            Inputs:
+                sql (String): queries differing by their literals and their
+                number of parameters.
+
+            Expected Output:
+                We expect the same shape.
+        """
+        self.assertEqual(
+            get_query_shape("SELECT * FROM task WHERE id IN (%s, %s, %s) AND name = 'a'"),
+            get_query_shape("SELECT * FROM task WHERE id IN (%s) AND name = 'it''s'"),
+        )
+        self.assertEqual(get_query_shape('SELECT * FROM task WHERE id = 12'), 'SELECT * FROM task WHERE id = %s')
+
+    def test_US39_U2_histogram_buckets(self):
+        """
+            Test that the buckets of a histogram are cumulated.
+
+            Inputs:
+                values (list): observations of a histogram.
+
+            Expected Output:
+                We expect each bucket to count the observations lower or
+                equal to its bound.
+        """
+        histogram = Histogram('test_seconds', 'A test.', ('view', ), (1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(('home', ), value)
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{view="home",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{view="home",le="5"} 3', lines)
+        self.assertIn('test_seconds_bucket{view="home",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_sum{view="home"} 14.5', lines)
+        self.assertIn('test_seconds_count{view="home"} 4', lines)
@@ -0,0 +1,199 @@
+import pytest
+from init_db_tests import init_db
+
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+from maintenancemanagement.models import (
+    Equipment,
+    EquipmentType,
+    Field,
+    FieldObject,
+    Task,
+)
+from rest_framework.test import APIClient
+from usersmanagement.models import UserProfile
+from utils.search import InvertedIndex, search_index, similarity
+
+
+class SearchTests(TestCase):
+
+    @pytest.fixture(scope="class", autouse=True)
+    def init_database(django_db_setup, django_db_blocker):
+        with django_db_blocker.unblock():
+            init_db()
+
+    def setUp(self):
+        """
+            Set up tasks and equipments to search.
+        """
+        equipment_type = EquipmentType.objects.get(name='Embouteilleuse')
+        self.equipment = Equipment.objects.get(name='Embouteilleuse AXB1')
+        self.other_equipment = Equipment.objects.create(name='Remplisseuse', equipment_type=equipment_type)
+        field = Field.objects.create(name='Fournisseur')
+        FieldObject.objects.create(described_object=self.other_equipment, field=field, value='Bosch AXB')
+        self.task = Task.objects.create(name='Nettoyage', description='Nettoyer la buse de l\'embouteilleuse')
+        self.other_task = Task.objects.create(name='Vidange', description='Vidanger le moteur')
+
+    def set_up_user(self, *codenames):
+        """
+            Set up a user with the given permissions.
+        """
+        user = UserProfile.objects.create(username='tom')
+        user.set_password('truc')
+        user.save()
+        for codename in codenames:
+            user.user_permissions.add(Permission.objects.get(codename=codename))
+        return user
+
+    def search(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client.get('/api/maintenancemanagement/search/', params, format='json')
+
+    def test_US35_I1_search_with_perms(self):
+        """
+            Test that the search finds the tasks and equipments by their
+            names, descriptions and field values, the most similar first.
+
+            Inputs:
+                q (String): the searched text.
+
+            Expected Output:
+                We expect the equipment whose name matches, then the task
+                whose description matches, and an equipment found by its
+                field value.
+        """
+        user = self.set_up_user('view_task', 'view_equipment')
+        response = self.search(user, q='embouteil')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        results = [(result['type'], result['id']) for result in response.data['results']]
+        self.assertEqual(results, [('equipment', self.equipment.id), ('task', self.task.id)])
+        self.assertEqual(response.data['results'][1]['name'], 'Nettoyage')
+        self.assertEqual(response.data['results'][1]['match'], 'Nettoyer la buse de l\'embouteilleuse')
+
+        response = self.search(user, q='axb')
+        results = [(result['type'], result['id']) for result in response.data['results']]
+        self.assertEqual(results, [('equipment', self.other_equipment.id), ('equipment', self.equipment.id)])
+        self.assertEqual(response.data['results'][0]['name'], 'Remplisseuse')
+        self.assertEqual(response.data['results'][0]['field'], 'Fournisseur')
+
+    def test_US35_I2_search_is_paginated(self):
+        """
+            Test that the search sends the asked page of results.
+
+            Inputs:
+                page (int): the asked page.
+                page_size (int): the number of results by page.
+
+            Expected Output:
+                We expect the count of all the results and one result.
+        """
+        user = self.set_up_user('view_task', 'view_equipment')
+        first_page = self.search(user, q='embouteil', page_size=1)
+        second_page = self.search(user, q='embouteil', page_size=1, page=2)
+        self.assertEqual(first_page.data['count'], 2)
+        self.assertEqual(second_page.data['count'], 2)
+        self.assertEqual(first_page.data['results'][0]['id'], self.equipment.id)
+        self.assertEqual(second_page.data['results'][0]['id'], self.task.id)
+
+    def test_US35_I3_search_only_viewable(self):
+        """
+            Test that the search only sends the types the user can view.
+
+            Inputs:
+                user (UserProfile): a user who can only view the tasks.
+
+            Expected Output:
+                We expect only the task.
+        """
+        user = self.set_up_user('view_task')
+        response = self.search(user, q='embouteil')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['type'], 'task')
+
+    def test_US35_I4_search_with_wrong_params(self):
+        """
+            Test that the search refuses a too short query and the
+            unauthenticated users.
+
+            Expected Output:
+                We expect HTTP 400 then HTTP 401.
+        """
+        user = self.set_up_user('view_task')
+        self.assertEqual(self.search(user, q='em').status_code, 400)
+        self.assertEqual(self.search(user, q='embouteil', page_size=500).status_code, 400)
+        response = APIClient().get('/api/maintenancemanagement/search/', {'q': 'embouteil'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_US35_I5_search_index(self):
+        """
+            Test the in-process index used without PostgreSQL.
+
+            Expected Output:
+                We expect the texts containing the query, with their
+                similarity, and the index to follow the new rows.
+        """
+        results = {key: rank for key, match, rank in search_index.search('vidang')}
+        self.assertEqual(set(results), {('task', self.other_task.id, None)})
+        self.assertEqual(results[('task', self.other_task.id, None)], similarity('vidang', 'Vidange'))
+        FieldObject.objects.create(
+            content_type=ContentType.objects.get_for_model(Equipment),
+            object_id=self.equipment.id,
+            field=Field.objects.create(name='Huile'),
+            value='Vidange tous les mois'
+        )
+        results = {key for key, match, rank in search_index.search('vidang')}
+        self.assertEqual(results, {('task', self.other_task.id, None), ('equipment', self.equipment.id, 'Huile')})
+
+    def test_US35_I6_search_results_are_distinct(self):
+        """
+            Test that each equipment is given once and that the conditions
+            of the tasks are not searched.
+
+            Inputs:
+                q (String): a text in the name and a field value of an
+                    equipment, then in a trigger condition of a task.
+
+            Expected Output:
+                We expect the equipment once, with its name, counted once,
+                then no result for the condition.
+        """
+        FieldObject.objects.create(
+            described_object=self.equipment,
+            field=Field.objects.create(name='Notice'),
+            value='Notice de l\'embouteilleuse de la ligne 2'
+        )
+        FieldObject.objects.create(
+            described_object=self.task, field=Field.objects.get(name='Frequency'), value='10000|5|2d|15000'
+        )
+        user = self.set_up_user('view_task', 'view_equipment')
+        response = self.search(user, q='embouteil')
+        self.assertEqual(response.data['count'], 2)
+        results = [(result['type'], result['id']) for result in response.data['results']]
+        self.assertEqual(results, [('equipment', self.equipment.id), ('task', self.task.id)])
+        self.assertEqual(response.data['results'][0]['match'], 'Embouteilleuse AXB1')
+        response = self.search(user, q='15000')
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(response.data['results'], [])
+
+    def test_US35_U1_inverted_index(self):
+        """
+            Test the inverted index of trigrams.
+
+            Expected Output:
+                We expect only the texts containing the query, and the
+                removed texts not to be found.
+        """
+        index = InvertedIndex()
+        index.add(1, 'Embouteilleuse')
+        index.add(2, 'Bouteille')
+        index.add(3, 'Remplisseuse')
+        self.assertEqual({key for key, text, rank in index.search('BOUTEIL')}, {1, 2})
+        self.assertEqual({key for key, text, rank in index.search('euse')}, {1, 3})
+        index.remove(2)
+        index.add(3, 'Bouchonneuse')
+        self.assertEqual({key for key, text, rank in index.search('bouteil')}, {1})
+        self.assertEqual({key for key, text, rank in index.search('seuse')}, set())
+        self.assertEqual(similarity('embouteilleuse', 'Embouteilleuse'), 1)
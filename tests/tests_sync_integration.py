@@ -0,0 +1,188 @@
+from datetime import timedelta
+
+import pytest
+from init_db_tests import init_db
+
+from django.contrib.auth.models import Permission
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from maintenancemanagement.models import (
+    Change,
+    Equipment,
+    EquipmentType,
+    Field,
+    FieldObject,
+    Task,
+)
+from rest_framework.test import APIClient
+from usersmanagement.models import Team, UserProfile
+from utils.sync import prune_tombstones
+
+
+@override_settings(SYNC_SAFETY_DELAY=0)
+class SyncTests(TestCase):
+
+    @pytest.fixture(scope="class", autouse=True)
+    def init_database(django_db_setup, django_db_blocker):
+        with django_db_blocker.unblock():
+            init_db()
+
+    def set_up_perm(self):
+        """
+            Set up a user who can view the synchronised objects.
+        """
+        user = UserProfile.objects.create(username='tom')
+        user.set_password('truc')
+        user.save()
+        for codename in ('view_task', 'view_equipment', 'view_fieldobject', 'view_file'):
+            user.user_permissions.add(Permission.objects.get(codename=codename))
+        return user
+
+    def sync(self, user, since=None):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        params = {} if since is None else {'since': since}
+        return client.get('/api/maintenancemanagement/sync/', params, format='json')
+
+    def test_US38_I1_sync_with_perm(self):
+        """
+            Test that the synchronisation sends the objects changed since the
+            token, once each, and the tombstones of the deleted objects.
+
+            Inputs:
+                since (int): the token of the previous synchronisation.
+
+            Expected Output:
+                We expect the created, updated and deleted objects and a
+                new token after which nothing changed.
+        """
+        user = self.set_up_perm()
+        since = self.sync(user).data['token']
+        equipment = Equipment.objects.create(
+            name="Peugeot Partner", equipment_type=EquipmentType.objects.create(name="Voiture")
+        )
+        field_object = FieldObject.objects.create(
+            described_object=equipment, field=Field.objects.create(name="Kilométrage"), value="1000"
+        )
+        task = Task.objects.create(name="Vidange", equipment=equipment)
+        task.name = "Vidange moteur"
+        task.save()
+        task.teams.add(Team.objects.create(name="Garage"))
+        response = self.sync(user, since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([data['id'] for data in response.data['equipments']], [equipment.id])
+        self.assertEqual([data['id'] for data in response.data['field_objects']], [field_object.id])
+        self.assertEqual([data['name'] for data in response.data['tasks']], ["Vidange moteur"])
+        self.assertEqual(len(response.data['tasks'][0]['teams']), 1)
+        self.assertFalse(response.data['more'])
+
+        since = response.data['token']
+        response = self.sync(user, since)
+        self.assertEqual(response.data['token'], since)
+        self.assertEqual(response.data['tasks'], [])
+
+        task_id = task.id
+        task.delete()
+        response = self.sync(user, since)
+        self.assertEqual(response.data['tasks'], [])
+        self.assertEqual(response.data['deleted']['tasks'], [task_id])
+
+    def test_US38_I2_sync_by_pages(self):
+        """
+            Test that the synchronisation sends the changes by pages.
+
+            Expected Output:
+                We expect more to be true until the last page, and each
+                object once.
+        """
+        user = self.set_up_perm()
+        since = self.sync(user).data['token']
+        tasks = [Task.objects.create(name="task " + str(i)) for i in range(3)]
+        received = []
+        with override_settings(SYNC_PAGE_SIZE=2):
+            response = self.sync(user, since)
+            self.assertTrue(response.data['more'])
+            received += [data['id'] for data in response.data['tasks']]
+            response = self.sync(user, response.data['token'])
+            self.assertFalse(response.data['more'])
+            received += [data['id'] for data in response.data['tasks']]
+        self.assertEqual(received, [task.id for task in tasks])
+
+    def test_US38_I3_sync_recent_changes(self):
+        """
+            Test that the token does not move past the recent changes.
+
+            Expected Output:
+                We expect the recent change to be sent with the previous
+                token.
+        """
+        user = self.set_up_perm()
+        since = self.sync(user).data['token']
+        task = Task.objects.create(name="task")
+        with override_settings(SYNC_SAFETY_DELAY=60):
+            response = self.sync(user, since)
+        self.assertEqual([data['id'] for data in response.data['tasks']], [task.id])
+        self.assertEqual(response.data['token'], since)
+
+    def test_US38_I4_sync_only_viewable(self):
+        """
+            Test that the synchronisation only sends the objects the user can
+            view, and refuses unauthenticated users.
+
+            Expected Output:
+                We expect no task for a user without permissions and HTTP
+                401 without authentication.
+        """
+        user = UserProfile.objects.create(username='tom')
+        Task.objects.create(name="task")
+        response = self.sync(user)
+        self.assertNotIn('tasks', response.data)
+        self.assertEqual(response.data['token'], 0)
+        self.assertEqual(self.sync(user, -1).status_code, 400)
+        response = APIClient().get('/api/maintenancemanagement/sync/', format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_US38_I5_sync_after_tombstones_pruned(self):
+        """
+            Test that the old tombstones are deleted but the last one, and
+            that a token before them expires.
+
+            Inputs:
+                since (int): a token received before three deletions made
+                    40 days ago.
+
+            Expected Output:
+                We expect only the last old tombstone to be kept, HTTP 410
+                for the token before it and the changes for the token 0 and
+                the token after it.
+        """
+        user = self.set_up_perm()
+        since = self.sync(user).data['token']
+        tasks = [Task.objects.create(name="task " + str(i)) for i in range(3)]
+        task_ids = [task.id for task in tasks]
+        for task in tasks:
+            task.delete()
+        tombstones = Change.objects.filter(object_id__in=task_ids, content_type__model='task', is_deleted=True)
+        tombstones.update(changed_at=timezone.now() - timedelta(days=40))
+        self.assertEqual(prune_tombstones(), 2)
+        self.assertEqual([change.object_id for change in tombstones], [task_ids[2]])
+        self.assertEqual(self.sync(user, since).status_code, 410)
+        self.assertEqual(self.sync(user).status_code, 200)
+        response = self.sync(user, tombstones[0].id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['deleted']['tasks'], [])
+
+    def test_US38_U1_change_coalescing(self):
+        """
+            Test that an object keeps only its last change.
+
+            Expected Output:
+                We expect a single change, the tombstone, once the object is
+                deleted.
+        """
+        task = Task.objects.create(name="task")
+        task.save()
+        task_id = task.id
+        task.delete()
+        changes = Change.objects.filter(object_id=task_id, content_type__model='task')
+        self.assertEqual([change.is_deleted for change in changes], [True])
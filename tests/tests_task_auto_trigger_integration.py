@@ -1,14 +1,28 @@
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 
+import numpy as np
 import pytest
 from init_db_tests import init_db
 
-from django.test import TestCase
-from maintenancemanagement.models import Field, FieldObject, Task
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from maintenancemanagement.models import Field, FieldObject, Reading, Task
+from rest_framework.test import APIClient
+from usersmanagement.models import UserProfile
+from utils.backtest import get_firings
+from utils.forecast import estimate_days, update_trends
 from utils.trigger_tasks import (
+    ABOVE_THRESHOLD,
+    FREQUENCY,
+    UNDER_THRESHOLD,
     at_least_one_conditon_is_verified,
     check_tasks,
     condition_is_verified,
+    evaluate_sensor_conditions,
+    get_verified_conditions,
+    to_floats,
 )
 
 
@@ -282,3 +296,276 @@ class TaskAutoTriggerTests(TestCase):
         self.assertEqual(Task.objects.get(name="Task 1").end_date, date.today() + timedelta(days=3))
         self.assertEqual(Task.objects.get(name="Task 2").end_date, date.today() + timedelta(days=5))
         self.assertEqual(Task.objects.get(name="Task 3").end_date, date.today() + timedelta(days=7))
+
+    def test_US45_I1_next_check_at_follows_conditions(self):
+        """
+            Test that the date from which a task is checked follows its
+            conditions and end date, and that only the due tasks are read.
+
+            Inputs:
+                task (Task): a task with a recurrence trigger condition.
+                sensor_task (Task): a task with an above threshold trigger condition.
+
+            Expected Output:
+                We expect the recurrence task to be checked from its end date
+                minus the delay, the sensor task at each run, and a single
+                query when no task is due.
+                We expect the recurrence task to be triggered once its end
+                date is moved, and not to be checked without condition.
+        """
+        task = Task.objects.create(name='Task', end_date=(date.today() + timedelta(days=10)), is_triggered=False)
+        recurrence = FieldObject.objects.create(
+            described_object=task, field=Field.objects.get(name="Recurrence"), value="30d|5d"
+        )
+        self.assertEqual(Task.objects.get(pk=task.pk).next_check_at, date.today() + timedelta(days=5))
+        with CaptureQueriesContext(connection) as queries:
+            check_tasks()
+        self.assertEqual(len([query for query in queries.captured_queries if 'SELECT' in query['sql']]), 1)
+        self.assertFalse(Task.objects.get(pk=task.pk).is_triggered)
+
+        related_field_object = FieldObject.objects.get(field=Field.objects.get(name="Nb bouteilles"))
+        sensor_task = Task.objects.create(name='Sensor task', is_triggered=False)
+        FieldObject.objects.create(
+            described_object=sensor_task,
+            field=Field.objects.get(name="Above Threshold"),
+            value=f"60000|{related_field_object.id}|7d"
+        )
+        self.assertEqual(Task.objects.get(pk=sensor_task.pk).next_check_at, date.today())
+
+        task.end_date = date.today() + timedelta(days=5)
+        task.save()
+        check_tasks()
+        self.assertTrue(Task.objects.get(pk=task.pk).is_triggered)
+        self.assertFalse(Task.objects.get(pk=sensor_task.pk).is_triggered)
+        recurrence.delete()
+        self.assertIsNone(Task.objects.get(pk=task.pk).next_check_at)
+
+    @override_settings(TRIGGER_BATCH_SIZE=2)
+    def test_US46_I1_check_tasks_by_batches(self):
+        """
+            Test that check_tasks goes through all the due tasks by batches,
+            including the ones it can't trigger.
+
+            Inputs:
+                tasks (list): three due tasks with a recurrence trigger condition.
+                sensor_tasks (list): two due tasks with a not yet verified above threshold trigger condition.
+
+            Expected Output:
+                We expect the three tasks to be triggered and counted, and
+                the two sensor tasks to stay as they are.
+        """
+        related_field_object = FieldObject.objects.get(field=Field.objects.get(name="Nb bouteilles"))
+        tasks = []
+        sensor_tasks = []
+        for i in range(5):
+            task = Task.objects.create(name=f'Task {i}', end_date=date.today(), is_triggered=False)
+            if i % 2:
+                FieldObject.objects.create(
+                    described_object=task,
+                    field=Field.objects.get(name="Above Threshold"),
+                    value=f"60000|{related_field_object.id}|7d"
+                )
+                sensor_tasks.append(task)
+            else:
+                FieldObject.objects.create(
+                    described_object=task, field=Field.objects.get(name="Recurrence"), value="30d|0d"
+                )
+                tasks.append(task)
+        self.assertEqual(check_tasks(), 3)
+        self.assertEqual(Task.objects.filter(pk__in=[task.pk for task in tasks], is_triggered=True).count(), 3)
+        self.assertEqual(Task.objects.filter(pk__in=[task.pk for task in sensor_tasks], is_triggered=False).count(), 2)
+        self.assertEqual(check_tasks(), 0)
+
+    def test_US47_U1_evaluate_sensor_conditions(self):
+        """
+            Test the mask of the verified sensor conditions.
+
+            Inputs:
+                kinds (array): the kinds of six conditions.
+                limits (array): their thresholds and next triggers.
+                values (array): the values they watch, one not being a number.
+
+            Expected Output:
+                We expect the conditions whose value passes their limit to be
+                verified, and the one without value not to be.
+        """
+        kinds = np.array([ABOVE_THRESHOLD, ABOVE_THRESHOLD, UNDER_THRESHOLD, UNDER_THRESHOLD, FREQUENCY, FREQUENCY])
+        limits = to_floats(['10', '10', '10', '10', '10', '10'])
+        values = to_floats(['11', '10', '9', '', '10', '9.5'])
+        self.assertEqual(
+            evaluate_sensor_conditions(kinds, limits, values).tolist(), [True, False, True, False, True, False]
+        )
+
+    def test_US47_I1_get_verified_conditions_constant_queries(self):
+        """
+            Test that the conditions of many tasks are evaluated with a
+            constant number of queries.
+
+            Inputs:
+                tasks (list): tasks with a verified or not yet verified above threshold condition.
+
+            Expected Output:
+                We expect two queries whatever the number of tasks, and the
+                verified condition of each task with one.
+        """
+        related_field_object = FieldObject.objects.get(field=Field.objects.get(name="Nb bouteilles"))
+        tasks = []
+        verified = {}
+        for i in range(6):
+            task = Task.objects.create(name=f'Task {i}', is_triggered=False)
+            condition = FieldObject.objects.create(
+                described_object=task,
+                field=Field.objects.get(name="Above Threshold"),
+                value=f"{40000 if i % 2 else 60000}|{related_field_object.id}|7d"
+            )
+            if i % 2:
+                verified[task.pk] = condition
+            tasks.append(task)
+        with self.assertNumQueries(2):
+            get_verified_conditions(tasks[:1])
+        with self.assertNumQueries(2):
+            self.assertEqual(get_verified_conditions(tasks), verified)
+
+    def test_US48_U1_get_firings(self):
+        """
+            Test the readings at which candidate conditions fire.
+
+            Inputs:
+                values (array): the values of eight readings.
+
+            Expected Output:
+                We expect a threshold condition to fire when it becomes
+                verified, and a frequency condition each time the value
+                grows by the frequency from the last firing.
+        """
+        values = np.array([5, 12, 15, 8, 11, 3, 26, 27], dtype=float)
+        self.assertEqual(get_firings(ABOVE_THRESHOLD, 10, values).tolist(), [1, 4, 6])
+        self.assertEqual(get_firings(UNDER_THRESHOLD, 10, values).tolist(), [0, 3, 5])
+        self.assertEqual(get_firings(FREQUENCY, 10, values).tolist(), [2, 6])
+        self.assertEqual(get_firings(FREQUENCY, 10, np.array([], dtype=float)).tolist(), [])
+
+    def test_US49_U1_estimate_days(self):
+        """
+            Test the number of days before the trends reach conditions.
+
+            Inputs:
+                kinds (array): the kinds of five conditions.
+                limits (array): their thresholds and next triggers.
+                levels (array): the levels of the trends they watch.
+                slopes (array): the slopes of the trends, one being unknown.
+
+            Expected Output:
+                We expect the days before the trend reaches each limit, no
+                day for a verified condition, and an infinite number of days
+                for a trend going away, unknown or reaching its limit after
+                the horizon.
+        """
+        kinds = np.array([ABOVE_THRESHOLD, UNDER_THRESHOLD, FREQUENCY, ABOVE_THRESHOLD, ABOVE_THRESHOLD, FREQUENCY])
+        limits = np.array([100, 10, 50, 100, 100, 10000], dtype=float)
+        levels = np.array([80, 40, 60, 80, 80, 0], dtype=float)
+        slopes = np.array([4, -6, 1, -1, np.nan, 1], dtype=float)
+        self.assertEqual(estimate_days(kinds, limits, levels, slopes).tolist(), [5, 5, 0, np.inf, np.inf, np.inf])
+
+    def test_US49_I1_trigger_eta_follows_readings(self):
+        """
+            Test that the forecast trigger date of a task follows the
+            readings of the field object it watches.
+
+            Inputs:
+                task (Task): a task with an above threshold condition.
+                field_object (FieldObject): the watched field object, read
+                three days in a row and given a new value by the equipment
+                API.
+
+            Expected Output:
+                We expect the date at which the trend reaches the threshold
+                in the details and the listing of the task, an earlier date
+                after a faster reading, and no date once it is triggered.
+        """
+        field_object = FieldObject.objects.get(field=Field.objects.get(name="Nb bouteilles"))
+        now = timezone.now()
+        update_trends(
+            Reading.objects.bulk_create(
+                [
+                    Reading(field_object=field_object, value=value, read_at=now - timedelta(days=days))
+                    for days, value in [(3, 47000), (2, 48000), (1, 49000)]
+                ]
+            )
+        )
+        task = Task.objects.create(name='Sensor task', is_triggered=False)
+        FieldObject.objects.create(
+            described_object=task,
+            field=Field.objects.get(name="Above Threshold"),
+            value=f"60000|{field_object.id}|7d"
+        )
+        self.assertAlmostEqual(
+            Task.objects.get(pk=task.pk).trigger_eta, now + timedelta(days=10), delta=timedelta(minutes=2)
+        )
+
+        client = APIClient()
+        client.force_authenticate(user=UserProfile.objects.create(username='tom', is_superuser=True))
+        response = client.put(
+            f'/api/maintenancemanagement/equipments/{field_object.object_id}/', {
+                'equipment_type': field_object.described_object.equipment_type_id,
+                'field': [{
+                    'id': field_object.id,
+                    'field': field_object.field_id,
+                    'value': '52000'
+                }]
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        trigger_eta = Task.objects.get(pk=task.pk).trigger_eta
+        self.assertLess(trigger_eta, now + timedelta(days=9))
+        response = client.get(f'/api/maintenancemanagement/tasks/{task.pk}/')
+        self.assertEqual(datetime.fromisoformat(response.json()['trigger_eta'].replace('Z', '+00:00')), trigger_eta)
+        response = client.get('/api/maintenancemanagement/tasks/')
+        self.assertIn(
+            task.pk, [item['id'] for item in response.json() if item['trigger_eta'] is not None]
+        )
+
+        task = Task.objects.get(pk=task.pk)
+        task.is_triggered = True
+        task.save()
+        self.assertIsNone(Task.objects.get(pk=task.pk).trigger_eta)
+
+    def test_US49_I2_trigger_eta_kept_within_tolerance(self):
+        """
+            Test that a reading which barely moves the forecast trigger date
+            of a task does not write the task.
+
+            Inputs:
+                task (Task): a task with an under threshold condition.
+                field_object (FieldObject): the watched field object, read
+                three days in a row and saved with a value on its trend.
+
+            Expected Output:
+                We expect the same trigger date and updated_at of the task,
+                and one query to find the tasks watching the field object.
+        """
+        field_object = FieldObject.objects.get(field=Field.objects.get(name="Nb bouteilles"))
+        now = timezone.now()
+        update_trends(
+            Reading.objects.bulk_create(
+                [
+                    Reading(field_object=field_object, value=value, read_at=now - timedelta(days=days))
+                    for days, value in [(3, 53000), (2, 52000), (1, 51000)]
+                ]
+            )
+        )
+        task = Task.objects.create(name='Sensor task', is_triggered=False)
+        FieldObject.objects.create(
+            described_object=task,
+            field=Field.objects.get(name="Under Threshold"),
+            value=f"40000|{field_object.id}|7d"
+        )
+        task = Task.objects.get(pk=task.pk)
+        self.assertIsNotNone(task.trigger_eta)
+        field_object.value = "50010"
+        with CaptureQueriesContext(connection) as queries:
+            field_object.save()
+        self.assertEqual(Task.objects.get(pk=task.pk).trigger_eta, task.trigger_eta)
+        self.assertEqual(Task.objects.get(pk=task.pk).updated_at, task.updated_at)
+        self.assertEqual(len([query for query in queries.captured_queries if '"watched_id" IN' in query['sql']]), 1)
+        self.assertFalse([query for query in queries.captured_queries if 'UPDATE "maintenancemanagement_task"' in query['sql']])
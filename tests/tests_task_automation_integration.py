@@ -5,12 +5,21 @@ from init_db_tests import init_db
 
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 from django.test import TestCase
-from maintenancemanagement.models import Field, FieldGroup, FieldObject, Task
+from django.test.utils import CaptureQueriesContext
+from maintenancemanagement.models import (
+    Field,
+    FieldGroup,
+    FieldObject,
+    File,
+    Task,
+)
 from openCMMS import settings
 from rest_framework.test import APIClient
-from usersmanagement.models import UserProfile
+from usersmanagement.models import Team, UserProfile
 from utils.methods import parse_time
+from utils.recurrence import regenerate_tasks
 
 User = settings.AUTH_USER_MODEL
 
@@ -618,3 +627,57 @@ class TaskTests(TestCase):
         for team0, team1 in zip(teams0, teams1):
             self.assertEqual(team0, team1)
         self.assertEqual(tasks.filter(over='False')[0].end_date, date.today() + parse_time('50d'))
+
+    def set_up_recurrent_task(self, name, team, by_path=False):
+        """
+            Set up a task with a recurrence, a file and a file given as end
+            condition, by its storage name or, as the former tasks, by its
+            path.
+        """
+        task = Task.objects.create(name=name)
+        task.teams.add(team)
+        document = File.objects.create(file='{}_notice.pdf'.format(name))
+        photo = File.objects.create(file='{}_photo.png'.format(name))
+        task.files.add(document, photo)
+        FieldObject.objects.create(described_object=task, field=Field.objects.get(name='Recurrence'), value='30d|7d')
+        FieldObject.objects.create(
+            described_object=task,
+            field=Field.objects.get(name='Photo'),
+            value=photo.file.path if by_path else photo.file.name,
+            description='Photo'
+        )
+        return task
+
+    def test_US42_U1_regenerate_tasks_in_bulk(self):
+        """
+            Test that the next occurrences of many tasks are created at once,
+            with their teams, files and conditions.
+
+            Inputs:
+                tasks (list): tasks with a recurrence, a team and files, the
+                    last one giving the path of its photo.
+
+            Expected Output:
+                We expect a clone of each task with the team, the file which
+                is not an end condition, the conditions and a postponed end
+                date, with the same number of queries for one or three tasks.
+        """
+        team = Team.objects.create(name='Maintenance')
+        tasks = [self.set_up_recurrent_task('Vidange {}'.format(i), team, by_path=i == 3) for i in range(4)]
+        with CaptureQueriesContext(connection) as single:
+            regenerate_tasks(tasks[:1])
+        with self.assertNumQueries(len(single.captured_queries)):
+            clones = regenerate_tasks(tasks[1:])
+        self.assertEqual(len(clones), 3)
+        for task, clone in zip(tasks[1:], clones):
+            clone = Task.objects.get(pk=clone.pk)
+            self.assertEqual(clone.name, task.name)
+            self.assertFalse(clone.over)
+            self.assertEqual(clone.end_date, date.today() + parse_time('30d'))
+            self.assertEqual(list(clone.teams.all()), [team])
+            self.assertEqual([file.file.name for file in clone.files.all()], ['{}_notice.pdf'.format(task.name)])
+            conditions = FieldObject.objects.filter(
+                content_type=ContentType.objects.get_for_model(Task), object_id=clone.pk
+            )
+            self.assertEqual(conditions.get(field__name='Recurrence').value, '30d|7d')
+            self.assertIsNone(conditions.get(field__name='Photo').value)
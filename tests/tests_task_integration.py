@@ -1,3 +1,7 @@
+import os
+import shutil
+import tempfile
+from datetime import date
 from io import BytesIO
 
 import pytest
@@ -5,12 +9,19 @@ from init_db_tests import init_db
 from PIL import Image
 
 from django.contrib.auth.models import Permission
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.dateparse import parse_datetime
 from maintenancemanagement.models import (
+    Equipment,
+    EquipmentType,
     Field,
     FieldGroup,
     FieldObject,
+    FieldValue,
     File,
+    Reading,
     Task,
 )
 from maintenancemanagement.serializers import (
@@ -23,12 +34,27 @@ from maintenancemanagement.serializers import (
 from openCMMS import settings
 from rest_framework.test import APIClient
 from usersmanagement.models import Team, UserProfile
+from utils.previews import generate_previews
 
 User = settings.AUTH_USER_MODEL
 
 
+# The files stored by the tests go to a temporary media directory.
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    FILE_UPLOAD_SESSION_DIR=os.path.join(MEDIA_ROOT, 'uploads/'),
+    FILE_PREVIEW_DIR=os.path.join(MEDIA_ROOT, 'previews/')
+)
 class TaskTests(TestCase):
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
     @pytest.fixture(scope="class", autouse=True)
     def init_database(django_db_setup, django_db_blocker):
         with django_db_blocker.unblock():
@@ -122,6 +148,47 @@ class TaskTests(TestCase):
         response = client.get('/api/maintenancemanagement/tasks/', {"template": "true"}, format='json')
         self.assertEqual(response.data, serializer.data)
 
+    def test_US5_I1_tasklist_get_filtered_with_perm(self):
+        """
+        Test if a user with perm can filter, search and sort the tasks.
+
+                Inputs:
+                    user (UserProfile): a UserProfile we setup with all permissions on tasks.
+                    tasks (Task): three tasks with different equipments, teams, dates and states.
+
+                Expected Outputs:
+                    We expect each filter to send the matching tasks in the asked order.
+                    We expect an unknown ordering field to send a 400.
+        """
+        user = self.set_up_perm()
+        equipment_type = EquipmentType.objects.create(name="Filtre type")
+        equipment = Equipment.objects.create(name="Filtre equipment", equipment_type=equipment_type)
+        team = Team.objects.create(name="Filtre team")
+        task_1 = Task.objects.create(name="Filtre 1", end_date=date(2030, 1, 10), equipment=equipment)
+        task_1.teams.add(team)
+        task_2 = Task.objects.create(
+            name="Filtre 2", description="Vidange", end_date=date(2030, 2, 10), equipment_type=equipment_type
+        )
+        task_3 = Task.objects.create(name="Filtre 3", end_date=date(2030, 3, 10), over=True)
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        def get_ids(params):
+            params.setdefault('search', 'Filtre')
+            response = client.get('/api/maintenancemanagement/tasks/', params)
+            return [task['id'] for task in response.json()]
+
+        self.assertEqual(get_ids({}), [task_1.id, task_2.id, task_3.id])
+        self.assertEqual(get_ids({'equipment_type': equipment_type.id}), [task_1.id, task_2.id])
+        self.assertEqual(get_ids({'equipment': equipment.id}), [task_1.id])
+        self.assertEqual(get_ids({'team': team.id}), [task_1.id])
+        self.assertEqual(get_ids({'over': 'true'}), [task_3.id])
+        self.assertEqual(get_ids({'end_date_after': '2030-02-01', 'end_date_before': '2030-02-28'}), [task_2.id])
+        self.assertEqual(get_ids({'ordering': '-end_date'}), [task_3.id, task_2.id, task_1.id])
+        self.assertEqual(get_ids({'search': 'vidange'}), [task_2.id])
+        response = client.get('/api/maintenancemanagement/tasks/', {'ordering': 'password'})
+        self.assertEqual(response.status_code, 400)
+
     def test_US5_I1_tasklist_get_without_perm(self):
         """
         Test if a user without perm doesn't receive the data.
@@ -207,6 +274,82 @@ class TaskTests(TestCase):
         response = client.get(f'/api/maintenancemanagement/tasks/{pk}/')
         self.assertLessEqual(data.items(), response.data.items())
 
+    def test_US5_I3_taskdetail_get_not_modified(self):
+        """
+        Test that an unchanged task detail is answered with HTTP 304.
+
+                Inputs:
+                    user (UserProfile): a UserProfile we setup with all permissions on tasks.
+
+                Expected Outputs:
+                    We expect HTTP 304 while the task doesn't change, then
+                    HTTP 200 once a team is added to it or its equipment
+                    changes.
+        """
+        user = self.set_up_perm()
+        equipment = Equipment.objects.create(
+            name="Peugeot Partner", equipment_type=EquipmentType.objects.create(name="Voiture")
+        )
+        task = Task.objects.create(name="task", equipment=equipment)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get(f'/api/maintenancemanagement/tasks/{task.pk}/')
+        etag = response['ETag']
+        response = client.get(f'/api/maintenancemanagement/tasks/{task.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        task.teams.add(Team.objects.create(name="team"))
+        response = client.get(f'/api/maintenancemanagement/tasks/{task.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['teams'][0]['name'], "team")
+        etag = response['ETag']
+
+        equipment.name = "Renault Kangoo"
+        equipment.save()
+        response = client.get(f'/api/maintenancemanagement/tasks/{task.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['equipment']['name'], "Renault Kangoo")
+
+    def test_US43_I1_taskdetail_get_constant_queries(self):
+        """
+        Test that the conditions of a task detail are fetched with the same number of queries, whatever their number.
+
+                Inputs:
+                    user (UserProfile): a UserProfile we setup with all permissions on tasks.
+
+                Expected Outputs:
+                    We expect the same number of queries for a task with one
+                    trigger condition and for a task with three, and the
+                    watched field objects in the response.
+        """
+        user = self.set_up_perm()
+        equipment = Equipment.objects.get(name="Embouteilleuse AXB1")
+        watched = FieldObject.objects.create(
+            described_object=equipment, field=Field.objects.get(name="Nb bouteilles"), value="5000"
+        )
+        tasks = []
+        for names in (["Frequency"], ["Frequency", "Above Threshold", "Under Threshold"]):
+            task = Task.objects.create(name="task", equipment=equipment)
+            for name in names:
+                FieldObject.objects.create(
+                    described_object=task,
+                    field=Field.objects.get(name=name),
+                    value=f"10000|{watched.id}|2d|15000" if name == "Frequency" else f"0.6|{watched.id}|2d"
+                )
+            FieldObject.objects.create(described_object=task, field=Field.objects.get(name="Checkbox"))
+            tasks.append(task)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        client.get(f'/api/maintenancemanagement/tasks/{tasks[1].pk}/')
+        with CaptureQueriesContext(connection) as single:
+            client.get(f'/api/maintenancemanagement/tasks/{tasks[0].pk}/')
+        with self.assertNumQueries(len(single.captured_queries)):
+            response = client.get(f'/api/maintenancemanagement/tasks/{tasks[1].pk}/')
+        self.assertEqual(len(response.data['trigger_conditions']), 3)
+        self.assertEqual(len(response.data['end_conditions']), 1)
+        for condition in response.data['trigger_conditions']:
+            self.assertEqual(condition['field_object']['id'], watched.id)
+
     def test_US5_I3_taskdetail_get_non_existing_task_with_perm(self):
         """
         Test if a user with perm can't see an unavailable task detail.
@@ -656,6 +799,84 @@ class TaskTests(TestCase):
         response = client.get(f'/api/maintenancemanagement/usertasklist/{temp_user.pk}', format='json')
         self.assertEqual(response.status_code, 401)
 
+    def test_US6_I4_usertaskslist_get_not_modified(self):
+        """
+        Test that an unchanged task list is answered with HTTP 304.
+
+                Inputs:
+                    user (UserProfile): a UserProfile we setup with no permissions on tasks.
+
+                Expected Outputs:
+                    We expect HTTP 304 with only the cache read, by ETag and
+                    by date.
+        """
+        user = self.set_up_without_perm()
+        team = Team.objects.create(name="team")
+        team.user_set.add(user)
+        task = Task.objects.create(name="task")
+        task.teams.add(team)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get(f'/api/maintenancemanagement/usertasklist/{user.pk}', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([task_data['id'] for task_data in response.data], [task.pk])
+        with self.assertNumQueries(1):
+            not_modified = client.get(
+                f'/api/maintenancemanagement/usertasklist/{user.pk}', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        not_modified = client.get(
+            f'/api/maintenancemanagement/usertasklist/{user.pk}', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_US6_I4_usertaskslist_get_after_changes(self):
+        """
+        Test that the cached task list follows the changes of the tasks, of
+        their teams and of the members of the teams.
+
+                Inputs:
+                    user (UserProfile): a UserProfile we setup with no permissions on tasks.
+
+                Expected Outputs:
+                    We expect the current list after each change.
+        """
+        user = self.set_up_without_perm()
+        team = Team.objects.create(name="team")
+        team.user_set.add(user)
+        task = Task.objects.create(name="task")
+        task.teams.add(team)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get(f'/api/maintenancemanagement/usertasklist/{user.pk}', format='json')
+        etag = response['ETag']
+
+        task.name = "new name"
+        task.save()
+        response = client.get(f'/api/maintenancemanagement/usertasklist/{user.pk}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], "new name")
+
+        other_task = Task.objects.create(name="other task")
+        team.task_set.add(other_task)
+        response = client.get(f'/api/maintenancemanagement/usertasklist/{user.pk}', format='json')
+        self.assertEqual({task_data['id'] for task_data in response.data}, {task.pk, other_task.pk})
+
+        other_user = UserProfile.objects.create(username='other')
+        user.groups.add(Team.objects.create(name="other team"))
+        team.user_set.add(other_user)
+        response = client.get(f'/api/maintenancemanagement/usertasklist/{user.pk}', format='json')
+        self.assertEqual(set(response.data[0]['teams'][0]['user_set']), {user.pk, other_user.pk})
+
+        other_task.delete()
+        response = client.get(f'/api/maintenancemanagement/usertasklist/{user.pk}', format='json')
+        self.assertEqual([task_data['id'] for task_data in response.data], [task.pk])
+
+        user.groups.remove(team)
+        response = client.get(f'/api/maintenancemanagement/usertasklist/{user.pk}', format='json')
+        self.assertEqual(response.data, [])
+
     def test_US8_I1_tasklist_post_with_file_with_perm(self):
         """
         Test if a user with perm can add a task with a file
@@ -1261,6 +1482,126 @@ class TaskTests(TestCase):
         response = client.get('/api/maintenancemanagement/tasks/requirements')
         self.assertEqual(response.status_code, 401)
 
+    def test_US44_I1_taskrequirements_cached_and_invalidated(self):
+        """
+        Test that the task requirements are cached and follow the changes of the templates and fields.
+
+                Inputs:
+                    user (UserProfile): a user with all permissions on tasks.
+
+                Expected Outputs:
+                    We expect the same number of queries to build the
+                    requirements with one or three templates, no query on the
+                    maintenance tables once they are cached, and a new value
+                    and a former template to be in the next response.
+        """
+        user = self.set_up_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        frequency = Field.objects.get(name="Frequency")
+        checkbox = Field.objects.get(name="Checkbox")
+        templates = []
+        for i in range(3):
+            template = Task.objects.create(name=f"Template {i}", is_template=i == 0)
+            FieldObject.objects.create(described_object=template, field=frequency, value="10000")
+            FieldObject.objects.create(described_object=template, field=checkbox)
+            template.teams.add(Team.objects.create(name=f"Team {i}"))
+            templates.append(template)
+        client.get('/api/maintenancemanagement/tasks/requirements')
+        checkbox.save()
+        with CaptureQueriesContext(connection) as single:
+            client.get('/api/maintenancemanagement/tasks/requirements')
+        with CaptureQueriesContext(connection) as cached:
+            response = client.get('/api/maintenancemanagement/tasks/requirements')
+        self.assertEqual(
+            [query['sql'] for query in cached.captured_queries if 'maintenancemanagement_' in query['sql']], []
+        )
+        self.assertNotIn(templates[1].id, [template['id'] for template in response.json()['task_templates']])
+
+        for template in templates[1:]:
+            template.is_template = True
+            template.save()
+        with self.assertNumQueries(len(single.captured_queries)):
+            response = client.get('/api/maintenancemanagement/tasks/requirements')
+        data = {template['id']: template for template in response.json()['task_templates']}
+        self.assertEqual([field['id'] for field in data[templates[2].id]['trigger_conditions']], [frequency.id])
+        self.assertEqual([field['id'] for field in data[templates[2].id]['end_conditions']], [checkbox.id])
+        self.assertEqual(data[templates[2].id]['teams'][0]['name'], "Team 2")
+
+        FieldValue.objects.create(value="Hebdomadaire", field=frequency)
+        templates[0].is_template = False
+        templates[0].save()
+        response = client.get('/api/maintenancemanagement/tasks/requirements')
+        self.assertIn(
+            "Hebdomadaire",
+            [field['value'] for field in response.json()['trigger_conditions'] if field['id'] == frequency.id][0]
+        )
+        self.assertNotIn(templates[0].id, [template['id'] for template in response.json()['task_templates']])
+
+    def test_US48_I1_backtest_trigger_conditions(self):
+        """
+        Test that the saved values of a field object are recorded and replayed on candidate conditions.
+
+                Inputs:
+                    user (UserProfile): a user with all permissions on tasks.
+                    field_object (FieldObject): a field object of an equipment saved with six values.
+
+                Expected Outputs:
+                    We expect a reading for each numeric value, the dates of
+                    the readings at which each condition fires, and an HTTP
+                    400 for a frequency which is not positive.
+        """
+        user = self.set_up_perm()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        field_object = FieldObject.objects.get(field=Field.objects.get(name="Nb bouteilles"))
+        field_object.reading_set.all().delete()
+        for value in ["50000", "50 400", "49000", "not a number", "51000", "52500"]:
+            field_object.value = value
+            field_object.save()
+        readings = list(field_object.reading_set.order_by('read_at'))
+        self.assertEqual([reading.value for reading in readings], [50000, 50400, 49000, 51000, 52500])
+        above = Field.objects.get(name="Above Threshold")
+        under = Field.objects.get(name="Under Threshold")
+        frequency = Field.objects.get(name="Frequency")
+        response = client.post(
+            '/api/maintenancemanagement/tasks/backtest', {
+                'field_object': field_object.id,
+                'conditions': [
+                    {
+                        'field': above.id,
+                        'value': 50000
+                    }, {
+                        'field': under.id,
+                        'value': 50000
+                    }, {
+                        'field': frequency.id,
+                        'value': 1000
+                    }
+                ]
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['readings'], 5)
+        conditions = response.json()['conditions']
+        self.assertEqual([condition['count'] for condition in conditions], [2, 1, 2])
+        firings = [[parse_datetime(firing) for firing in condition['firings']] for condition in conditions]
+        self.assertEqual(firings[0], [readings[1].read_at, readings[3].read_at])
+        self.assertEqual(firings[1], [readings[2].read_at])
+        self.assertEqual(firings[2], [readings[3].read_at, readings[4].read_at])
+        response = client.post(
+            '/api/maintenancemanagement/tasks/backtest', {
+                'field_object': field_object.id,
+                'conditions': [{
+                    'field': frequency.id,
+                    'value': 0
+                }]
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
     def test_US11_I2_tasklist_post_with_no_end_condition(self):
         """
         Test that a checkbox is created if no end_conditions are given
@@ -1284,3 +1625,51 @@ class TaskTests(TestCase):
         task = Task.objects.get(description="desc_task_test_tasklist_post_with_no_end_condition")
         check_box = FieldObject.objects.get(field=conditions.get(name="Checkbox"))
         self.assertEqual(check_box.described_object, task)
+
+    def test_US29_I1_taskdetail_photo_end_condition_with_preview(self):
+        """
+        Test if the file of a Photo end condition is given with its thumbnail.
+
+                Inputs:
+                    user (UserProfile): a user with all permissions on tasks.
+                    photo (File): a file sharing the blob of an uploaded
+                        image under another name, sent for the Photo end
+                        condition of a task.
+
+                Expected Output:
+                    We expect the Photo end condition to give the photo with
+                    the url of the thumbnail of the blob.
+        """
+        user = self.set_up_perm()
+        self.add_add_perm_file(user)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        file_obj = BytesIO()
+        Image.new('RGB', (120, 60), (30, 200, 30)).save(file_obj, 'png')
+        file_obj.seek(0)
+        pk = client.post(
+            "/api/maintenancemanagement/files/", {
+                'file': file_obj,
+                'is_manual': 'False'
+            }, format='multipart'
+        ).data['id']
+        blob = File.objects.get(pk=pk).blob
+        generate_previews(pk)
+        photo = File.objects.create(file='blobs/{}_Xk2p9aQ.png'.format(blob.sha256), blob=blob)
+        task = Task.objects.create(name='verifier pneus')
+        condition = FieldObject.objects.create(described_object=task, field=Field.objects.get(name='Photo'))
+        FieldObject.objects.create(described_object=task, field=Field.objects.get(name='Checkbox'))
+        response = client.put(
+            f'/api/maintenancemanagement/tasks/{task.pk}/', {'end_conditions': [{
+                'id': condition.pk,
+                'file': photo.pk
+            }]},
+            format='json'
+        )
+        end_conditions = {condition['field_name']: condition for condition in response.data['end_conditions']}
+        self.assertIsNone(end_conditions['Checkbox']['file'])
+        self.assertEqual(end_conditions['Photo']['file']['id'], photo.pk)
+        self.assertEqual(
+            end_conditions['Photo']['file']['thumbnail'],
+            f'/api/maintenancemanagement/files/{photo.pk}/download/?variant=thumbnail'
+        )
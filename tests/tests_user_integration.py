@@ -60,6 +60,29 @@ class UserTests(TestCase):
         response = client.get('/api/usersmanagement/users/', format='json')
         self.assertEqual(response.data, serializer.data)
 
+    def test_US2_I1_userlist_get_filtered_with_perm(self):
+        """
+            Test if a user with permission can search and sort the users' list.
+
+            Inputs:
+                users (UserProfile): two users, one of them in a team.
+
+            Expected Output:
+                We expect the search, team and ordering parameters to send the matching users in order.
+        """
+        user = self.set_up_perm()
+        anna = UserProfile.objects.create(username='anna', last_name='Martin')
+        bruno = UserProfile.objects.create(username='bruno', last_name='Martinez')
+        team_type = TeamType.objects.create(name='Technicians')
+        team = Team.objects.create(name='Team Martin', team_type=team_type)
+        team.user_set.add(bruno)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get('/api/usersmanagement/users/', {'search': 'martin', 'ordering': '-username'})
+        self.assertEqual([user['id'] for user in response.data], [bruno.id, anna.id])
+        response = client.get('/api/usersmanagement/users/', {'team': team.id})
+        self.assertEqual([user['id'] for user in response.data], [bruno.id])
+
     def test_US2_I1_userlist_get_without_perm(self):
         """
             Test if a user without permission can't view the users' list.
@@ -4,6 +4,7 @@ from django.contrib.auth.models import Permission, update_last_login
 from django.contrib.contenttypes.models import ContentType
 from rest_framework import serializers
 from rest_framework_jwt.settings import api_settings
+from utils.filters import FilterSerializer
 
 from .models import Team, TeamType, UserProfile
 
@@ -237,3 +238,14 @@ class TeamTypeDetailsSerializer(serializers.ModelSerializer):
 
         model = TeamType
         fields = ['id', 'name', 'perms', 'team_set']
+
+
+class UserProfileFilterSerializer(FilterSerializer):
+    """Query parameters of the users listing."""
+
+    team = serializers.IntegerField(required=False)
+    is_active = serializers.BooleanField(required=False)
+
+    filters = {'team': 'groups', 'is_active': 'is_active'}
+    search_fields = ['username', 'first_name', 'last_name', 'email']
+    ordering_fields = {'id': 'id', 'username': 'username', 'first_name': 'first_name', 'last_name': 'last_name'}
@@ -16,6 +16,7 @@ from rest_framework.views import APIView
 from usersmanagement.models import Team, TeamType, UserProfile
 from usersmanagement.serializers import (
     UserLoginSerializer,
+    UserProfileFilterSerializer,
     UserProfileSerializer,
 )
 from utils.init_db import initialize_db
@@ -56,15 +57,24 @@ class UserList(APIView):
 
     @swagger_auto_schema(
         operation_description="Send the list of user in database.",
+        query_serializer=UserProfileFilterSerializer(many=False),
         responses={
             200: "Send back the list.",
+            400: "The query parameters are not valid.",
             401: "The client was not authorized to see the ressource."
         }
     )
     def get(self, request):
-        """docstrings."""
+        """Send the list of users.
+
+        The users can be filtered, searched and sorted with the query
+        parameters of UserProfileFilterSerializer.
+        """
         if request.user.has_perm(VIEW_USERPROFILE):
-            users = UserProfile.objects.all()
+            filter_serializer = UserProfileFilterSerializer(data=request.query_params.dict())
+            if not filter_serializer.is_valid():
+                return Response(filter_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            users = filter_serializer.filter_queryset(UserProfile.objects.all())
             serializer = UserProfileSerializer(users, many=True)
             return Response(serializer.data)
         else:
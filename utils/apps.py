@@ -16,5 +16,15 @@ class UtilsConfig(AppConfig):
             data_provider.start()
             from utils import trigger_tasks
             trigger_tasks.start()
+            from utils import uploads
+            uploads.start()
+            from utils import previews
+            previews.start()
+            from utils import audit
+            audit.start()
+            from utils import readings
+            readings.start()
+            from utils import sync
+            sync.start()
         except Exception:
             pass
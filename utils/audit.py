@@ -0,0 +1,109 @@
+"""This file records the audit trail, the actions of the users on the objects.
+
+An event keeps the ids of the object and of the user, and the values of the
+changed fields read from their columns, so recording an event never loads a
+related object. The events are kept in a buffer of the process and added to
+the table in a single query at the end of each request, or once the buffer
+holds settings.AUDIT_BATCH_SIZE events. The events recorded outside of the
+requests are added at least every settings.AUDIT_FLUSH_INTERVAL seconds by
+a background job.
+"""
+
+import atexit
+import logging
+import threading
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.core.signals import request_finished
+from django.db import transaction
+from django.dispatch import receiver
+from maintenancemanagement.models import Equipment, Task
+from utils.models import AuditEvent, DataProvider
+
+logger = logging.getLogger(__name__)
+
+# The models whose history is sent by the history endpoint, by name.
+AUDITED_MODELS = {'task': Task, 'equipment': Equipment, 'dataprovider': DataProvider}
+
+_buffer = []
+_lock = threading.Lock()
+
+
+def record_event(instance, action, user=None, fields=()):
+    """Record an action of a user on an object.
+
+    The fields are the names of the changed fields. The values of the fields
+    stored in the table of the object, the foreign keys as ids, are recorded.
+    The other ones, like the many to many fields, are recorded without value.
+    Record the deletion of an object before deleting it, while it has an id.
+    """
+    event = AuditEvent(
+        content_type_id=ContentType.objects.get_for_model(instance).pk,
+        object_id=instance.pk,
+        action=action,
+        user_id=user.pk if user is not None and user.is_authenticated else None,
+        changes=_get_changes(instance, fields),
+    )
+    with _lock:
+        _buffer.append(event)
+        is_full = len(_buffer) >= settings.AUDIT_BATCH_SIZE
+    if is_full:
+        flush()
+
+
+def _get_changes(instance, fields):
+    changes = {}
+    for name in fields:
+        try:
+            field = instance._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and not field.many_to_many:
+            changes[field.attname] = getattr(instance, field.attname)
+        else:
+            changes[field.name] = None
+    return changes
+
+
+def flush():
+    """Add the buffered events of the process to the table."""
+    with _lock:
+        events = _buffer[:]
+        del _buffer[:]
+    if events:
+        try:
+            with transaction.atomic():
+                AuditEvent.objects.bulk_create(events, batch_size=settings.AUDIT_BATCH_SIZE)
+        except Exception as e:
+            logger.error("{count} audit events were lost. {e}".format(count=len(events), e=e))
+
+
+@receiver(request_finished)
+def flush_at_request_end(sender, **kwargs):
+    """Add the events of the finished request to the table."""
+    flush()
+
+
+def get_history(model, object_id):
+    """Give the events of an object, the oldest first.
+
+    The events still buffered by the other processes are not given.
+    """
+    flush()
+    return AuditEvent.objects.filter(content_type=ContentType.objects.get_for_model(model),
+                                     object_id=object_id).order_by('id')
+
+
+def start():
+    """Set up the job adding the buffered events to the table."""
+    try:
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(flush, 'interval', seconds=settings.AUDIT_FLUSH_INTERVAL)
+        scheduler.start()
+        atexit.register(flush)
+    except Exception as e:
+        logger.critical("The audit scheduler did not start. {}".format(e))
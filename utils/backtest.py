@@ -0,0 +1,88 @@
+"""This file replays trigger conditions on the readings of a field object.
+
+Before creating a task, a planner can see how often a candidate threshold or
+frequency would have triggered it. The values of the readings are loaded in
+a NumPy array and each condition is evaluated by vectorized scans, so a year
+of readings every minute is replayed in a fraction of a second.
+"""
+
+import numpy as np
+
+from maintenancemanagement.models import Reading
+from utils.trigger_tasks import (
+    ABOVE_THRESHOLD,
+    SENSOR_CONDITIONS,
+    UNDER_THRESHOLD,
+)
+
+
+def get_readings(field_object, start=None, end=None):
+    """Give the arrays of the ids and values of the readings of an object.
+
+    The readings are sorted by date, and can be limited to the ones between
+    the given dates. Their dates are not loaded, building them being slower
+    than reading the values.
+    """
+    readings = Reading.objects.filter(field_object=field_object)
+    if start is not None:
+        readings = readings.filter(read_at__gte=start)
+    if end is not None:
+        readings = readings.filter(read_at__lte=end)
+    rows = list(readings.order_by('read_at').values_list('id', 'value'))
+    ids = np.fromiter((pk for pk, _ in rows), dtype=np.int64, count=len(rows))
+    return ids, np.fromiter((value for _, value in rows), dtype=float, count=len(rows))
+
+
+def get_firings(kind, limit, values):
+    """Give the indexes of the readings at which a condition would fire.
+
+    The kind is the index of the field name of the condition in
+    SENSOR_CONDITIONS. A threshold condition fires when it becomes verified,
+    at a reading passing its threshold after one which does not. A Frequency
+    condition fires when the value reaches its next trigger, first the first
+    value plus the frequency, then the value which fired plus the frequency.
+    """
+    if kind in (ABOVE_THRESHOLD, UNDER_THRESHOLD):
+        verified = values > limit if kind == ABOVE_THRESHOLD else values < limit
+        was_verified = np.concatenate(([False], verified[:-1]))
+        return np.flatnonzero(verified & ~was_verified)
+    if limit <= 0:
+        raise ValueError('The frequency must be positive.')
+    # The first reading reaching a value is the first one whose running
+    # maximum reaches it, found by a binary search as the maximum is sorted.
+    highest = np.maximum.accumulate(values)
+    firings = []
+    if len(values):
+        next_trigger = values[0] + limit
+        index = np.searchsorted(highest, next_trigger)
+        while index < len(values):
+            firings.append(index)
+            next_trigger = values[index] + limit
+            index = np.searchsorted(highest, next_trigger)
+    return np.array(firings, dtype=int)
+
+
+def backtest(field_object, conditions, start=None, end=None):
+    """Replay conditions on the readings of a field object.
+
+    The conditions are pairs of a field, Above Threshold, Under Threshold or
+    Frequency, and of a threshold or frequency. Give the number of readings
+    replayed and, for each condition, the dates at which it would fire. The
+    dates of the readings which fire are read with a single query.
+    """
+    ids, values = get_readings(field_object, start, end)
+    firings = [
+        ids[get_firings(SENSOR_CONDITIONS.index(field.name), limit, values)] for field, limit in conditions
+    ]
+    dates = dict(Reading.objects.filter(pk__in=set(np.concatenate(firings).tolist())).values_list('pk', 'read_at'))
+    return {
+        'readings': len(values),
+        'conditions': [
+            {
+                'field': field.id,
+                'value': limit,
+                'count': len(fired),
+                'firings': [dates[pk] for pk in fired.tolist()]
+            } for (field, limit), fired in zip(conditions, firings)
+        ]
+    }
@@ -0,0 +1,52 @@
+"""This file answers the conditional GET requests of the API.
+
+A client sends back the ETag of the version it has in If-None-Match, or its
+Last-Modified date in If-Modified-Since, and gets HTTP 304 without a body
+when it is still the current version. The ETag is the precise validator, the
+Last-Modified date is only precise to the second.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(data):
+    """Give the ETag of serialized data."""
+    content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return quote_etag(hashlib.md5(content).hexdigest())
+
+
+def get_version_validators(*versions):
+    """Give the ETag and the Last-Modified date of the details of an object.
+
+    The versions are the updated_at dates of the object and of the objects
+    its details contain, or other values changing with its details.
+    """
+    etag = quote_etag(hashlib.md5(repr(versions).encode()).hexdigest())
+    dates = [version.timestamp() for version in versions if isinstance(version, datetime)]
+    return etag, int(max(dates)) if dates else None
+
+
+def get_not_modified_response(request, etag, last_modified=None):
+    """Give HTTP 304 if the client has the current version, else None."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified=None):
+    """Add the ETag and Last-Modified headers to a response.
+
+    The response must be revalidated before being used from a cache.
+    """
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
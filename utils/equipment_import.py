@@ -0,0 +1,166 @@
+"""This file imports equipments of an equipment type in bulk.
+
+The rows come from a CSV or NDJSON stream. Each row contains the name of the
+equipment and a value for each field of its equipment type, under the name
+of the field. For example, in CSV :
+
+    name,Marque,Capacité
+    Embouteilleuse AXB1,Bosch,60000
+    Embouteilleuse AXB2,Gai,45000
+
+and in NDJSON :
+
+    {"name": "Embouteilleuse AXB1", "Marque": "Bosch", "Capacité": "60000"}
+"""
+
+import codecs
+import csv
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from maintenancemanagement.caches import get_equipment_type_schema
+from maintenancemanagement.models import Equipment, FieldObject, FieldValue
+from maintenancemanagement.versions import record_changes
+from utils.methods import parse_number
+from utils.readings import record_readings
+
+logger = logging.getLogger(__name__)
+
+NAME_COLUMN = 'name'
+MAX_LENGTH = 100
+
+
+class ImportException(Exception):
+    """Exception corresponding to a stream which can't be imported at all."""
+
+    pass
+
+
+def read_csv_rows(lines):
+    """Give the line number and the row of each record of a CSV stream.
+
+    The first line contains the names of the columns. A malformed stream
+    stops the reading with an error on the line where it happened.
+    """
+    reader = csv.DictReader(codecs.iterdecode(lines, 'utf-8-sig'))
+    try:
+        for row in reader:
+            if None in row:
+                yield reader.line_num, ValueError('Too many values.')
+            else:
+                yield reader.line_num, row
+    except (csv.Error, UnicodeDecodeError) as e:
+        yield reader.line_num + 1, e
+
+
+def read_ndjson_rows(lines):
+    """Give the line number and the row of each record of a NDJSON stream."""
+    for line_num, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except (ValueError, UnicodeDecodeError) as e:
+            yield line_num, e
+            continue
+        if isinstance(row, dict):
+            yield line_num, row
+        else:
+            yield line_num, ValueError('A line should be an object.')
+
+
+def import_equipments(equipment_type, rows, user=None):
+    """Create the equipments of the rows with their field objects.
+
+    The fields of the equipment type and their allowed values are read once
+    from the schema cache. The rows are validated and inserted by chunks of
+    settings.EQUIPMENT_IMPORT_CHUNK_SIZE, each chunk in one transaction with
+    a bulk_create of the equipments and one of their field objects. Invalid
+    rows are skipped and reported with their line number.
+    """
+    fields = _get_fields(equipment_type)
+    report = {'created': 0, 'errors': []}
+    chunk = []
+    for line_num, row in rows:
+        errors = _validate_row(row, fields)
+        if errors:
+            report['errors'].append({'line': line_num, 'errors': errors})
+            continue
+        chunk.append(row)
+        if len(chunk) >= settings.EQUIPMENT_IMPORT_CHUNK_SIZE:
+            report['created'] += _create_equipments(equipment_type, chunk, fields)
+            chunk = []
+    if chunk:
+        report['created'] += _create_equipments(equipment_type, chunk, fields)
+    logger.info(
+        "{user} IMPORTED {number} Equipment of {type}".format(
+            user=user, number=report['created'], type=repr(equipment_type)
+        )
+    )
+    return report
+
+
+def _get_fields(equipment_type):
+    schema_fields = get_equipment_type_schema(equipment_type.pk)['field']
+    names = [field['name'] for field in schema_fields]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates or NAME_COLUMN in names:
+        raise ImportException('Ambiguous field names : {}'.format(sorted(duplicates | ({NAME_COLUMN} & set(names)))))
+    field_values = FieldValue.objects.filter(field__in=[field['id'] for field in schema_fields]).in_bulk()
+    value_ids = {(field_value.field_id, field_value.value): pk for pk, field_value in field_values.items()}
+    fields = []
+    for field in schema_fields:
+        keys = [(field['id'], value) for value in field['value'] if (field['id'], value) in value_ids]
+        values = {value: value_ids[(field_id, value)] for field_id, value in keys}
+        fields.append({'id': field['id'], 'name': field['name'], 'values': values})
+    return fields
+
+
+def _validate_row(row, fields):
+    if isinstance(row, Exception):
+        return {'row': [str(row)]}
+    errors = {}
+    if not isinstance(row.get(NAME_COLUMN), str) or not row.get(NAME_COLUMN).strip():
+        errors[NAME_COLUMN] = ['This field is required.']
+    elif len(row[NAME_COLUMN]) > MAX_LENGTH:
+        errors[NAME_COLUMN] = ['Ensure this field has no more than {} characters.'.format(MAX_LENGTH)]
+    for field in fields:
+        value = row.get(field['name'])
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = row[field['name']] = str(value)
+        if value is None:
+            errors[field['name']] = ['This field is required.']
+        elif field['values'] and value not in field['values']:
+            errors[field['name']] = ["Value doesn't match a FieldValue of the given Field"]
+        elif not isinstance(value, str) or len(value) > MAX_LENGTH:
+            errors[field['name']] = ['Ensure this field is a string of at most {} characters.'.format(MAX_LENGTH)]
+    unexpected = set(row) - {NAME_COLUMN} - {field['name'] for field in fields}
+    for name in unexpected:
+        errors[name] = ['Unexpected field.']
+    return errors
+
+
+def _create_equipments(equipment_type, rows, fields):
+    with transaction.atomic():
+        equipments = Equipment.objects.bulk_create(
+            [Equipment(name=row[NAME_COLUMN].strip(), equipment_type=equipment_type) for row in rows]
+        )
+        field_objects = []
+        for equipment, row in zip(equipments, rows):
+            for field in fields:
+                value = row[field['name']]
+                field_object = FieldObject(described_object=equipment, field_id=field['id'])
+                if field['values']:
+                    field_object.field_value_id = field['values'][value]
+                    field_object.value = ""
+                else:
+                    field_object.value = value
+                    field_object.value_numeric = parse_number(value)
+                field_objects.append(field_object)
+        field_objects = FieldObject.objects.bulk_create(field_objects)
+        record_readings(field_objects)
+        record_changes(Equipment, [equipment.pk for equipment in equipments])
+        record_changes(FieldObject, [field_object.pk for field_object in field_objects])
+    return len(equipments)
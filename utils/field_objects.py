@@ -0,0 +1,165 @@
+"""This file validates and writes the field objects of equipments in bulk.
+
+The Fields and FieldObjects referenced by a batch are fetched in one query
+each, the batch is validated in memory and then written with bulk_create and
+bulk_update. As they send no signal, the equipments are touched and the
+changes are recorded here.
+"""
+
+import logging
+
+from django.contrib.contenttypes.models import ContentType
+from maintenancemanagement.models import Equipment, Field, FieldObject
+from maintenancemanagement.serializers import (
+    FieldObjectBulkValidationSerializer,
+    FieldObjectNewFieldValidationSerializer,
+)
+from maintenancemanagement.versions import record_changes, touch_equipments
+from utils.methods import parse_number
+from utils.readings import record_readings
+
+logger = logging.getLogger(__name__)
+
+
+class FieldObjectsException(Exception):
+    """Exception corresponding to an invalid batch of field objects.
+
+    Its error is what is sent to the front-end with HTTP 400.
+    """
+
+    def __init__(self, error):
+        """Keep the error to send."""
+        super().__init__(error)
+        self.error = error
+
+
+def get_expected_fields(equipment_type_id):
+    """Give the ids of the Fields expected on the equipments of a type."""
+    return list(
+        Field.objects.filter(field_group__equipmentType=equipment_type_id).order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def get_fields(field_ids):
+    """Give the Fields of the given ids, with their values and group."""
+    return Field.objects.select_related('field_group').prefetch_related('value_set').in_bulk(set(field_ids))
+
+
+def validate_field_objects(fields, expected_fields, known_fields=None):
+    """Validate the field objects of a new equipment.
+
+    Each expected Field must be given once. The other field objects create a
+    new Field with their name. Return the validated data, ready for
+    create_field_objects.
+    """
+    fields = fields or []
+    expected_fields = list(expected_fields)
+    if known_fields is None:
+        known_fields = get_fields(field.get('field') for field in fields if field.get('field') is not None)
+    validated_fields = []
+    for field in fields:
+        if field.get('field') in expected_fields:
+            expected_fields.remove(field.get('field'))
+            validated_fields.append(_validate(FieldObjectBulkValidationSerializer, field, known_fields))
+        else:
+            data = _validate(FieldObjectNewFieldValidationSerializer, field, known_fields)
+            if field.get('field') is not None:
+                # An existing Field which is not expected, it is only kept if
+                # it exists.
+                if field.get('field') not in known_fields:
+                    continue
+                data = _validate(FieldObjectBulkValidationSerializer, field, known_fields)
+            validated_fields.append(data)
+    if expected_fields:
+        raise FieldObjectsException(str(expected_fields) + " not expected")
+    return validated_fields
+
+
+def validate_field_object_updates(field_objects, equipment):
+    """Validate the modifications of field objects of an equipment.
+
+    Return the FieldObjects with their validated data, ready for
+    update_field_objects.
+    """
+    field_objects = field_objects or []
+    existing_field_objects = FieldObject.objects.filter(
+        content_type=ContentType.objects.get_for_model(Equipment),
+        object_id=equipment.pk,
+        pk__in=[field_object.get('id') for field_object in field_objects]
+    ).in_bulk()
+    known_fields = get_fields(field_object.get('field') for field_object in field_objects)
+    updates = []
+    for field_object_data in field_objects:
+        field_object = existing_field_objects.get(field_object_data.get('id'))
+        if field_object is None or field_object_data.get('field') not in known_fields:
+            raise FieldObjectsException("Field " + str(field_object_data.get('field')) + " doesn't exist")
+        field_object_data = dict(field_object_data)
+        if field_object_data.get('field_value') is not None:
+            field_object_data.update({"value": field_object_data.get('field_value').get('value')})
+        updates.append(
+            (field_object, _validate(FieldObjectBulkValidationSerializer, field_object_data, known_fields, True))
+        )
+    return updates
+
+
+def _validate(serializer_class, data, known_fields, partial=False):
+    serializer = serializer_class(data=data, context={'fields': known_fields}, partial=partial)
+    if not serializer.is_valid():
+        raise FieldObjectsException(serializer.errors)
+    return serializer.validated_data
+
+
+def create_field_objects(validated_fields, equipment, user=None):
+    """Create the validated field objects of an equipment.
+
+    The new Fields are created first with a single query, then all the
+    FieldObjects with another one. The numeric values are recorded as readings.
+    """
+    new_fields = Field.objects.bulk_create(
+        [Field(name=data.get('name')) for data in validated_fields if data.get('field') is None]
+    )
+    for new_field in new_fields:
+        logger.info("{user} CREATED Field with {params}".format(user=user, params={"name": new_field.name}))
+    new_fields = iter(new_fields)
+    field_objects = []
+    for data in validated_fields:
+        field_objects.append(
+            FieldObject(
+                described_object=equipment,
+                field=data.get('field') or next(new_fields),
+                field_value=data.get('field_value'),
+                **{key: data[key] for key in ('value', 'description') if key in data}
+            )
+        )
+        field_objects[-1].value_numeric = parse_number(field_objects[-1].value)
+    field_objects = FieldObject.objects.bulk_create(field_objects)
+    record_readings(field_objects)
+    for field_object in field_objects:
+        logger.info("{user} CREATED {object}".format(user=user, object=repr(field_object)))
+    if field_objects:
+        record_changes(FieldObject, [field_object.pk for field_object in field_objects])
+        touch_equipments([equipment.pk])
+    return field_objects
+
+
+def update_field_objects(updates, user=None):
+    """Write the validated modifications of field objects in one query.
+
+    A reading is recorded for each numeric value which changed.
+    """
+    changed = []
+    for field_object, data in updates:
+        previous = field_object.value_numeric
+        for key, value in data.items():
+            setattr(field_object, key, value)
+        field_object.value_numeric = parse_number(field_object.value)
+        if field_object.value_numeric != previous:
+            changed.append(field_object)
+        logger.info("{user} UPDATED {object} with {params}".format(user=user, object=repr(field_object), params=data))
+    FieldObject.objects.bulk_update(
+        [field_object for field_object, data in updates],
+        ['field', 'field_value', 'value', 'value_numeric', 'description'],
+    )
+    record_readings(changed)
+    record_changes(FieldObject, [field_object.pk for field_object, data in updates])
+    touch_equipments({field_object.object_id for field_object, data in updates})
@@ -0,0 +1,81 @@
+"""This file stores the content of files once for identical files."""
+
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from maintenancemanagement.models import Blob, File
+from utils.previews import delete_previews
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(content):
+    """Give the sha256 of a django File, read by chunks."""
+    file_hash = hashlib.sha256()
+    for chunk in content.chunks(settings.FILE_DOWNLOAD_CHUNK_SIZE):
+        file_hash.update(chunk)
+    content.seek(0)
+    return file_hash.hexdigest()
+
+
+def blob_name(digest, file_name):
+    """Give the storage name of the blob with the given sha256."""
+    extension = os.path.splitext(file_name)[1].lower()
+    return 'blobs/{}/{}{}'.format(digest[:2], digest, extension)
+
+
+def store_file(content, is_manual=True, digest=None):
+    """Create a File with the given content.
+
+    If a blob with the same sha256 already exists, the content is not stored
+    again and the File references the existing blob.
+    """
+    digest = digest or hash_file(content)
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(sha256=digest).first()
+        if blob is None:
+            blob = _create_blob(content, digest)
+        return File.objects.create(file=blob.content.name, blob=blob, is_manual=is_manual)
+
+
+def _create_blob(content, digest):
+    blob = Blob(sha256=digest, size=content.size)
+    blob.content.save(blob_name(digest, content.name), content, save=False)
+    try:
+        with transaction.atomic():
+            blob.save()
+    except IntegrityError:
+        # The same content was stored by a concurrent request.
+        blob.content.storage.delete(blob.content.name)
+        blob = Blob.objects.select_for_update().get(sha256=digest)
+    return blob
+
+
+def create_file_from_blob(digest, is_manual=True):
+    """Create a File referencing the blob with the given sha256.
+
+    Return None if no such blob exists.
+    """
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(sha256=digest.lower()).first()
+        if blob is None:
+            return None
+        return File.objects.create(file=blob.content.name, blob=blob, is_manual=is_manual)
+
+
+def release_blob(blob_id):
+    """Delete the blob and its content if no File references it anymore."""
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None or blob.file_set.exists():
+            return
+        name = blob.content.name
+        storage = blob.content.storage
+        sha256 = blob.sha256
+        logger.info("DELETED {blob}".format(blob=repr(blob)))
+        blob.delete()
+        transaction.on_commit(lambda: storage.delete(name))
+        transaction.on_commit(lambda: delete_previews(sha256))
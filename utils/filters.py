@@ -0,0 +1,62 @@
+"""This file filters, searches and sorts the listings with query parameters."""
+
+from django.db.models import Q
+from rest_framework import serializers
+
+
+class FilterSerializer(serializers.Serializer):
+    """Serializer of the query parameters of a listing.
+
+    Its subclasses declare a serializer field for each filter, with :
+        - filters : the lookup filtered by each filter, or a tuple of lookups
+          of which one must match
+        - search_fields : the fields searched by the search parameter
+        - ordering_fields : the fields the ordering parameter can sort by
+
+    The ordering parameter is a list of fields separated by commas, a field
+    starting with '-' sorts in descending order. For example :
+        ?search=embouteilleuse&ordering=-end_date,name
+    """
+
+    search = serializers.CharField(required=False, max_length=100)
+    ordering = serializers.CharField(required=False)
+
+    filters = {}
+    search_fields = []
+    ordering_fields = {}
+
+    def validate_ordering(self, ordering):
+        """Translate the ordering parameter into the fields to order by."""
+        order_by = []
+        for name in ordering.split(','):
+            name = name.strip()
+            descending = name.startswith('-')
+            if name.lstrip('-') not in self.ordering_fields:
+                raise serializers.ValidationError('{} is not a valid ordering field.'.format(name.lstrip('-')))
+            order_by.append(('-' if descending else '') + self.ordering_fields[name.lstrip('-')])
+        return order_by
+
+    def filter_queryset(self, queryset, default_ordering=None):
+        """Filter, search and sort the queryset with the parameters."""
+        for name, value in self.validated_data.items():
+            if name in self.filters:
+                condition = Q()
+                for lookup in _as_tuple(self.filters[name]):
+                    condition |= Q(**{lookup: value})
+                queryset = queryset.filter(condition)
+        search = self.validated_data.get('search')
+        if search:
+            condition = Q()
+            for field in self.search_fields:
+                condition |= Q(**{field + '__icontains': search})
+            queryset = queryset.filter(condition)
+        ordering = self.validated_data.get('ordering', default_ordering)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+def _as_tuple(lookups):
+    if isinstance(lookups, tuple):
+        return lookups
+    return (lookups, )
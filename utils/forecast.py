@@ -0,0 +1,193 @@
+"""This file forecasts when the sensor conditions of tasks will be verified.
+
+The trend of each watched field object is the least squares line through its
+readings, weighted by their age: a reading weighs e times less every
+settings.TRIGGER_FORECAST_WINDOW days. The trend keeps the weighted sums of
+the line, so each new reading updates it without reading the former ones.
+The dates at which the trends reach the thresholds and next triggers of the
+conditions are computed in a single NumPy pass. The date at which the first
+condition of a pending task is reached is kept in its trigger_eta, refreshed
+when the conditions of the task change and when its field objects get new
+readings, and only written when it moves by more than
+settings.TRIGGER_FORECAST_TOLERANCE of the time left before it.
+"""
+
+import math
+from datetime import timedelta
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+from maintenancemanagement.caches import invalidate_team_task_feeds
+from maintenancemanagement.models import FieldObject, Task, Trend
+from maintenancemanagement.versions import touch
+from usersmanagement.models import Team
+from utils.trigger_tasks import (
+    SENSOR_CONDITIONS,
+    evaluate_sensor_conditions,
+    to_floats,
+)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# The least spread of the times of the readings of a trend, in days squared,
+# under which the readings are considered simultaneous and give no slope.
+MIN_SPREAD = (1 / SECONDS_PER_DAY)**2
+
+
+def forecast_tasks(task_ids):
+    """Set the date at which each of the given tasks should be triggered.
+
+    The sensor conditions of the tasks are read in one query and the trends
+    of the field objects they watch in another one. The templates
+    and the tasks over or triggered have no date. The tasks whose date
+    changed are touched.
+    """
+    now = timezone.now()
+    conditions = list(
+        FieldObject.objects.filter(
+            object_id__in=task_ids,
+            content_type=ContentType.objects.get_for_model(Task),
+            field__field_group__name='Trigger Conditions',
+            field__name__in=SENSOR_CONDITIONS,
+        ).select_related('field')
+    )
+    tasks = list(Task.objects.filter(pk__in=task_ids).only('is_template', 'over', 'is_triggered', 'trigger_eta'))
+    task_indexes = {task.pk: index for index, task in enumerate(tasks)}
+    owners, kinds, limits, watched_ids = [], [], [], []
+    for condition in conditions:
+        if condition.object_id not in task_indexes or condition.watched_id is None:
+            continue
+        parts = condition.value.split('|')
+        if condition.field.name == 'Frequency' and len(parts) < 4:
+            continue
+        owners.append(task_indexes[condition.object_id])
+        kinds.append(SENSOR_CONDITIONS.index(condition.field.name))
+        limits.append(parts[3] if condition.field.name == 'Frequency' else parts[0])
+        watched_ids.append(condition.watched_id)
+    days = np.full(len(tasks), np.inf)
+    if owners:
+        levels, slopes = get_trends(watched_ids, now)
+        np.minimum.at(days, owners, estimate_days(np.array(kinds), to_floats(limits), levels, slopes))
+    changed = []
+    for task, delay in zip(tasks, days):
+        eta = None
+        if np.isfinite(delay) and not (task.is_template or task.over or task.is_triggered):
+            eta = (now + timedelta(days=float(delay))).replace(second=0, microsecond=0)
+        if _has_moved(task.trigger_eta, eta, now):
+            task.trigger_eta = eta
+            changed.append(task)
+    if changed:
+        Task.objects.bulk_update(changed, ['trigger_eta'])
+        touch(Task.objects.filter(pk__in=[task.pk for task in changed]))
+        invalidate_team_task_feeds(Team.objects.filter(task__in=changed).values_list('pk', flat=True))
+
+
+def _has_moved(former, eta, now):
+    if former is None or eta is None:
+        return former != eta
+    return abs(eta - former) > settings.TRIGGER_FORECAST_TOLERANCE * max(eta - now, timedelta(0))
+
+
+def forecast_watching_tasks(field_object_ids):
+    """Set the date of the tasks with conditions watching the field objects."""
+    if not field_object_ids:
+        return
+    forecast_tasks(
+        list(
+            FieldObject.objects.filter(
+                watched__in=field_object_ids, content_type=ContentType.objects.get_for_model(Task)
+            ).values_list('object_id', flat=True).distinct()
+        )
+    )
+
+
+def update_trends(readings):
+    """Add new readings to the trends of their field objects.
+
+    The trends are read in one query, locked until the end of the
+    transaction, and written in two.
+    """
+    tau = settings.TRIGGER_FORECAST_WINDOW
+    with transaction.atomic():
+        trends = Trend.objects.select_for_update().in_bulk({reading.field_object_id for reading in readings})
+        new_trends = {}
+        for reading in sorted(readings, key=lambda reading: reading.read_at):
+            trend = trends.get(reading.field_object_id)
+            if trend is None:
+                trend = Trend(field_object_id=reading.field_object_id, updated_at=reading.read_at)
+                trends[reading.field_object_id] = new_trends[reading.field_object_id] = trend
+            age = (reading.read_at - trend.updated_at).total_seconds() / SECONDS_PER_DAY
+            if age > 0:
+                # The times move to the date of the reading, which becomes the
+                # origin, and the former readings lose weight with its age.
+                decay = math.exp(-age / tau)
+                trend.time_squared = decay * (trend.time_squared - 2 * age * trend.time + age * age * trend.weight)
+                trend.time_value = decay * (trend.time_value - age * trend.value)
+                trend.time = decay * (trend.time - age * trend.weight)
+                trend.value = decay * trend.value
+                trend.weight = decay * trend.weight
+                trend.updated_at = reading.read_at
+                age = 0
+            weight = math.exp(age / tau)
+            trend.weight += weight
+            trend.time += weight * age
+            trend.time_squared += weight * age * age
+            trend.value += weight * reading.value
+            trend.time_value += weight * age * reading.value
+        Trend.objects.bulk_create(new_trends.values())
+        Trend.objects.bulk_update(
+            [trend for pk, trend in trends.items() if pk not in new_trends],
+            ['updated_at', 'weight', 'time', 'time_squared', 'value', 'time_value'],
+        )
+
+
+def get_trends(field_object_ids, now):
+    """Give the arrays of the current levels and slopes of field objects.
+
+    The level is the value of the trend line at the given date and the slope
+    its change by day, both NaN for a field object without readings at two
+    different dates. The arrays follow the given ids, which can repeat.
+    """
+    trends = Trend.objects.in_bulk(set(field_object_ids))
+    levels = np.full(len(field_object_ids), np.nan)
+    slopes = np.full(len(field_object_ids), np.nan)
+    known = [index for index, pk in enumerate(field_object_ids) if pk in trends]
+    if not known:
+        return levels, slopes
+    sums = np.array(
+        [
+            [
+                trend.weight, trend.time, trend.time_squared, trend.value, trend.time_value,
+                (now - trend.updated_at).total_seconds() / SECONDS_PER_DAY
+            ] for trend in (trends[field_object_ids[index]] for index in known)
+        ]
+    )
+    weight, time, time_squared, value, time_value, age = sums.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread = weight * time_squared - time * time
+        slope = (weight * time_value - time * value) / spread
+        slope[spread <= MIN_SPREAD * weight * weight] = np.nan
+        slopes[known] = slope
+        levels[known] = (value - slope * time) / weight + slope * age
+    return levels, slopes
+
+
+def estimate_days(kinds, limits, levels, slopes):
+    """Give the number of days before the trends reach the conditions.
+
+    The arrays give for each condition its kind, the index of its field name
+    in SENSOR_CONDITIONS, its threshold or next trigger, and the level and
+    slope of the trend of the field object it watches. A condition already
+    verified by the level is reached now, one whose trend goes away from its
+    limit or reaches it after settings.TRIGGER_FORECAST_HORIZON days is
+    never, with an infinite number of days.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days = (limits - levels) / slopes
+    days[~(days > 0) | (days > settings.TRIGGER_FORECAST_HORIZON)] = np.inf
+    days[evaluate_sensor_conditions(kinds, limits, levels)] = 0
+    return days
@@ -0,0 +1,118 @@
+"""This file provides the logging handlers which don't block the requests.
+
+The records are formatted on the thread logging them, then put in a queue.
+A single thread per process, the listener, takes them from the queue and
+writes them in rotated files or sends the error mails, so the requests don't
+wait for the disk or the mail server.
+"""
+
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import traceback
+from functools import partial
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from django.utils.log import AdminEmailHandler
+
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+class _JobListener(QueueListener):
+    """Listener running the jobs put in its queue by the handlers."""
+
+    def handle(self, job):
+        """Run a job, a function without arguments."""
+        try:
+            job()
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+
+
+def _put(job):
+    # The listener is started by the first record of each process, the
+    # processes forked by the server not having the thread of their parent.
+    global _listener, _listener_pid
+    if _listener_pid != os.getpid():
+        with _listener_lock:
+            if _listener_pid != os.getpid():
+                _listener = _JobListener(queue.Queue(-1))
+                _listener.start()
+                _listener_pid = os.getpid()
+                atexit.register(_listener.stop)
+    _listener.queue.put_nowait(job)
+
+
+def flush():
+    """Wait for the records queued by this process to be handled."""
+    if _listener_pid == os.getpid():
+        _listener.queue.join()
+
+
+class QueuedRotatingFileHandler(QueueHandler):
+    """Handler writing the records in a rotated file from the listener.
+
+    The records are formatted with the formatter of this handler before being
+    queued, the file receives the formatted message.
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, encoding=None):
+        """Create the handler and the rotated file it writes to."""
+        super().__init__(None)
+        self.target = RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True
+        )
+
+    def prepare(self, record):
+        """Format a copy of the record, the other handlers get the original."""
+        record = copy.copy(record)
+        record.message = self.format(record)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+    def enqueue(self, record):
+        """Queue the writing of the record in the file."""
+        _put(partial(self.target.handle, record))
+
+    def close(self):
+        """Close the file once the queued records are written."""
+        _put(self.target.close)
+        super().close()
+
+
+class QueuedAdminEmailHandler(AdminEmailHandler):
+    """Handler mailing the errors to the admins from the listener.
+
+    The mail is built on the thread logging the error, with its request and
+    traceback, only its sending is queued.
+    """
+
+    def send_mail(self, subject, message, *args, **kwargs):
+        """Queue the sending of the mail."""
+        _put(partial(super().send_mail, subject, message, *args, **kwargs))
+
+
+class SamplingFilter(logging.Filter):
+    """Filter keeping a random fraction of the records.
+
+    With a rate of 0, no record is kept, with a rate of 1, all are.
+    """
+
+    def __init__(self, rate):
+        """Create a filter keeping the given fraction of the records."""
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        """Tell if the record is kept."""
+        return self.rate >= 1 or random.random() < self.rate
@@ -0,0 +1,112 @@
+"""This file compares the evaluation of the trigger conditions to the loop."""
+
+import random
+import time
+import uuid
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from maintenancemanagement.models import Field, FieldObject, Task
+from utils.metrics import RequestMeasures
+from utils.trigger_tasks import (
+    SENSOR_CONDITIONS,
+    condition_is_verified,
+    get_verified_conditions,
+)
+
+
+def evaluate_in_loop(tasks):
+    """Evaluate the conditions of the tasks one by one, as check_tasks did."""
+    content_type_object = ContentType.objects.get_for_model(Task)
+    verified_conditions = {}
+    for task in tasks:
+        for condition in FieldObject.objects.filter(
+            object_id=task.id,
+            content_type=content_type_object,
+            field__field_group__name='Trigger Conditions',
+        ):
+            if condition_is_verified(condition, task):
+                verified_conditions[task.pk] = condition
+                break
+    return verified_conditions
+
+
+class Command(BaseCommand):
+    """Benchmark the evaluation of random sensor conditions.
+
+    Tasks with a random sensor condition each and the field objects they
+    watch are created, evaluated by the loop and by get_verified_conditions,
+    then deleted. The tasks are over, so the scheduler never checks them.
+    """
+
+    help = 'Compare the evaluation of the trigger conditions by NumPy to the loop.'
+
+    def add_arguments(self, parser):
+        """Add the number of conditions and of sensors to the arguments."""
+        parser.add_argument('--conditions', type=int, default=5000, help='Number of sensor conditions.')
+        parser.add_argument('--sensors', type=int, default=100, help='Number of watched field objects.')
+
+    def handle(self, *args, **options):
+        """Run the benchmark and write the time and queries of each one."""
+        fields = {field.name: field for field in Field.objects.filter(field_group__name='Trigger Conditions')}
+        if not set(SENSOR_CONDITIONS) <= set(fields):
+            raise CommandError('The sensor trigger conditions do not exist.')
+        sensor_field = Field.objects.exclude(field_group__name__in=['Trigger Conditions', 'End Conditions']).first()
+        if sensor_field is None:
+            raise CommandError('No field can be used for the watched field objects.')
+
+        name = 'benchmark-{}'.format(uuid.uuid4().hex)
+        try:
+            self._create_conditions(name, options['conditions'], options['sensors'], fields, sensor_field)
+            self.stdout.write('conditions={} sensors={}'.format(options['conditions'], options['sensors']))
+            results = {}
+            for label, evaluate in (('loop', evaluate_in_loop), ('numpy', get_verified_conditions)):
+                tasks = Task.objects.filter(name=name).order_by('pk')
+                measures = RequestMeasures()
+                with connection.execute_wrapper(measures):
+                    start = time.perf_counter()
+                    results[label] = {pk: condition.pk for pk, condition in evaluate(tasks).items()}
+                    duration = time.perf_counter() - start
+                self.stdout.write('{:<6} {:>9.2f} ms {:>7} queries'.format(label, duration * 1000, measures.queries))
+            self.stdout.write('same results: {}'.format(results['loop'] == results['numpy']))
+        finally:
+            self._delete_conditions(name)
+
+    def _create_conditions(self, name, count, sensor_count, fields, sensor_field):
+        rng = random.Random(0)
+        content_type = ContentType.objects.get_for_model(Task)
+        owner = Task.objects.create(name=name, over=True)
+        values = [rng.uniform(0, 1000) for _ in range(sensor_count)]
+        sensors = FieldObject.objects.bulk_create(
+            [
+                FieldObject(
+                    content_type=content_type,
+                    object_id=owner.pk,
+                    field=sensor_field,
+                    value=str(value),
+                    value_numeric=value
+                ) for value in values
+            ]
+        )
+        Task.objects.bulk_create([Task(name=name, over=True) for _ in range(count)], batch_size=1000)
+        conditions = []
+        for pk in Task.objects.filter(name=name).exclude(pk=owner.pk).values_list('pk', flat=True):
+            kind = rng.choice(SENSOR_CONDITIONS)
+            limit = rng.uniform(0, 1000)
+            sensor = rng.choice(sensors)
+            if kind == 'Frequency':
+                value = '100|{}|7d|{}'.format(sensor.pk, limit)
+            else:
+                value = '{}|{}|7d'.format(limit, sensor.pk)
+            conditions.append(
+                FieldObject(
+                    content_type=content_type, object_id=pk, field=fields[kind], value=value, watched_id=sensor.pk
+                )
+            )
+        FieldObject.objects.bulk_create(conditions, batch_size=1000)
+
+    def _delete_conditions(self, name):
+        ids = list(Task.objects.filter(name=name).values_list('pk', flat=True))
+        FieldObject.objects.filter(content_type=ContentType.objects.get_for_model(Task), object_id__in=ids).delete()
+        Task.objects.filter(pk__in=ids).delete()
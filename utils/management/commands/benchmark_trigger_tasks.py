@@ -0,0 +1,95 @@
+"""This file measures the triggering of the due tasks by parallel workers."""
+
+import multiprocessing
+import time
+import uuid
+from datetime import date
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from maintenancemanagement.models import Field, FieldObject, Task
+from utils.trigger_tasks import check_tasks
+
+
+def _run_worker(_):
+    # Each worker process opens its own connection to the database.
+    try:
+        return check_tasks()
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """Benchmark check_tasks with an increasing number of worker processes.
+
+    For each number of workers, due tasks with a Recurrence condition are
+    created, triggered by the workers running check_tasks at the same time,
+    and deleted. The other due tasks of the database are triggered as well,
+    as the scheduler would do.
+    """
+
+    help = 'Measure the throughput of check_tasks run by parallel worker processes.'
+
+    def add_arguments(self, parser):
+        """Add the number of tasks and of workers to the arguments."""
+        parser.add_argument('--tasks', type=int, default=2000, help='Number of due tasks created for each run.')
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 2, 4], help='Numbers of worker processes to compare.'
+        )
+
+    def handle(self, *args, **options):
+        """Run the benchmark and write a line per number of workers."""
+        if not connection.features.has_select_for_update_skip_locked:
+            raise CommandError('The database does not support SELECT ... FOR UPDATE SKIP LOCKED.')
+        try:
+            recurrence = Field.objects.get(name='Recurrence', field_group__name='Trigger Conditions')
+        except Field.DoesNotExist:
+            raise CommandError('The Recurrence trigger condition does not exist.')
+
+        self.stdout.write('tasks={} batch_size={}'.format(options['tasks'], settings.TRIGGER_BATCH_SIZE))
+        self.stdout.write('workers  seconds  tasks/s  duplicates')
+        for workers in options['workers']:
+            name = 'benchmark-{}'.format(uuid.uuid4().hex)
+            self._create_due_tasks(name, options['tasks'], recurrence)
+            try:
+                pending = Task.objects.filter(over=False, is_triggered=False).count()
+                connections.close_all()
+                start = time.perf_counter()
+                with multiprocessing.get_context('fork').Pool(workers) as pool:
+                    counts = pool.map(_run_worker, range(workers))
+                duration = time.perf_counter() - start
+                triggered = pending - Task.objects.filter(over=False, is_triggered=False).count()
+                if Task.objects.filter(name=name, is_triggered=False).exists():
+                    raise CommandError('Some tasks were not triggered with {} workers.'.format(workers))
+                self.stdout.write(
+                    '{:>7}  {:>7.2f}  {:>7.0f}  {:>10}'.format(
+                        workers, duration, triggered / duration, sum(counts) - triggered
+                    )
+                )
+            finally:
+                self._delete_tasks(name)
+
+    def _create_due_tasks(self, name, count, recurrence):
+        today = date.today()
+        Task.objects.bulk_create(
+            [Task(name=name, end_date=today, is_triggered=False, next_check_at=today) for _ in range(count)],
+            batch_size=1000
+        )
+        FieldObject.objects.bulk_create(
+            [
+                FieldObject(
+                    content_type=ContentType.objects.get_for_model(Task),
+                    object_id=pk,
+                    field=recurrence,
+                    value='1d|0d'
+                ) for pk in Task.objects.filter(name=name).values_list('pk', flat=True)
+            ],
+            batch_size=1000
+        )
+
+    def _delete_tasks(self, name):
+        ids = list(Task.objects.filter(name=name).values_list('pk', flat=True))
+        FieldObject.objects.filter(content_type=ContentType.objects.get_for_model(Task), object_id__in=ids).delete()
+        Task.objects.filter(pk__in=ids).delete()
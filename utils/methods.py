@@ -1,4 +1,5 @@
 """Contains a little method that we use multiple times."""
+import math
 import re
 from datetime import timedelta
 
@@ -29,3 +30,18 @@ def parse_time(time_str):
         if param:
             time_params[name] = int(param)
     return timedelta(**time_params)
+
+
+def parse_number(value):
+    """Convert the value of a field object into a float.
+
+    The spaces separating the thousands are ignored. Return None for a value
+    which is not a finite number.
+    """
+    if value is None:
+        return None
+    try:
+        number = float(str(value).replace(" ", ""))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
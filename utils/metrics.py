@@ -0,0 +1,244 @@
+"""This file measures the requests and exposes the measures to Prometheus.
+
+The MetricsMiddleware records, for each view, the number of database queries
+of the requests, their time in the database, in the serializers and their
+total time into histograms kept in the process. The histograms are rendered
+in the Prometheus text format by the metrics endpoint, each process of the
+server exposing its own measures.
+
+The middleware also looks for N+1 queries: a query of the same shape, that is
+the same SQL with other parameters, executed at least
+settings.METRICS_N_PLUS_ONE_THRESHOLD times by a request is logged and
+counted.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+UNRESOLVED_VIEW = 'unresolved'
+
+_LIST_OF_PARAMETERS = re.compile(r'%s(?:\s*,\s*%s)+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def get_query_shape(sql):
+    """Give the shape of a query, its SQL without the values of parameters.
+
+    The literal values are replaced by %s and the lists of parameters, whose
+    length depends on the values, by a single one.
+    """
+    shape = _STRING_LITERAL.sub('%s', sql)
+    shape = _NUMBER_LITERAL.sub('%s', shape)
+    return _LIST_OF_PARAMETERS.sub('%s', shape)
+
+
+class Histogram:
+    """A Prometheus histogram of observations, by values of its labels."""
+
+    def __init__(self, name, description, label_names, buckets):
+        """Create an empty histogram."""
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counts = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self.sums = defaultdict(float)
+
+    def observe(self, labels, value):
+        """Add an observation for the given values of the labels."""
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self.lock:
+            self.counts[labels][index] += 1
+            self.sums[labels] += value
+
+    def render(self):
+        """Give the lines of the histogram in the Prometheus text format."""
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} histogram'.format(self.name)]
+        with self.lock:
+            series = sorted((labels, list(counts), self.sums[labels]) for labels, counts in self.counts.items())
+        for labels, counts, total in series:
+            cumulated = 0
+            for bound, count in zip(self.buckets + ('+Inf', ), counts):
+                cumulated += count
+                lines.append(
+                    '{}_bucket{{{}}} {}'.format(
+                        self.name, _format_labels(self.label_names + ('le', ), labels + (bound, )), cumulated
+                    )
+                )
+            lines.append('{}_sum{{{}}} {}'.format(self.name, _format_labels(self.label_names, labels), total))
+            lines.append('{}_count{{{}}} {}'.format(self.name, _format_labels(self.label_names, labels), cumulated))
+        return lines
+
+
+class CounterMetric:
+    """A Prometheus counter, by values of its labels."""
+
+    def __init__(self, name, description, label_names):
+        """Create a counter at zero."""
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        self.values = Counter()
+
+    def inc(self, labels, amount=1):
+        """Increment the counter for the given values of the labels."""
+        with self.lock:
+            self.values[labels] += amount
+
+    def render(self):
+        """Give the lines of the counter in the Prometheus text format."""
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} counter'.format(self.name)]
+        with self.lock:
+            series = sorted(self.values.items())
+        for labels, value in series:
+            lines.append('{}{{{}}} {}'.format(self.name, _format_labels(self.label_names, labels), value))
+        return lines
+
+
+def _format_labels(names, values):
+    return ','.join('{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+LABELS = ('view', 'method')
+
+REQUEST_DURATION = Histogram(
+    'opencmms_request_duration_seconds', 'Total time of the requests.', LABELS, DURATION_BUCKETS
+)
+DB_QUERIES = Histogram('opencmms_request_db_queries', 'Database queries of the requests.', LABELS, QUERY_BUCKETS)
+DB_DURATION = Histogram(
+    'opencmms_request_db_duration_seconds', 'Time of the requests in the database.', LABELS, DURATION_BUCKETS
+)
+SERIALIZER_DURATION = Histogram(
+    'opencmms_request_serializer_duration_seconds', 'Time of the requests in the serializers.', LABELS,
+    DURATION_BUCKETS
+)
+N_PLUS_ONE = CounterMetric(
+    'opencmms_request_n_plus_one_total', 'Queries of a same shape repeated by a request.', LABELS
+)
+
+METRICS = [REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZER_DURATION, N_PLUS_ONE]
+
+
+def render_metrics():
+    """Give all the metrics of the process in the Prometheus text format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMeasures:
+    """The measures of a request, taken while it is processed."""
+
+    def __init__(self):
+        """Start measuring a request."""
+        self.queries = 0
+        self.db_duration = 0
+        self.serializer_duration = 0
+        self.serializer_depth = 0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Measure a query, as a database execute wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_duration += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[get_query_shape(sql)] += 1
+
+    def get_n_plus_one(self):
+        """Give the shapes of the queries repeated too many times."""
+        threshold = settings.METRICS_N_PLUS_ONE_THRESHOLD
+        return [(shape, count) for shape, count in self.shapes.items() if count >= threshold]
+
+
+_current = threading.local()
+
+
+def _measure_serializer_data(data):
+    """Add the time of the data of the serializers to the current request.
+
+    The serializers calling others only count once, the time of the inner
+    ones being part of the time of the outer one.
+    """
+
+    def measured_data(self):
+        measures = getattr(_current, 'measures', None)
+        if measures is None:
+            return data.fget(self)
+        measures.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            measures.serializer_depth -= 1
+            if measures.serializer_depth == 0:
+                measures.serializer_duration += time.perf_counter() - start
+
+    measured_data.measured = True
+    return property(measured_data)
+
+
+def _instrument_serializers():
+    # Serializer and ListSerializer compute their data in the one of
+    # BaseSerializer, the time of the views spent serializing.
+    if not getattr(serializers.BaseSerializer.data.fget, 'measured', False):
+        serializers.BaseSerializer.data = _measure_serializer_data(serializers.BaseSerializer.data)
+
+
+class MetricsMiddleware:
+    """Middleware recording the measures of each request in the histograms."""
+
+    def __init__(self, get_response):
+        """Create the middleware and measure the serializers."""
+        self.get_response = get_response
+        _instrument_serializers()
+
+    def __call__(self, request):
+        """Process the request, measuring it."""
+        measures = RequestMeasures()
+        _current.measures = measures
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(measures):
+                response = self.get_response(request)
+        finally:
+            _current.measures = None
+        duration = time.perf_counter() - start
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match is not None else UNRESOLVED_VIEW
+        labels = (view, request.method)
+        REQUEST_DURATION.observe(labels, duration)
+        DB_QUERIES.observe(labels, measures.queries)
+        DB_DURATION.observe(labels, measures.db_duration)
+        SERIALIZER_DURATION.observe(labels, measures.serializer_duration)
+        for shape, count in measures.get_n_plus_one():
+            N_PLUS_ONE.inc(labels)
+            logger.warning('N+1 queries on %s %s: %d queries of the shape %s', request.method, view, count, shape)
+        return response
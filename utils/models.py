@@ -1,7 +1,11 @@
 """This is the models file for our utilities."""
 from maintenancemanagement.models import Equipment, FieldObject
+from usersmanagement.models import UserProfile
 
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 
 class DataProvider(models.Model):
@@ -34,6 +38,7 @@ class DataProvider(models.Model):
     recurrence = models.CharField(max_length=100, blank=False, null=False)
     is_activated = models.BooleanField(default=True, blank=False, null=True)
     job_id = models.CharField(max_length=100, default='')
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         """Define string representation of a dataprovider."""
@@ -42,16 +47,70 @@ class DataProvider(models.Model):
     def __repr__(self):
         """Define the representation of a dataprovider."""
         return '<DataProvider: ' + "id={id}, name='{name}', filename='{file_name}', equipment=\
-'{equipment_name}', field_object='{field_object_field_name}', ip_address={ip_address}, port={port}, recurrence=\
+{equipment_id}, field_object={field_object_id}, ip_address={ip_address}, port={port}, recurrence=\
 {recurrence}, is_activated={is_activated}, job_id={job_id}".format(
             id=self.id,
             name=self.name,
             file_name=self.file_name,
-            equipment_name=self.equipment.name,
-            field_object_field_name=self.field_object.field.name,
+            equipment_id=self.equipment_id,
+            field_object_id=self.field_object_id,
             ip_address=self.ip_address,
             port=self.port,
             recurrence=self.recurrence,
             is_activated=self.is_activated,
             job_id=self.job_id
         ) + '>'
+
+
+class UnescapedJSONEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder keeping the non ASCII characters as they are.
+
+    PostgreSQL rejects their escapes in jsonb when the database is not
+    encoded in UTF-8.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Create the encoder."""
+        kwargs['ensure_ascii'] = False
+        super().__init__(*args, **kwargs)
+
+
+class AuditEvent(models.Model):
+    """
+    Define an event of the audit trail, an action of a user on an object.
+
+    The events are only added, never modified nor deleted. They keep the ids
+    of the object and of the user, which may have been deleted since.
+    """
+
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = [(CREATED, 'Created'), (UPDATED, 'Updated'), (DELETED, 'Deleted')]
+
+    id = models.BigAutoField(primary_key=True)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=20, choices=ACTIONS)
+    user = models.ForeignKey(
+        UserProfile, on_delete=models.DO_NOTHING, db_constraint=False, blank=True, null=True, related_name='+'
+    )
+    changes = models.JSONField(default=dict, blank=True, encoder=UnescapedJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        """Add metadata on the class."""
+
+        indexes = [models.Index(fields=['content_type', 'object_id', 'id'])]
+
+    def __str__(self):
+        """Define string representation of an audit event."""
+        return str(self.id)
+
+    def __repr__(self):
+        """Define formal representation of an audit event."""
+        return "<AuditEvent: id={id}, content_type={type}, object_id={object_id}, action={action}, \
+user={user}>".format(
+            id=self.id, type=self.content_type_id, object_id=self.object_id, action=self.action, user=self.user_id
+        )
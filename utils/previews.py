@@ -0,0 +1,115 @@
+"""This file generates the thumbnails and previews of the files."""
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from PIL import Image
+from PyPDF4.pdf import PdfFileReader, PdfFileWriter
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from maintenancemanagement.models import File
+from maintenancemanagement.versions import touch_file_owners
+
+logger = logging.getLogger(__name__)
+
+scheduler = BackgroundScheduler()
+
+THUMBNAIL = 'thumbnail'
+PREVIEW = 'preview'
+VARIANTS = {THUMBNAIL: 'thumbnail.jpg', PREVIEW: 'preview.pdf'}
+
+
+def preview_key(file):
+    """Give the name of the directory holding the derivatives of a file.
+
+    Files sharing the same blob share their derivatives, stored under the
+    sha256 of the blob. The blob should be selected with the files when they
+    are read in a loop.
+    """
+    if file.blob_id is not None:
+        return file.blob.sha256
+    return 'file-{}'.format(file.pk)
+
+
+def preview_path(file, variant):
+    """Give the path of a derivative of a file, or None if it doesn't exist."""
+    path = os.path.join(settings.FILE_PREVIEW_DIR, preview_key(file), VARIANTS[variant])
+    if os.path.exists(path):
+        return path
+    return None
+
+
+def delete_previews(key):
+    """Delete the derivatives stored under the given key."""
+    shutil.rmtree(os.path.join(settings.FILE_PREVIEW_DIR, key), ignore_errors=True)
+
+
+def enqueue_previews(file_id):
+    """Ask the background scheduler to generate the derivatives of a file."""
+    if scheduler.running:
+        scheduler.add_job(generate_previews, args=[file_id])
+    else:
+        logger.warning("The previews scheduler is not running, File {} has no preview.".format(file_id))
+
+
+def generate_previews(file_id):
+    """Generate the thumbnail and the first page preview of a file.
+
+    The first page preview is only generated for pdfs.
+    """
+    try:
+        file = File.objects.select_related('blob').get(pk=file_id)
+    except ObjectDoesNotExist:
+        return
+    directory = os.path.join(settings.FILE_PREVIEW_DIR, preview_key(file))
+    if os.path.exists(os.path.join(directory, VARIANTS[THUMBNAIL])):
+        return
+    os.makedirs(directory, exist_ok=True)
+    try:
+        with open(file.file.path, 'rb') as source:
+            is_pdf = source.read(5) == b'%PDF-'
+        if is_pdf:
+            _generate_pdf_previews(file.file.path, directory)
+        else:
+            _generate_thumbnail(file.file.path, directory)
+    except Exception as e:
+        logger.warning("The previews of {file} could not be generated. {e}".format(file=repr(file), e=e))
+    # The urls of the previews are in the details of the tasks and equipments.
+    touch_file_owners(File.objects.filter(blob=file.blob_id) if file.blob_id else [file.pk])
+
+
+def _generate_thumbnail(path, directory):
+    with Image.open(path) as image:
+        image.thumbnail(settings.FILE_THUMBNAIL_SIZE)
+        image.convert('RGB').save(os.path.join(directory, VARIANTS[THUMBNAIL]), 'JPEG', quality=80)
+
+
+def _generate_pdf_previews(path, directory):
+    with open(path, 'rb') as source:
+        writer = PdfFileWriter()
+        writer.addPage(PdfFileReader(source).getPage(0))
+        with open(os.path.join(directory, VARIANTS[PREVIEW]), 'wb') as preview:
+            writer.write(preview)
+
+    # Rendering a pdf needs poppler, the thumbnail is only made if it is there.
+    if shutil.which('pdftoppm'):
+        with tempfile.TemporaryDirectory() as tmp:
+            subprocess.run(
+                ['pdftoppm', '-png', '-singlefile', '-r', '50', path, os.path.join(tmp, 'page')],
+                check=True,
+                timeout=60
+            )
+            _generate_thumbnail(os.path.join(tmp, 'page.png'), directory)
+
+
+def start():
+    """Start the scheduler generating the previews."""
+    try:
+        scheduler.start()
+    except Exception as e:
+        logger.critical("The previews scheduler did not start. {}".format(e))
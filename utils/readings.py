@@ -0,0 +1,59 @@
+"""This file records the readings of the numeric field objects of equipments.
+
+A reading is recorded for each numeric value written on a field object of an
+equipment, by a save or by the bulk writes of the equipment views and of the
+import. The trends of the field objects are updated with the new readings,
+and the trigger dates of the tasks watching them forecast again. The readings
+older than settings.READING_RETENTION days are deleted every night, so the
+table only grows with the number of sensors.
+"""
+
+import logging
+from datetime import timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from maintenancemanagement.models import Equipment, Reading
+from utils.forecast import forecast_watching_tasks, update_trends
+
+logger = logging.getLogger(__name__)
+
+
+def record_readings(field_objects):
+    """Record the numeric values of field objects of equipments in one query.
+
+    The field objects without numeric value or not describing an equipment
+    are ignored. Return the recorded readings.
+    """
+    content_type_id = ContentType.objects.get_for_model(Equipment).pk
+    readings = [
+        Reading(field_object_id=field_object.pk, value=field_object.value_numeric)
+        for field_object in field_objects
+        if field_object.value_numeric is not None and field_object.content_type_id == content_type_id
+    ]
+    readings = Reading.objects.bulk_create(readings)
+    if readings:
+        update_trends(readings)
+        forecast_watching_tasks({reading.field_object_id for reading in readings})
+    return readings
+
+
+def prune_readings():
+    """Delete the readings older than the retention."""
+    limit = timezone.now() - timedelta(days=settings.READING_RETENTION)
+    deleted, _ = Reading.objects.filter(read_at__lt=limit).delete()
+    logger.info("DELETED {count} readings older than {limit}".format(count=deleted, limit=limit))
+    return deleted
+
+
+def start():
+    """Set up the cron job to delete the old readings."""
+    try:
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(prune_readings, 'cron', hour='4')
+        scheduler.start()
+    except Exception as e:
+        logger.critical("The readings scheduler did not start. {}".format(e))
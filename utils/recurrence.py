@@ -0,0 +1,159 @@
+"""This file generates the next occurrence of the recurrent tasks.
+
+A task with trigger conditions is cloned when it is over, with its teams,
+its files and its conditions. Whatever the number of tasks, the conditions,
+the watched field objects and the relations are read with one query each and
+the clones are written with bulk_create in a single transaction. As the bulk
+writes send no signal, the changes are recorded, the checks of the clones
+scheduled, their trigger dates forecast and the task feeds invalidated
+here.
+"""
+
+from collections import defaultdict
+from datetime import date
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from maintenancemanagement.caches import invalidate_team_task_feeds
+from maintenancemanagement.models import FieldObject, File, Task
+from maintenancemanagement.versions import record_changes
+from utils.forecast import forecast_tasks
+from utils.methods import parse_time
+from utils.trigger_tasks import schedule_checks
+
+TRIGGER_CONDITIONS = 'Trigger Conditions'
+END_CONDITIONS = 'End Conditions'
+
+
+def regenerate_tasks(tasks):
+    """Create the next occurrence of each of the tasks with trigger conditions.
+
+    The clone of a task is not over, nor achieved, and has the trigger
+    conditions of the task, the end conditions without their values, the
+    teams and the files of the task except the ones given as end conditions.
+    The end date of a task with a Recurrence condition is postponed by its
+    recurrence, the next trigger of a Frequency condition is the current value
+    of its watched field object plus its frequency.
+    Return the clones, in the order of the tasks.
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return []
+    content_type = ContentType.objects.get_for_model(Task)
+    conditions = defaultdict(list)
+    for condition in FieldObject.objects.filter(
+        content_type=content_type,
+        object_id__in=[task.pk for task in tasks],
+        field__field_group__name__in=[TRIGGER_CONDITIONS, END_CONDITIONS]
+    ).select_related('field__field_group').order_by('pk'):
+        conditions[condition.object_id].append(condition)
+    tasks = [task for task in tasks if _get_conditions(conditions[task.pk], TRIGGER_CONDITIONS)]
+    if not tasks:
+        return []
+    watched_values = _get_watched_values(conditions.values())
+
+    with transaction.atomic():
+        clones = Task.objects.bulk_create([_clone_task(task, conditions[task.pk]) for task in tasks])
+        condition_clones = []
+        for task, clone in zip(tasks, clones):
+            condition_clones.extend(_clone_conditions(conditions[task.pk], clone, watched_values))
+        condition_clones = FieldObject.objects.bulk_create(condition_clones)
+        team_ids = _clone_teams(tasks, clones)
+        _clone_files(tasks, clones, conditions)
+        record_changes(Task, [clone.pk for clone in clones])
+        record_changes(FieldObject, [condition.pk for condition in condition_clones])
+        schedule_checks([clone.pk for clone in clones])
+        forecast_tasks([clone.pk for clone in clones])
+        invalidate_team_task_feeds(team_ids)
+    return clones
+
+
+def _get_conditions(conditions, field_group_name):
+    return [condition for condition in conditions if condition.field.field_group.name == field_group_name]
+
+
+def _get_watched_values(conditions_by_task):
+    # The Frequency conditions watch a field object, whose id is the second
+    # part of their value.
+    watched_ids = set()
+    for conditions in conditions_by_task:
+        for condition in _get_conditions(conditions, TRIGGER_CONDITIONS):
+            if condition.field.name == 'Frequency':
+                watched_ids.add(int(condition.value.split('|')[1]))
+    return dict(FieldObject.objects.filter(pk__in=watched_ids).values_list('pk', 'value_numeric'))
+
+
+def _clone_task(task, conditions):
+    clone = Task(
+        name=task.name,
+        end_date=task.end_date,
+        description=task.description,
+        duration=task.duration,
+        is_template=task.is_template,
+        created_by_id=task.created_by_id,
+        equipment_id=task.equipment_id,
+        equipment_type_id=task.equipment_type_id,
+        is_triggered=task.is_triggered,
+        over=False,
+    )
+    for condition in _get_conditions(conditions, TRIGGER_CONDITIONS):
+        if condition.field.name == 'Recurrence':
+            clone.end_date = date.today() + parse_time(condition.value.split('|')[0])
+    return clone
+
+
+def _clone_conditions(conditions, clone, watched_values):
+    clones = []
+    for condition in _get_conditions(conditions, TRIGGER_CONDITIONS):
+        value = condition.value
+        if condition.field.name == 'Frequency':
+            parts = value.split('|')
+            if watched_values.get(int(parts[1])) is not None:
+                next_trigger = watched_values[int(parts[1])] + float(parts[0])
+                value = '|'.join(parts[:3] + [str(next_trigger)])
+        clones.append(
+            FieldObject(
+                described_object=clone,
+                field_id=condition.field_id,
+                field_value_id=condition.field_value_id,
+                watched_id=condition.watched_id,
+                value=value,
+                description=condition.description
+            )
+        )
+    for condition in _get_conditions(conditions, END_CONDITIONS):
+        clones.append(
+            FieldObject(
+                described_object=clone, field_id=condition.field_id, value=None, description=condition.description
+            )
+        )
+    return clones
+
+
+def _clone_teams(tasks, clones):
+    clone_ids = {task.pk: clone.pk for task, clone in zip(tasks, clones)}
+    links = Task.teams.through.objects.filter(task__in=clone_ids).values_list('task_id', 'team_id')
+    Task.teams.through.objects.bulk_create(
+        [Task.teams.through(task_id=clone_ids[task_id], team_id=team_id) for task_id, team_id in links]
+    )
+    return {team_id for _, team_id in links}
+
+
+def _clone_files(tasks, clones, conditions):
+    # The files given to fill the end conditions belong to the task done,
+    # their storage name, or path for the former tasks, being the value of
+    # the end condition.
+    clone_ids = {task.pk: clone.pk for task, clone in zip(tasks, clones)}
+    end_values = {
+        task_id: {condition.value for condition in _get_conditions(conditions[task_id], END_CONDITIONS)}
+        for task_id in clone_ids
+    }
+    storage = File._meta.get_field('file').storage
+    links = Task.files.through.objects.filter(task__in=clone_ids).values_list('task_id', 'file_id', 'file__file')
+    Task.files.through.objects.bulk_create(
+        [
+            Task.files.through(task_id=clone_ids[task_id], file_id=file_id)
+            for task_id, file_id, file_name in links
+            if file_name not in end_values[task_id] and storage.path(file_name) not in end_values[task_id]
+        ]
+    )
@@ -0,0 +1,133 @@
+"""This file contains helpers to build streamed and conditional responses."""
+
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils.http import http_date, parse_etags, quote_etag
+
+RANGE_REGEX = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+
+
+class RangeNotSatisfiableException(Exception):
+    """Exception raised when a Range header does not fit the file."""
+
+    pass
+
+
+def etag_matches(request, etag):
+    """Check if the If-None-Match header of the request matches the etag.
+
+    The comparison is weak, as required by RFC 7232 for If-None-Match.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    if '*' in etags:
+        return True
+    etag = _strip_weak(quote_etag(etag))
+    return any(_strip_weak(candidate) == etag for candidate in etags)
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def parse_range(header, size):
+    """Parse a single byte range header.
+
+    Return a (start, end) tuple with an inclusive end, or None if the header is
+    missing or not a single byte range, in which case the whole file should be
+    sent. Raise RangeNotSatisfiableException if the range is outside the file.
+    """
+    if not header:
+        return None
+    match = RANGE_REGEX.match(header.strip())
+    if not match or (not match.group('start') and not match.group('end')):
+        return None
+    if match.group('start'):
+        start = int(match.group('start'))
+        end = int(match.group('end')) if match.group('end') else size - 1
+    else:
+        # Suffix range : the last N bytes of the file.
+        start = max(size - int(match.group('end')), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise RangeNotSatisfiableException()
+    return start, min(end, size - 1)
+
+
+def _read_range(path, start, length):
+    chunk_size = settings.FILE_DOWNLOAD_CHUNK_SIZE
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def file_response(request, path, name, etag, last_modified=None):
+    """Build the response sending the file stored at path.
+
+    Depending on settings.FILE_DOWNLOAD_MODE, the file is either streamed by
+    Django (with Range support) or handed to the front web server with an
+    X-Sendfile or X-Accel-Redirect header so it is never read by the app.
+    """
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = quote_etag(etag)
+        return response
+
+    size = os.path.getsize(path)
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    mode = settings.FILE_DOWNLOAD_MODE
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    elif mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        relative_path = os.path.relpath(path, settings.MEDIA_ROOT)
+        response['X-Accel-Redirect'] = settings.FILE_DOWNLOAD_ACCEL_PREFIX + relative_path
+    else:
+        response = _streamed_file_response(request, path, size, content_type, etag)
+
+    response['ETag'] = quote_etag(etag)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = 'inline; filename="{}"'.format(os.path.basename(name))
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _streamed_file_response(request, path, size, content_type, etag):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    range_header = request.META.get('HTTP_RANGE')
+    # If-Range needs a strong comparison (RFC 7233): a weak etag or a date
+    # never matches and the whole file is sent.
+    if if_range and if_range.strip() != quote_etag(etag):
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiableException:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(size)
+        return response
+
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+    start, end = byte_range
+    response = StreamingHttpResponse(_read_range(path, start, end - start + 1), content_type=content_type, status=206)
+    response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+    response['Content-Length'] = str(end - start + 1)
+    return response
@@ -0,0 +1,256 @@
+"""This file searches the tasks, the equipments and their field values.
+
+With PostgreSQL, when the pg_trgm extension was installed before the
+migration 0023 of maintenancemanagement created its trigram indexes, the
+texts are matched with icontains, served by these indexes, and ranked with
+the trigram similarity. Otherwise,
+an inverted index of trigrams is built in each process and rebuilt when the
+searched tables change.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Greatest
+from maintenancemanagement.models import Equipment, FieldObject, Task
+
+TASK = 'task'
+EQUIPMENT = 'equipment'
+MODELS = {TASK: Task, EQUIPMENT: Equipment}
+VIEW_PERMISSIONS = {TASK: 'maintenancemanagement.view_task', EQUIPMENT: 'maintenancemanagement.view_equipment'}
+
+
+def search(query, user, offset=0, limit=20):
+    """Search the tasks and equipments the user can see.
+
+    Each result is a task whose name or description contains the query, or
+    an equipment whose name or one of whose field values contains it. The
+    fields of the tasks are their conditions and are not searched. Each task
+    or equipment is given once, with its text the most similar to the query,
+    and the results are sorted by rank, from the most similar. Return the
+    number of results and the asked page of results.
+    """
+    types = [result_type for result_type, permission in VIEW_PERMISSIONS.items() if user.has_perm(permission)]
+    if has_trigrams():
+        count, results = _search_database(query, types, offset + limit)
+    else:
+        count, results = _search_index(query, types)
+    results = sorted(results, key=lambda result: (-result['rank'], result['type'], result['id']))
+    results = results[offset:offset + limit]
+    _add_names(results)
+    return count, results
+
+
+@lru_cache(maxsize=None)
+def has_trigrams():
+    """Tell if the database can match and rank the texts with trigrams.
+
+    The extension must be installed and the trigram indexes created.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_extension, pg_indexes WHERE extname = 'pg_trgm' "
+            "AND indexname = 'maintenancemanagement_fieldobject_value_trgm'"
+        )
+        return cursor.fetchone() is not None
+
+
+def _search_database(query, types, limit):
+    count = 0
+    results = []
+    if TASK in types:
+        tasks = Task.objects.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        count += tasks.count()
+        tasks = tasks.annotate(
+            rank=Greatest(TrigramSimilarity('name', query), TrigramSimilarity('description', query))
+        ).order_by('-rank', 'pk').values_list('pk', 'name', 'description', 'rank')[:limit]
+        for pk, name, description, rank in tasks:
+            match = name if query.lower() in name.lower() else description
+            results.append(_result(TASK, pk, match, rank))
+    if EQUIPMENT in types:
+        field_objects = FieldObject.objects.filter(
+            content_type=ContentType.objects.get_for_model(Equipment), value__icontains=query
+        )
+        equipments = Equipment.objects.filter(Q(name__icontains=query) | Q(pk__in=field_objects.values('object_id')))
+        count += equipments.count()
+        equipments = Equipment.objects.filter(name__icontains=query).annotate(
+            rank=TrigramSimilarity('name', query)
+        ).order_by('-rank', 'pk').values_list('pk', 'name', 'rank')[:limit]
+        for pk, name, rank in equipments:
+            results.append(_result(EQUIPMENT, pk, name, rank))
+        # Only the most similar field value of each equipment can be a
+        # result, so the limit applies to distinct equipments.
+        best_field_objects = field_objects.annotate(rank=TrigramSimilarity('value', query)
+                                                    ).order_by('object_id', '-rank', 'pk').distinct('object_id')
+        field_objects = FieldObject.objects.filter(pk__in=best_field_objects.values('pk')).annotate(
+            rank=TrigramSimilarity('value', query)
+        ).order_by('-rank', 'pk').values_list('object_id', 'value', 'field__name', 'rank')[:limit]
+        for object_id, value, field_name, rank in field_objects:
+            results.append(_result(EQUIPMENT, object_id, value, rank, field_name))
+    return count, _keep_best(results)
+
+
+def _search_index(query, types):
+    results = []
+    for (result_type, pk, field_name), match, rank in search_index.search(query):
+        if result_type in types:
+            results.append(_result(result_type, pk, match, rank, field_name))
+    results = _keep_best(results)
+    return len(results), results
+
+
+def _result(result_type, pk, match, rank, field_name=None):
+    result = {'type': result_type, 'id': pk, 'name': None, 'match': match, 'rank': round(float(rank), 4)}
+    if field_name is not None:
+        result['field'] = field_name
+    return result
+
+
+def _keep_best(results):
+    best = {}
+    for result in results:
+        key = (result['type'], result['id'])
+        if key not in best or best[key]['rank'] < result['rank']:
+            best[key] = result
+    return list(best.values())
+
+
+def _add_names(results):
+    for result_type, model in MODELS.items():
+        ids = {result['id'] for result in results if result['type'] == result_type}
+        names = dict(model.objects.filter(pk__in=ids).values_list('pk', 'name'))
+        for result in results:
+            if result['type'] == result_type:
+                result['name'] = names.get(result['id'])
+
+
+def trigrams(text):
+    """Give the trigrams of a text, padded like PostgreSQL's pg_trgm."""
+    words = ''.join(char if char.isalnum() else ' ' for char in text.lower()).split()
+    result = set()
+    for word in words:
+        padded = '  ' + word + ' '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def similarity(first, second):
+    """Give the trigram similarity of two texts, between 0 and 1."""
+    first, second = trigrams(first), trigrams(second)
+    if not first or not second:
+        return 0
+    return len(first & second) / len(first | second)
+
+
+class InvertedIndex:
+    """An in-process index of texts by their trigrams.
+
+    The index maps each trigram of the lowercased texts to the keys of the
+    texts containing it, so the texts containing a query are found by
+    intersecting the keys of the trigrams of the query.
+    """
+
+    def __init__(self):
+        """Create an empty index."""
+        self.texts = {}
+        self.postings = defaultdict(set)
+
+    def add(self, key, text):
+        """Index the text under the given key, replacing its previous text."""
+        self.remove(key)
+        if not text:
+            return
+        self.texts[key] = text
+        lowered = text.lower()
+        for i in range(len(lowered) - 2):
+            self.postings[lowered[i:i + 3]].add(key)
+
+    def remove(self, key):
+        """Remove the text of the given key from the index."""
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        lowered = text.lower()
+        for i in range(len(lowered) - 2):
+            keys = self.postings.get(lowered[i:i + 3])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[lowered[i:i + 3]]
+
+    def search(self, query):
+        """Give the keys, texts and ranks of the texts containing the query."""
+        lowered = query.lower()
+        grams = {lowered[i:i + 3] for i in range(len(lowered) - 2)}
+        if grams:
+            postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set.intersection(*postings)
+        else:
+            candidates = self.texts.keys()
+        results = []
+        for key in candidates:
+            if lowered in self.texts[key].lower():
+                results.append((key, self.texts[key], similarity(query, self.texts[key])))
+        return results
+
+
+class _SearchIndex:
+    """The inverted index of the searched texts, used without trigrams.
+
+    The index is rebuilt when a searched table has rows added or deleted, and
+    at least every settings.SEARCH_INDEX_TIMEOUT seconds for the modified
+    rows.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.built_at = 0
+        self.fingerprint = None
+
+    def search(self, query):
+        with self.lock:
+            fingerprint = self._get_fingerprint()
+            if self.index is None or fingerprint != self.fingerprint \
+                    or time.monotonic() - self.built_at > settings.SEARCH_INDEX_TIMEOUT:
+                self._build(fingerprint)
+            results = self.index.search(query)
+        # The last part of a key only tells apart the texts of a same result.
+        best = {}
+        for key, match, rank in results:
+            if key[:3] not in best or best[key[:3]][1] < rank:
+                best[key[:3]] = (match, rank)
+        return [(key, match, rank) for key, (match, rank) in best.items()]
+
+    def _get_fingerprint(self):
+        return tuple(
+            tuple(model.objects.aggregate(Count('pk'), Max('pk')).values())
+            for model in (Task, Equipment, FieldObject)
+        )
+
+    def _build(self, fingerprint):
+        index = InvertedIndex()
+        for pk, name, description in Task.objects.values_list('pk', 'name', 'description').iterator():
+            index.add((TASK, pk, None, 'name'), name)
+            index.add((TASK, pk, None, 'description'), description)
+        for pk, name in Equipment.objects.values_list('pk', 'name').iterator():
+            index.add((EQUIPMENT, pk, None, 'name'), name)
+        field_objects = FieldObject.objects.filter(content_type=ContentType.objects.get_for_model(Equipment))
+        field_objects = field_objects.values_list('pk', 'object_id', 'field__name', 'value')
+        for pk, object_id, field_name, value in field_objects.iterator():
+            index.add((EQUIPMENT, object_id, field_name, pk), value)
+        self.index = index
+        self.fingerprint = fingerprint
+        self.built_at = time.monotonic()
+
+
+search_index = _SearchIndex()
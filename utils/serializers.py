@@ -7,7 +7,7 @@ from maintenancemanagement.serializers import (
 
 from rest_framework import serializers
 
-from .models import DataProvider
+from .models import AuditEvent, DataProvider
 
 
 class DataProviderSerializer(serializers.ModelSerializer):
@@ -69,3 +69,13 @@ class DataProviderRequirementsSerializer(serializers.Serializer):
 
     equipments = EquipmentDetailsDataProviderSerializer(many=True)
     data_providers = DataProviderDetailsSerializer(many=True)
+
+
+class AuditEventSerializer(serializers.ModelSerializer):
+    """Audit event serializer."""
+
+    class Meta:
+        """This class contains the serializer metadata."""
+
+        model = AuditEvent
+        fields = ['id', 'action', 'user', 'changes', 'created_at']
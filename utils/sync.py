@@ -0,0 +1,120 @@
+"""This file gives the changes of the synchronised objects since a token.
+
+The token is the id of the last change a client received. Each object keeps
+only its last change, a tombstone if it was deleted, so a client receives
+each changed object once, whatever the number of its changes.
+
+The changes are recorded by the signal receivers of maintenancemanagement
+and by the bulk writes, see maintenancemanagement/versions.py.
+
+The tombstones older than settings.SYNC_TOMBSTONE_RETENTION days are deleted
+every night, except the last one, which marks the horizon of the tokens. A
+client whose token is before an old tombstone may have missed deletions, and
+must synchronise again from the beginning.
+"""
+
+import logging
+from datetime import timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from maintenancemanagement.models import (
+    Change,
+    Equipment,
+    FieldObject,
+    File,
+    Task,
+)
+from maintenancemanagement.serializers import (
+    EquipmentSerializer,
+    FieldObjectSerializer,
+    FileSerializer,
+    TaskSerializer,
+)
+
+logger = logging.getLogger(__name__)
+
+# The name of each synchronised model in the response, its queryset, its
+# serializer and the permission to view it.
+SYNCHRONISED = [
+    ('tasks', Task.objects.prefetch_related('teams', 'files'), TaskSerializer, 'maintenancemanagement.view_task'),
+    (
+        'equipments', Equipment.objects.prefetch_related('files'), EquipmentSerializer,
+        'maintenancemanagement.view_equipment'
+    ),
+    (
+        'field_objects', FieldObject.objects.select_related('field').prefetch_related('described_object'),
+        FieldObjectSerializer, 'maintenancemanagement.view_fieldobject'
+    ),
+    ('files', File.objects.select_related('blob'), FileSerializer, 'maintenancemanagement.view_file'),
+]
+
+
+def get_changes(since, user):
+    """Give the objects the user can view changed since the token.
+
+    The objects are sent by pages of settings.SYNC_PAGE_SIZE changes, more
+    tells if another page follows. The token does not move past the changes
+    of the last settings.SYNC_SAFETY_DELAY seconds, as changes with a lower
+    id may still be uncommitted. Those changes are sent again on the next
+    synchronisation.
+    """
+    synchronised = [
+        (name, queryset, serializer_class, ContentType.objects.get_for_model(queryset.model).pk)
+        for name, queryset, serializer_class, permission in SYNCHRONISED if user.has_perm(permission)
+    ]
+    changes = list(
+        Change.objects.filter(id__gt=since, content_type__in=[content_type for *_, content_type in synchronised]
+                              ).order_by('id')[:settings.SYNC_PAGE_SIZE]
+    )
+    token = since
+    cutoff = timezone.now() - timedelta(seconds=settings.SYNC_SAFETY_DELAY)
+    for change in changes:
+        if change.changed_at > cutoff:
+            break
+        token = change.id
+    last_changes = {(change.content_type_id, change.object_id): change for change in changes}
+
+    result = {'token': token, 'more': len(changes) == settings.SYNC_PAGE_SIZE and token > since, 'deleted': {}}
+    for name, queryset, serializer_class, content_type in synchronised:
+        ids = [object_id for (type_id, object_id), change in last_changes.items() if type_id == content_type]
+        objects = queryset.in_bulk([pk for pk in ids if not last_changes[(content_type, pk)].is_deleted])
+        result[name] = serializer_class([objects[pk] for pk in sorted(objects)], many=True).data
+        result['deleted'][name] = sorted(pk for pk in ids if pk not in objects)
+    return result
+
+
+def is_expired(since):
+    """Tell if a token is before the tombstones older than the retention.
+
+    The token 0 of a first synchronisation never expires.
+    """
+    if since == 0:
+        return False
+    limit = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION)
+    return Change.objects.filter(id__gt=since, is_deleted=True, changed_at__lt=limit).exists()
+
+
+def prune_tombstones():
+    """Delete the tombstones older than the retention but the last one."""
+    limit = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION)
+    tombstones = Change.objects.filter(is_deleted=True, changed_at__lt=limit)
+    last = tombstones.order_by('-id').first()
+    if last is None:
+        return 0
+    deleted, _ = tombstones.filter(id__lt=last.id).delete()
+    logger.info("DELETED {count} tombstones older than {limit}".format(count=deleted, limit=limit))
+    return deleted
+
+
+def start():
+    """Set up the cron job to delete the old tombstones."""
+    try:
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(prune_tombstones, 'cron', hour='5')
+        scheduler.start()
+    except Exception as e:
+        logger.critical("The tombstones scheduler did not start. {}".format(e))
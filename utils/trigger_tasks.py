@@ -1,58 +1,178 @@
-"""This file allows to trigger tasks with trigger condition."""
+"""This file allows to trigger tasks with trigger condition.
+
+Each task keeps in next_check_at the date from which its trigger conditions
+can be verified, so the job only checks the tasks which are due.
+
+The sensor conditions of the due tasks are evaluated together with NumPy,
+and only the tasks with a verified condition are claimed, by batches, with
+SELECT ... FOR UPDATE SKIP LOCKED: every process of the server runs the job,
+and the processes running it at the same time split the tasks to trigger
+instead of triggering them twice.
+"""
 import logging
+from collections import defaultdict
 from datetime import date
 
+import numpy as np
 from apscheduler.schedulers.background import BackgroundScheduler
 
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import QuerySet
 from maintenancemanagement.models import FieldObject, Task
 from utils.methods import parse_time
 
 logger = logging.getLogger(__name__)
 
+# The conditions comparing the value of a field object, by kind.
+SENSOR_CONDITIONS = ('Above Threshold', 'Under Threshold', 'Frequency')
+ABOVE_THRESHOLD, UNDER_THRESHOLD, FREQUENCY = range(len(SENSOR_CONDITIONS))
+
 
 def check_tasks():
     """Check all tasks and activates it if necessary.
 
-    This method will be running inside a job of a scheduler.
+    This method will be running inside a job of a scheduler. The conditions
+    of all the due tasks are evaluated at once, then the tasks with a
+    verified condition are claimed by batches of settings.TRIGGER_BATCH_SIZE,
+    each one in a transaction holding the locks of its tasks. The tasks
+    locked by another process are skipped, the ones it triggered are not
+    pending anymore, and the conditions of the claimed tasks are evaluated
+    again in case a sensor changed meanwhile.
+    Return the number of triggered tasks.
+    """
+    due_tasks = Task.objects.filter(over=False, is_triggered=False, next_check_at__lte=date.today())
+    task_ids = sorted(get_verified_conditions(due_tasks.only('end_date')))
+    triggered = 0
+    for start in range(0, len(task_ids), settings.TRIGGER_BATCH_SIZE):
+        with transaction.atomic():
+            tasks_to_check = list(
+                Task.objects.select_for_update(skip_locked=True).filter(
+                    pk__in=task_ids[start:start + settings.TRIGGER_BATCH_SIZE], over=False, is_triggered=False
+                ).order_by('pk')
+            )
+            conditions = get_verified_conditions(tasks_to_check)
+            for task in tasks_to_check:
+                if task.pk in conditions:
+                    trigger_task(task, conditions[task.pk])
+                    triggered += 1
+    return triggered
+
+
+def trigger_task(task, condition):
+    """Trigger a task by one of its verified conditions."""
+    task.is_triggered = True
+    if condition.field.name in SENSOR_CONDITIONS:
+        task.end_date = date.today() + parse_time(condition.value.split('|')[2])
+    task.save()
+
+
+def get_verified_conditions(tasks):
+    """Give the first verified trigger condition of each task, by task id.
+
+    The tasks are a queryset or a list. Their conditions are read in one
+    query and the numeric values of the field objects watched by the sensor
+    conditions in another one. The sensor conditions are then evaluated in a
+    single NumPy pass, only the verified ones going back to Python.
+    """
+    task_ids = tasks.values('pk') if isinstance(tasks, QuerySet) else [task.pk for task in tasks]
+    tasks = {task.pk: task for task in tasks}
+    if not tasks:
+        return {}
+    conditions = list(
+        FieldObject.objects.filter(
+            object_id__in=task_ids,
+            content_type=ContentType.objects.get_for_model(Task),
+            field__field_group__name='Trigger Conditions',
+        ).select_related('field').order_by('pk')
+    )
+    verified = np.zeros(len(conditions), dtype=bool)
+    indexes, kinds, limits, watched_ids = [], [], [], []
+    for index, condition in enumerate(conditions):
+        if condition.field.name == 'Recurrence':
+            verified[index] = condition_is_verified(condition, tasks[condition.object_id])
+        elif condition.field.name in SENSOR_CONDITIONS:
+            parts = condition.value.split('|')
+            indexes.append(index)
+            kinds.append(SENSOR_CONDITIONS.index(condition.field.name))
+            limits.append(parts[3] if condition.field.name == 'Frequency' else parts[0])
+            watched_ids.append(int(parts[1]))
+    if indexes:
+        values = dict(FieldObject.objects.filter(pk__in=set(watched_ids)).values_list('pk', 'value_numeric'))
+        verified[indexes] = evaluate_sensor_conditions(
+            np.array(kinds), to_floats(limits), to_floats([values.get(pk) for pk in watched_ids])
+        )
+    verified_conditions = {}
+    for index in np.flatnonzero(verified):
+        verified_conditions.setdefault(conditions[index].object_id, conditions[index])
+    return verified_conditions
+
+
+def evaluate_sensor_conditions(kinds, limits, values):
+    """Give the mask of the verified sensor conditions.
+
+    The arrays give for each condition its kind, the index of its field name
+    in SENSOR_CONDITIONS, its threshold or next trigger, and the value of the
+    field object it watches. A condition without a number is not verified.
+    """
+    above = (kinds == ABOVE_THRESHOLD) & (values > limits)
+    under = (kinds == UNDER_THRESHOLD) & (values < limits)
+    frequency = (kinds == FREQUENCY) & (values >= limits)
+    return above | under | frequency
+
+
+def get_watched_id(condition):
+    """Give the id of the field object watched by a sensor condition.
+
+    Return None for the other conditions and for the conditions of the
+    templates, which may only hold their threshold.
     """
-    tasks_to_check = Task.objects.filter(over=False, is_triggered=False)
-    for task in tasks_to_check:
-        condition = at_least_one_conditon_is_verified(task)
-        if condition:
-            task.is_triggered = True
-            if condition.field.name in ['Above Threshold', 'Under Threshold', 'Frequency']:
-                task.end_date = date.today() + parse_time(condition.value.split('|')[2])
-            task.save()
+    if condition.field.name not in SENSOR_CONDITIONS:
+        return None
+    parts = (condition.value or '').split('|')
+    if len(parts) < 3 or not parts[1].isdigit():
+        return None
+    return int(parts[1])
+
+
+def to_floats(values):
+    """Give the array of the given values, NaN for the ones not a number."""
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        pass
+    floats = np.empty(len(values))
+    for index, value in enumerate(values):
+        try:
+            floats[index] = float(value)
+        except (TypeError, ValueError):
+            floats[index] = np.nan
+    return floats
 
 
 def at_least_one_conditon_is_verified(task):
     """Check if a task has at least one trigger condition that is activated."""
-    content_type_object = ContentType.objects.get_for_model(task)
-    task_conditions = FieldObject.objects.filter(
-        object_id=task.id,
-        content_type=content_type_object,
-        field__field_group__name='Trigger Conditions',
-    )
-    for condition in task_conditions:
-        if condition_is_verified(condition, task):
-            return condition
-    return None
+    return get_verified_conditions([task]).get(task.pk)
 
 
 def condition_is_verified(condition, task):
-    """Check if the condition given is validated to activate the given task."""
+    """Check if the condition given is validated to activate the given task.
+
+    A sensor condition whose field object has no numeric value is not
+    verified.
+    """
     if condition.field.name == 'Recurrence':
         delay = condition.value.split('|')[1]
         return date.today() >= task.end_date - parse_time(delay)
-    elif condition.field.name == 'Frequency':
-        field_object_id = int(condition.value.split('|')[1])
-        value = float(FieldObject.objects.get(id=field_object_id).value)
+    field_object_id = int(condition.value.split('|')[1])
+    value = FieldObject.objects.values_list('value_numeric', flat=True).get(id=field_object_id)
+    if value is None:
+        return False
+    if condition.field.name == 'Frequency':
         next_trigger = float(condition.value.split('|')[3])
         return value >= next_trigger
     else:
-        field_object_id = int(condition.value.split('|')[1])
-        value = float(FieldObject.objects.get(id=field_object_id).value)
         threshold = float(condition.value.split('|')[0])
         if condition.field.name == 'Above Threshold':
             return threshold < value
@@ -60,6 +180,46 @@ def condition_is_verified(condition, task):
             return threshold > value
 
 
+def schedule_checks(task_ids):
+    """Set the date from which each of the given tasks has to be checked.
+
+    A Recurrence condition can be verified from the end date of the task
+    minus its delay. The other conditions depend on the values of sensors, so
+    a task with one of them is checked at each run. A task without trigger
+    condition is never checked.
+    """
+    content_type_object = ContentType.objects.get_for_model(Task)
+    conditions = defaultdict(list)
+    for condition in FieldObject.objects.filter(
+        object_id__in=task_ids,
+        content_type=content_type_object,
+        field__field_group__name='Trigger Conditions',
+    ).select_related('field'):
+        conditions[condition.object_id].append(condition)
+    tasks = []
+    for task in Task.objects.filter(pk__in=task_ids).only('end_date', 'next_check_at'):
+        next_check_at = get_next_check(task, conditions[task.pk])
+        if next_check_at != task.next_check_at:
+            task.next_check_at = next_check_at
+            tasks.append(task)
+    Task.objects.bulk_update(tasks, ['next_check_at'])
+
+
+def get_next_check(task, conditions):
+    """Give the date from which the conditions of a task are checked."""
+    next_check_at = None
+    for condition in conditions:
+        if condition.field.name == 'Recurrence':
+            if task.end_date is None:
+                continue
+            check_at = task.end_date - parse_time(condition.value.split('|')[1])
+        else:
+            check_at = date.today()
+        if next_check_at is None or check_at < next_check_at:
+            next_check_at = check_at
+    return next_check_at
+
+
 def start():
     """Set up the cron job to trigger tasks."""
     try:
@@ -0,0 +1,180 @@
+"""This file handles the chunked and resumable uploads of files."""
+
+import hashlib
+import imghdr
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from PyPDF4.pdf import PdfFileReader
+
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.utils import timezone
+from maintenancemanagement.models import UploadSession
+from utils.file_storage import store_file
+
+logger = logging.getLogger(__name__)
+
+PDF_SIGNATURE = b'%PDF-'
+
+# Hashes of the sessions being uploaded through this process, indexed by
+# session id, with the offset they were computed up to. A chunk received by
+# another process invalidates the entry and the hash is computed again from
+# the disk when the upload ends.
+_running_hashes = {}
+_running_hashes_lock = threading.Lock()
+
+
+class UploadException(Exception):
+    """Exception corresponding to a rejected chunk or file."""
+
+    pass
+
+
+class UploadOffsetException(UploadException):
+    """Exception raised when a chunk does not start at the session offset."""
+
+    pass
+
+
+class UploadRangeException(UploadException):
+    """Exception raised when a chunk does not end where its range ends."""
+
+    pass
+
+
+def session_path(session):
+    """Give the path of the temporary file of an upload session."""
+    return os.path.join(settings.FILE_UPLOAD_SESSION_DIR, '{}.part'.format(session.id))
+
+
+def write_chunk(session, stream, start, end=None):
+    """Append the content of stream to the upload session.
+
+    The stream is read by blocks so a chunk is never fully loaded in memory.
+    The first chunk is checked to be the beginning of an image or a pdf.
+    When the last byte of the chunk is given, a chunk of another length is
+    rejected and the session keeps its offset.
+    """
+    if start != session.offset:
+        raise UploadOffsetException('Chunk starts at {} but offset is {}.'.format(start, session.offset))
+    os.makedirs(settings.FILE_UPLOAD_SESSION_DIR, exist_ok=True)
+    path = session_path(session)
+    with _running_hashes_lock:
+        running_offset, running_hash = _running_hashes.pop(session.pk, (None, None))
+    if running_offset != session.offset:
+        running_hash = hashlib.sha256() if session.offset == 0 else None
+
+    offset = session.offset
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as part:
+        part.seek(offset)
+        part.truncate()
+        while True:
+            block = stream.read(settings.FILE_DOWNLOAD_CHUNK_SIZE)
+            if not block:
+                break
+            if offset == 0:
+                _check_signature(block)
+            offset += len(block)
+            if offset > session.size:
+                raise UploadException('Chunk exceeds the announced size of the file.')
+            if end is not None and offset > end + 1:
+                break
+            if running_hash is not None:
+                running_hash.update(block)
+            part.write(block)
+        if end is not None and offset != end + 1:
+            part.truncate(session.offset)
+            raise UploadRangeException('Chunk does not match the range {}-{}.'.format(start, end))
+
+    session.offset = offset
+    session.save(update_fields=['offset', 'updated_at'])
+    if running_hash is not None:
+        with _running_hashes_lock:
+            _running_hashes[session.pk] = (offset, running_hash)
+
+
+def _check_signature(block):
+    if not imghdr.what(None, h=block) and not block.startswith(PDF_SIGNATURE):
+        raise UploadException('File should be an image or a pdf.')
+
+
+def finish_upload(session):
+    """Validate the complete upload and create the corresponding File.
+
+    The temporary file is moved into the storage, not copied, unless the same
+    content is already stored.
+    """
+    path = session_path(session)
+    digest = _get_digest(session, path)
+    if session.sha256 and session.sha256.lower() != digest:
+        raise UploadException('The sha256 of the received file does not match.')
+    with open(path, 'rb') as part:
+        if part.read(len(PDF_SIGNATURE)) == PDF_SIGNATURE:
+            part.seek(0)
+            try:
+                PdfFileReader(part)
+            except Exception:
+                raise UploadException('File should be an image or a pdf.')
+
+    with open(path, 'rb') as part:
+        file = store_file(_AssembledFile(part, name=session.file_name), session.is_manual, digest=digest)
+    delete_session(session)
+    return file
+
+
+def _get_digest(session, path):
+    with _running_hashes_lock:
+        running_offset, running_hash = _running_hashes.pop(session.pk, (None, None))
+    if running_offset == session.size:
+        return running_hash.hexdigest()
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(settings.FILE_DOWNLOAD_CHUNK_SIZE), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+class _AssembledFile(DjangoFile):
+    """A file the storage can move instead of copying it."""
+
+    def temporary_file_path(self):
+        """Give the path of the assembled temporary file."""
+        return self.file.name
+
+    @property
+    def size(self):
+        """Give the size of the assembled temporary file."""
+        return os.path.getsize(self.file.name)
+
+
+def delete_session(session):
+    """Delete an upload session and its temporary file."""
+    with _running_hashes_lock:
+        _running_hashes.pop(session.pk, None)
+    try:
+        os.remove(session_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def clean_upload_sessions():
+    """Delete the upload sessions without a chunk for too long."""
+    limit = timezone.now() - timedelta(hours=settings.FILE_UPLOAD_SESSION_EXPIRATION)
+    for session in UploadSession.objects.filter(updated_at__lt=limit):
+        logger.info("DELETED expired {session}".format(session=repr(session)))
+        delete_session(session)
+
+
+def start():
+    """Set up the cron job to clean the abandoned upload sessions."""
+    try:
+        scheduler = BackgroundScheduler()
+        scheduler.add_job(clean_upload_sessions, 'cron', hour='3')
+        scheduler.start()
+    except Exception as e:
+        logger.critical("The upload sessions scheduler did not start. {}".format(e))
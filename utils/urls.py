@@ -1,6 +1,12 @@
 """This files routes our utilities."""
 from django.urls import path
-from utils.views import DataProviderDetail, DataProviderList, TestDataProvider
+from utils.views import (
+    AuditHistory,
+    DataProviderDetail,
+    DataProviderList,
+    Metrics,
+    TestDataProvider,
+)
 
 urlpatterns = []
 
@@ -11,3 +17,15 @@ urlpatterns_dataprovider = [
 ]
 
 urlpatterns += urlpatterns_dataprovider
+
+urlpatterns_metrics = [
+    path('metrics/', Metrics.as_view(), name='metrics'),
+]
+
+urlpatterns += urlpatterns_metrics
+
+urlpatterns_audit = [
+    path('history/<str:model>/<int:pk>/', AuditHistory.as_view(), name='audit-history'),
+]
+
+urlpatterns += urlpatterns_audit
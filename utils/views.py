@@ -5,21 +5,32 @@ import os
 from drf_yasg.utils import swagger_auto_schema
 from maintenancemanagement.models import Equipment, FieldObject
 from openCMMS.settings import BASE_DIR
+from utils.audit import AUDITED_MODELS, get_history, record_event
+from utils.conditional import (
+    add_validators,
+    get_not_modified_response,
+    get_version_validators,
+)
 from utils.data_provider import (
     DataProviderException,
     add_job,
     scheduler,
     test_dataprovider_configuration,
 )
-from utils.models import DataProvider
+from utils.metrics import render_metrics
+from utils.models import AuditEvent, DataProvider
 from utils.serializers import (
+    AuditEventSerializer,
     DataProviderCreateSerializer,
     DataProviderDetailsSerializer,
     DataProviderRequirementsSerializer,
     DataProviderUpdateSerializer,
 )
 
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -96,6 +107,7 @@ class DataProviderList(APIView):
                 logger.info("CREATED DataProvider with {param}".format(param=request.data))
                 dataprovider = dataprovider_serializer.save()
                 add_job(dataprovider)
+                record_event(dataprovider, AuditEvent.CREATED, request.user, dataprovider_serializer.validated_data)
                 dataprovider_details_serializer = DataProviderDetailsSerializer(dataprovider)
                 return Response(dataprovider_details_serializer.data, status=status.HTTP_201_CREATED)
             return Response(dataprovider_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -110,6 +122,7 @@ class DataProviderDetail(APIView):
         query_serializer=None,
         reponses={
             200: DataProviderDetailsSerializer(many=False),
+            304: "Not modified",
             401: "Unhauthorized",
             404: "Not found",
         },
@@ -117,12 +130,16 @@ class DataProviderDetail(APIView):
     def get(self, request, pk):
         """Send the dataprovider corresponding to the given key."""
         try:
-            equipment = DataProvider.objects.get(pk=pk)
+            dataprovider = DataProvider.objects.select_related('equipment').get(pk=pk)
         except ObjectDoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
         if request.user.has_perm("utils.view_dataprovider"):
-            serializer = DataProviderDetailsSerializer(equipment)
-            return Response(serializer.data)
+            etag, last_modified = get_version_validators(dataprovider.updated_at, dataprovider.equipment.updated_at)
+            response = get_not_modified_response(request, etag, last_modified)
+            if response is None:
+                serializer = DataProviderDetailsSerializer(dataprovider)
+                response = add_validators(Response(serializer.data), etag, last_modified)
+            return response
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
     @swagger_auto_schema(
@@ -144,6 +161,7 @@ class DataProviderDetail(APIView):
             logger.info("DELETED DataProvider {dataprovider}".format(dataprovider=repr(dataprovider)))
             if dataprovider.job_id:
                 scheduler.remove_job(dataprovider.job_id)
+            record_event(dataprovider, AuditEvent.DELETED, request.user)
             dataprovider.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
@@ -177,6 +195,7 @@ class DataProviderDetail(APIView):
                     scheduler.pause_job(dataprovider.job_id)
                 else:
                     scheduler.resume_job(dataprovider.job_id)
+                record_event(dataprovider, AuditEvent.UPDATED, request.user, serializer.validated_data)
                 dataprovider_details_serializer = DataProviderDetailsSerializer(dataprovider)
                 return Response(dataprovider_details_serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -217,3 +236,79 @@ class TestDataProvider(APIView):
                 response = {"error": str(e)}
                 return Response(response, status=status.HTTP_200_OK)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+
+class Metrics(APIView):
+    r"""
+    \n# Expose the metrics of the requests to Prometheus.
+
+    Parameter :
+    request (HttpRequest) : the request coming from Prometheus
+
+    Return :
+    response (HttpResponse) : the metrics in the Prometheus text format.
+
+    GET request : send the histograms of the requests handled by the \
+        process answering, see utils/metrics.py.
+    - The request must come from a superuser or contain the header \
+        Authorization: Token <settings.METRICS_TOKEN>, otherwise it will \
+        send HTTP 401.
+    """
+
+    @swagger_auto_schema(
+        operation_description='Send the metrics of the requests in the Prometheus text format.',
+        query_serializer=None,
+        responses={
+            200: 'OK',
+            401: "Unhauthorized",
+        },
+    )
+    def get(self, request):
+        """Send the metrics of the requests."""
+        if request.user.is_superuser or self._has_token(request):
+            return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+    def _has_token(self, request):
+        token = settings.METRICS_TOKEN
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and constant_time_compare(authorization, 'Token ' + token)
+
+
+class AuditHistory(APIView):
+    r"""
+    \n# Retrieve the history of an object.
+
+    Parameters :
+    request (HttpRequest) : the request coming from the front-end
+    model (str) : the name of the model of the object, task, equipment or \
+        dataprovider
+    id (int) : the id of the object
+
+    Return :
+    response (Response) : the response.
+
+    GET request : send the audit events of the object, the oldest first, \
+        even if it was deleted.
+    - If the user doesn't have the permission to view the audit events, \
+        it will send HTTP 401.
+    - If the model is not audited, it will send HTTP 404.
+    """
+
+    @swagger_auto_schema(
+        operation_description='Send the audit events of the object, the oldest first.',
+        query_serializer=None,
+        responses={
+            200: AuditEventSerializer(many=True),
+            401: "Unhauthorized",
+            404: "Not found",
+        },
+    )
+    def get(self, request, model, pk):
+        """Send the audit events of the object."""
+        if request.user.has_perm("utils.view_auditevent"):
+            if model not in AUDITED_MODELS:
+                return Response(status=status.HTTP_404_NOT_FOUND)
+            serializer = AuditEventSerializer(get_history(AUDITED_MODELS[model], pk), many=True)
+            return Response(serializer.data)
+        return Response(status=status.HTTP_401_UNAUTHORIZED)